@@ -0,0 +1 @@
+# Núcleo do Monitor de Saúde Mental — código reutilizável pelo app Streamlit.
@@ -0,0 +1,287 @@
+import bisect
+import threading
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from diario.analise import JANELA_RISCO
+from diario.armazenamento import datas_iso
+from diario.correlacao import MotorCorrelacao
+from diario.esquema import METRICAS
+from diario.instrumentacao import etapa
+from diario.padroes import DetectorPadroes
+
+GRANULARIDADES = ("dia", "semana", "mes", "dia_semana")
+
+
+# ─── CHAVES DE PERÍODO ────────────────────────────────────────
+# Semanas e meses são contados como inteiros (semanas desde 01/01/0001, que
+# foi uma segunda; meses desde o ano 0), então a ordem das chaves é a ordem
+# do tempo e a virada de ano não quebra nada. O rótulo ("9/2026", semana ISO
+# e ano ISO) só é montado na saída, depois de ordenar.
+def chave_bloco(dia, dias):
+    # Blocos de `dias` dias; múltiplos de 7 começam sempre numa segunda
+    return (dia.toordinal() - 1) // dias
+
+
+def inicio_bloco(chave, dias):
+    return date.fromordinal(chave * dias + 1)
+
+
+def chave_periodo(dia, granularidade):
+    if granularidade == "dia":
+        return dia
+    if granularidade == "semana":
+        return chave_bloco(dia, 7)
+    if granularidade == "mes":
+        return dia.year * 12 + dia.month - 1
+    if granularidade == "dia_semana":
+        return dia.weekday()
+    raise ValueError(f"granularidade desconhecida: {granularidade}")
+
+
+def inicio_periodo(chave, granularidade):
+    if granularidade == "dia":
+        return chave
+    if granularidade == "semana":
+        return inicio_bloco(chave, 7)
+    if granularidade == "mes":
+        return date(chave // 12, chave % 12 + 1, 1)
+    raise ValueError(f"granularidade sem início: {granularidade}")
+
+
+def rotulo_periodo(chave, granularidade):
+    inicio = inicio_periodo(chave, granularidade)
+    if granularidade == "semana":
+        ano, semana, _ = inicio.isocalendar()
+        return f"{semana}/{ano}"
+    if granularidade == "mes":
+        return f"{inicio.month:02d}/{inicio.year}"
+    return inicio.strftime("%d/%m/%Y")
+
+
+def _para_dia(valor):
+    try:
+        ts = pd.Timestamp(valor)
+    except (ValueError, TypeError):
+        return None
+    return None if pd.isna(ts) else ts.date()
+
+
+def _valores(registro):
+    return np.array([pd.to_numeric(registro.get(m), errors="coerce")
+                     for m in METRICAS], dtype=float)
+
+
+# ─── MOMENTOS ─────────────────────────────────────────────────
+class Momentos:
+    # Contagem, soma, soma dos quadrados e mínimo/máximo das seis METRICAS.
+    # Tudo é somável, então um período maior sai da soma dos menores sem
+    # voltar às linhas. Os produtos cruzados ficam no MotorCorrelacao.
+    __slots__ = ("registros", "n", "soma", "soma_q", "minimo", "maximo")
+
+    def __init__(self):
+        k = len(METRICAS)
+        self.registros = 0
+        self.n         = np.zeros(k)
+        self.soma      = np.zeros(k)
+        self.soma_q    = np.zeros(k)
+        self.minimo    = np.full(k, np.inf)
+        self.maximo    = np.full(k, -np.inf)
+
+    def adicionar(self, valores):
+        presentes = ~np.isnan(valores)
+        x = np.where(presentes, valores, 0.0)
+        self.registros += 1
+        self.n      += presentes
+        self.soma   += x
+        self.soma_q += x * x
+        self.minimo  = np.fmin(self.minimo, valores)
+        self.maximo  = np.fmax(self.maximo, valores)
+
+    def __iadd__(self, outro):
+        self.registros += outro.registros
+        self.n         += outro.n
+        self.soma      += outro.soma
+        self.soma_q    += outro.soma_q
+        self.minimo     = np.fmin(self.minimo, outro.minimo)
+        self.maximo     = np.fmax(self.maximo, outro.maximo)
+        return self
+
+    def media(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return pd.Series(np.where(self.n > 0, self.soma / self.n, np.nan),
+                             index=METRICAS)
+
+
+# ─── AGREGADOS DE UM PACIENTE ─────────────────────────────────
+class AgregadosUsuario:
+    # Agregados diários, semanais, mensais e por dia da semana de um
+    # paciente, o motor de correlação, o detector de padrões e os últimos
+    # registros usados no risco de burnout. Cada registro novo custa O(1),
+    # independente do tamanho do histórico.
+    def __init__(self):
+        self.total    = Momentos()
+        self.periodos = {g: {} for g in GRANULARIDADES}
+        self.correlacao = MotorCorrelacao()
+        self.padroes = DetectorPadroes()
+        self.ultimo_dia = None
+        self._ultimos = []
+        self._seq = 0
+
+    def adicionar(self, registro):
+        dia = _para_dia(registro.get("data"))
+        if dia is None:
+            return
+        valores = _valores(registro)
+        self.total.adicionar(valores)
+        for g in GRANULARIDADES:
+            buckets = self.periodos[g]
+            chave = chave_periodo(dia, g)
+            if chave not in buckets:
+                buckets[chave] = Momentos()
+            buckets[chave].adicionar(valores)
+        self.correlacao.adicionar(dia, valores)
+        self.padroes.adicionar(dia, valores)
+        if self.ultimo_dia is None or dia > self.ultimo_dia:
+            self.ultimo_dia = dia
+        bisect.insort(self._ultimos, (dia, self._seq, valores))
+        self._seq += 1
+        if len(self._ultimos) > JANELA_RISCO:
+            self._ultimos.pop(0)
+
+    def ultimos_registros(self, desde=None):
+        # DataFrame com até JANELA_RISCO registros mais recentes (a partir de desde)
+        linhas = [dict(zip(METRICAS, valores), data=pd.Timestamp(dia))
+                  for dia, _, valores in self._ultimos
+                  if desde is None or dia >= desde]
+        return pd.DataFrame(linhas, columns=["data"] + METRICAS)
+
+    def serie_diaria(self, desde=None):
+        # Média de cada dia (um ponto por dia com registro), a partir de desde:
+        # base dos gráficos de período longo, sem voltar às linhas
+        linhas = [dict(zip(METRICAS, m.media()), data=pd.Timestamp(dia))
+                  for dia, m in self.periodos["dia"].items()
+                  if desde is None or dia >= desde]
+        df = pd.DataFrame(linhas, columns=["data"] + METRICAS)
+        return df.sort_values("data").reset_index(drop=True)
+
+    def buckets(self, granularidade="semana", desde=None, dias=None):
+        # {chave inteira: Momentos}. Semana e mês já estão mantidos; com desde
+        # ou com blocos de `dias` dias (14, 28...) a soma sai dos diários
+        if dias is None and desde is None:
+            return self.periodos[granularidade]
+        acumulado = {}
+        for dia, m in self.periodos["dia"].items():
+            if desde is None or dia >= desde:
+                chave = chave_bloco(dia, dias) if dias else chave_periodo(dia, granularidade)
+                if chave not in acumulado:
+                    acumulado[chave] = Momentos()
+                acumulado[chave] += m
+        return acumulado
+
+    def resumo_periodos(self, granularidade="semana", desde=None, dias=None):
+        # Uma linha por período em ordem cronológica: rótulo, data de início
+        # e médias (2 casas)
+        buckets = self.buckets(granularidade, desde, dias)
+        linhas = []
+        for chave in sorted(buckets):
+            if dias:
+                inicio = inicio_bloco(chave, dias)
+                rotulo = inicio.strftime("%d/%m/%Y")
+            else:
+                inicio = inicio_periodo(chave, granularidade)
+                rotulo = rotulo_periodo(chave, granularidade)
+            linhas.append(dict(buckets[chave].media().round(2), periodo=rotulo,
+                               inicio=pd.Timestamp(inicio)))
+        return pd.DataFrame(linhas, columns=["periodo", "inicio"] + METRICAS)
+
+    def resumo_semanas(self, desde=None):
+        # Uma linha por semana: rótulo "semana/ano", segunda-feira de início e
+        # médias (2 casas). Com desde, só as semanas a partir dessa data
+        # (somando os dias)
+        if self.total.registros < 7:
+            return None
+        df = self.resumo_periodos("semana", desde)
+        return df.rename(columns={"periodo": "semana"})[["semana", "inicio"] + METRICAS]
+
+
+def construir_agregados(df):
+    # Em ordem de data (estável): o detector de desvios acompanha a série
+    ag = AgregadosUsuario()
+    if not df.empty:
+        df = df.iloc[np.argsort(datas_iso(df["data"]).to_numpy(), kind="stable")]
+    for registro in df.to_dict("records"):
+        ag.adicionar(registro)
+    return ag
+
+
+# ─── ARMAZÉM DE AGREGADOS ─────────────────────────────────────
+class ArmazemAgregados:
+    # Agregados materializados por paciente, montados uma vez a partir das
+    # linhas do usuário e depois mantidos em dia a cada salvar_registro.
+    # Mesmo esquema LRU/geração do CacheUsuarios: geração por usuário, mais
+    # uma geral que só muda no invalidar de todos.
+    #
+    # versao(codigo), opcional: versão das linhas de onde os agregados saem
+    # (CacheUsuarios.versao). Cada entrada guarda a versão com que foi
+    # montada; se a das linhas mudou por outro caminho (recarga depois do
+    # ttl, edição na planilha), a entrada é remontada. registrar conta uma
+    # mudança por paciente, a mesma que o anexar_linhas do cache vai contar.
+    # Erro do carregar sobe para quem chamou e nada fica guardado.
+    def __init__(self, carregar, max_usuarios=500, versao=None):
+        self._carregar = carregar
+        self.max_usuarios = max_usuarios
+        self._versao = versao or (lambda codigo_usuario: None)
+        self._usuarios = OrderedDict()
+        self._geracao = 0
+        self._geracoes = {}
+        self._trava = threading.Lock()
+
+    def _geracao_de(self, codigo_usuario):
+        return self._geracao, self._geracoes.get(codigo_usuario, 0)
+
+    def _mudou(self, codigo_usuario):
+        self._geracoes[codigo_usuario] = self._geracoes.get(codigo_usuario, 0) + 1
+
+    def obter(self, codigo_usuario):
+        versao = self._versao(codigo_usuario)
+        with self._trava:
+            entrada = self._usuarios.get(codigo_usuario)
+            if entrada is not None and entrada[1] == versao:
+                self._usuarios.move_to_end(codigo_usuario)
+                return entrada[0]
+            geracao = self._geracao_de(codigo_usuario)
+        with etapa("agregados.construir"):
+            ag = construir_agregados(self._carregar(codigo_usuario))
+        with self._trava:
+            if geracao == self._geracao_de(codigo_usuario):
+                self._usuarios[codigo_usuario] = [ag, versao]
+                self._usuarios.move_to_end(codigo_usuario)
+                while len(self._usuarios) > self.max_usuarios:
+                    self._usuarios.popitem(last=False)
+        return ag
+
+    def registrar(self, novos):
+        # novos: DataFrame com as linhas recém-gravadas
+        with self._trava:
+            for codigo in novos["codigo_usuario"].unique():
+                self._mudou(codigo)
+                entrada = self._usuarios.get(codigo)
+                if entrada is not None and entrada[1] is not None:
+                    entrada[1] += 1
+            for registro in novos.to_dict("records"):
+                entrada = self._usuarios.get(registro.get("codigo_usuario"))
+                if entrada is not None:
+                    entrada[0].adicionar(registro)
+
+    def invalidar(self, codigo_usuario=None):
+        with self._trava:
+            if codigo_usuario is None:
+                self._geracao += 1
+                self._usuarios.clear()
+            else:
+                self._mudou(codigo_usuario)
+                self._usuarios.pop(codigo_usuario, None)
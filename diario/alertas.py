@@ -0,0 +1,191 @@
+"""Varredura de alertas em segundo plano: risco recalculado a cada gravação.
+
+Sem esperar o paciente abrir o relatório: a cada ciclo o worker pega no
+armazenamento os pacientes gravados desde o último cursor (ler_alteracoes),
+recalcula o risco deles na janela de 7 dias com calcular_risco_burnout e,
+quando o nível muda (Estável / Atenção / Alto Risco), publica um alerta na
+fila. O custo de um ciclo acompanha as gravações novas, não o número de
+pacientes nem o tamanho do histórico.
+
+A fila é um SQLite próprio, que guarda também o cursor e o último nível de
+cada paciente; alertas, níveis e cursor mudam na mesma transação, então um
+worker reiniciado continua de onde parou sem repetir alertas. A API lê a
+mesma fila (python -m diario.api --fila alertas.db, GET /alertas?desde=N).
+
+Na planilha (--gsheets, credenciais em .streamlit/secrets.toml) não há
+diário de gravações: o cursor é a primeira linha do dia mais recente visto,
+e cada ciclo lê só as colunas data e codigo_usuario dali para baixo, mais o
+trecho das linhas recentes dos pacientes alterados. O custo acompanha o
+movimento do dia, não o tamanho da planilha; quem gravou hoje é reavaliado
+a cada ciclo do dia.
+
+    python -m diario.alertas --sqlite diario.db --fila alertas.db --intervalo 60
+    python -m diario.alertas --gsheets URL_DA_PLANILHA --fila alertas.db
+"""
+import argparse
+import json
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from diario.analise import calcular_risco_burnout
+from diario.armazenamento import ArmazenamentoGSheets, ArmazenamentoSQLite, datas_iso
+from diario.esquema import METRICAS
+from diario.instrumentacao import contar, etapa
+
+NIVEIS_ALERTA = ("Atenção", "Alto Risco")
+COLUNAS_ALERTA = ["id", "criado_em", "codigo_usuario", "nome", "risco", "nivel",
+                  "nivel_anterior"]
+
+
+# ─── FILA DE ALERTAS ──────────────────────────────────────────
+class FilaAlertas:
+    # Alertas numerados (id crescente) para quem consulta "o que há de novo
+    # desde o último id que vi", mais o estado da varredura
+    def __init__(self, caminho="alertas.db"):
+        self.caminho = caminho
+        self._trava = threading.Lock()
+        self._con = sqlite3.connect(caminho, check_same_thread=False)
+        with self._trava, self._con:
+            self._con.execute("CREATE TABLE IF NOT EXISTS alertas (id INTEGER PRIMARY KEY "
+                              "AUTOINCREMENT, criado_em TEXT, codigo_usuario TEXT, "
+                              "nome TEXT, risco INTEGER, nivel TEXT, nivel_anterior TEXT)")
+            self._con.execute("CREATE TABLE IF NOT EXISTS niveis (codigo_usuario TEXT "
+                              "PRIMARY KEY, nivel TEXT, risco INTEGER)")
+            self._con.execute("CREATE TABLE IF NOT EXISTS estado "
+                              "(chave TEXT PRIMARY KEY, valor TEXT)")
+
+    def cursor(self):
+        with self._trava:
+            linha = self._con.execute(
+                "SELECT valor FROM estado WHERE chave = 'cursor'").fetchone()
+        return json.loads(linha[0]) if linha else None
+
+    def niveis(self, codigos):
+        codigos = list(codigos)
+        encontrados = {}
+        with self._trava:
+            for i in range(0, len(codigos), 500):
+                lote = codigos[i:i + 500]
+                marcadores = ", ".join("?" for _ in lote)
+                encontrados.update(self._con.execute(
+                    f"SELECT codigo_usuario, nivel FROM niveis "
+                    f"WHERE codigo_usuario IN ({marcadores})", lote).fetchall())
+        return encontrados
+
+    def registrar_ciclo(self, cursor, niveis, alertas):
+        # niveis: {codigo: (nivel, risco)}; alertas: dicts com COLUNAS_ALERTA
+        # (menos o id). Tudo ou nada.
+        with self._trava, self._con:
+            self._con.executemany("INSERT OR REPLACE INTO niveis VALUES (?, ?, ?)",
+                                  [(c, n, r) for c, (n, r) in niveis.items()])
+            self._con.executemany(
+                "INSERT INTO alertas (criado_em, codigo_usuario, nome, risco, nivel, "
+                "nivel_anterior) VALUES (?, ?, ?, ?, ?, ?)",
+                [tuple(a[c] for c in COLUNAS_ALERTA[1:]) for a in alertas])
+            self._con.execute("INSERT OR REPLACE INTO estado VALUES ('cursor', ?)",
+                              (json.dumps(cursor),))
+
+    def ler(self, desde=0, limite=100):
+        with self._trava:
+            linhas = self._con.execute(
+                "SELECT * FROM alertas WHERE id > ? ORDER BY id LIMIT ?",
+                (desde, limite)).fetchall()
+        return [dict(zip(COLUNAS_ALERTA, linha)) for linha in linhas]
+
+
+# ─── VARREDURA ────────────────────────────────────────────────
+class VarreduraAlertas:
+    def __init__(self, armazenamento, fila, dias=7):
+        self.armazenamento = armazenamento
+        self.fila = fila
+        self.dias = dias
+
+    def _riscos(self, codigos, hoje):
+        # {codigo: (risco, nivel, nome)} na janela de `dias` dias, na mesma
+        # ordem de linhas do relatório (por data, estável)
+        inicio = hoje - timedelta(days=self.dias)
+        df = self.armazenamento.ler_recentes(codigos, inicio)
+        if df.empty:
+            return {}
+        df = df.assign(_dia=datas_iso(df["data"]))
+        for m in METRICAS:
+            df[m] = pd.to_numeric(df[m], errors="coerce")
+        df = df.sort_values("_dia", kind="stable")
+        riscos = {}
+        for codigo, linhas in df.groupby("codigo_usuario", sort=False):
+            risco, nivel = calcular_risco_burnout(linhas)
+            nomes = linhas["nome"].dropna()
+            riscos[codigo] = (int(risco), nivel, str(nomes.iloc[-1]) if len(nomes) else "")
+        return riscos
+
+    def ciclo(self, hoje=None):
+        hoje = hoje or date.today()
+        inicio = time.perf_counter()
+        with etapa("alertas.ciclo"):
+            codigos, cursor = self.armazenamento.ler_alteracoes(self.fila.cursor())
+            riscos = self._riscos(codigos, hoje) if codigos else {}
+            anteriores = self.fila.niveis(riscos)
+            agora = datetime.now().isoformat(timespec="seconds")
+            alertas = []
+            for codigo, (risco, nivel, nome) in riscos.items():
+                anterior = anteriores.get(codigo)
+                # Primeira vez que o paciente aparece: só alerta se já está em risco
+                if nivel != anterior and (nivel in NIVEIS_ALERTA or anterior is not None):
+                    alertas.append({"criado_em": agora, "codigo_usuario": codigo,
+                                    "nome": nome, "risco": risco, "nivel": nivel,
+                                    "nivel_anterior": anterior})
+            self.fila.registrar_ciclo(cursor, {c: (n, r) for c, (r, n, _) in riscos.items()},
+                                      alertas)
+        contar("alertas_publicados", len(alertas))
+        contar("alertas_pacientes_reavaliados", len(riscos))
+        return {"pacientes": len(riscos),
+                "alertas":   len(alertas),
+                "segundos":  round(time.perf_counter() - inicio, 4)}
+
+    def rodar(self, intervalo=60, parar=None, aviso=None):
+        # Ciclos até parar (threading.Event) ser acionado; aviso(resumo) a cada um
+        parar = parar or threading.Event()
+        while not parar.is_set():
+            resumo = self.ciclo()
+            if aviso:
+                aviso(resumo)
+            parar.wait(intervalo)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    origem = parser.add_mutually_exclusive_group()
+    origem.add_argument("--sqlite", default="diario.db", help="caminho da base SQLite")
+    origem.add_argument("--gsheets", help="URL da planilha (em vez do SQLite)")
+    parser.add_argument("--fila", default="alertas.db", help="SQLite da fila de alertas")
+    parser.add_argument("--intervalo", type=float, default=60, help="segundos entre ciclos")
+    parser.add_argument("--uma-vez", action="store_true", help="roda um ciclo e sai")
+    args = parser.parse_args(argv)
+
+    if args.gsheets:
+        armazenamento = ArmazenamentoGSheets.conectar(args.gsheets)
+    else:
+        armazenamento = ArmazenamentoSQLite(args.sqlite)
+    varredura = VarreduraAlertas(armazenamento, FilaAlertas(args.fila))
+
+    def aviso(resumo):
+        print(f"{datetime.now():%H:%M:%S} {resumo['pacientes']} pacientes reavaliados, "
+              f"{resumo['alertas']} alertas ({resumo['segundos']}s)", file=sys.stderr)
+
+    if args.uma_vez:
+        aviso(varredura.ciclo())
+        return 0
+    try:
+        varredura.rodar(args.intervalo, aviso=aviso)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from diario.correlacao import MotorCorrelacao
+from diario.esquema import METRICAS
+from diario.instrumentacao import cronometrar
+from diario.padroes import detector_de_linhas
+
+
+# ─── RISCO DE BURNOUT ─────────────────────────────────────────
+# métrica: (sobe junto com o risco?, peso)
+PESOS_RISCO = {"Pressao":        (True,  2.0),
+               "Humor":          (False, 2.0),
+               "Sono":           (False, 1.5),
+               "Irritabilidade": (True,  1.5),
+               "Bateria":        (False, 1.0),
+               "Nevoa":          (False, 1.0)}
+JANELA_RISCO = 5
+
+def nivel_de_risco(risco):
+    if risco >= 70:
+        return "Alto Risco"
+    if risco >= 40:
+        return "Atenção"
+    return "Estável"
+
+@cronometrar("analise.calcular_risco_burnout")
+def calcular_risco_burnout(df):
+    if df.empty:
+        return 0, "Sem dados"
+    pontos = 0
+    total  = 0
+    for col, (direto, peso) in PESOS_RISCO.items():
+        if col in df.columns:
+            media = df[col].tail(JANELA_RISCO).mean()
+            val   = (media / 5) if direto else ((5 - media) / 5)
+            pontos += val * peso
+            total  += peso
+    risco = round((pontos / total) * 100) if total > 0 else 0
+    return risco, nivel_de_risco(risco)
+
+def calcular_risco_burnout_lote(df):
+    # Risco de todos os pacientes de uma vez: médias dos últimos 5 registros
+    # por codigo_usuario (na ordem em que as linhas vieram, como no
+    # calcular_risco_burnout) e os pesos aplicados coluna a coluna sobre a
+    # matriz pacientes × métricas. A soma segue a mesma ordem de PESOS_RISCO,
+    # então o resultado é idêntico ao da função de um paciente só.
+    # Paciente sem nenhum valor numa métrica fica com risco NaN / "Sem dados".
+    colunas = [c for c in PESOS_RISCO if c in df.columns]
+    if df.empty or not colunas:
+        return pd.DataFrame({"risco": pd.Series(dtype="Int64"),
+                             "nivel": pd.Series(dtype=object)},
+                            index=pd.Index([], name="codigo_usuario"))
+    grupos = df.groupby("codigo_usuario", sort=False, observed=True)
+    ultimos = df.loc[grupos.cumcount(ascending=False) < JANELA_RISCO,
+                     ["codigo_usuario"] + colunas]
+    medias = ultimos.groupby("codigo_usuario", sort=False, observed=True)[colunas].mean()
+    pontos = np.zeros(len(medias))
+    total  = 0
+    for col in colunas:
+        direto, peso = PESOS_RISCO[col]
+        media = medias[col].to_numpy(dtype=float)
+        val   = (media / 5) if direto else ((5 - media) / 5)
+        pontos = pontos + val * peso
+        total += peso
+    riscos = np.round((pontos / total) * 100)
+    niveis = np.where(riscos >= 70, "Alto Risco",
+                      np.where(riscos >= 40, "Atenção", "Estável"))
+    return pd.DataFrame({"risco": pd.Series(riscos, index=medias.index).astype("Int64"),
+                         "nivel": np.where(np.isnan(riscos), "Sem dados", niveis)},
+                        index=medias.index)
+
+# ─── CORRELAÇÕES E PADRÕES ────────────────────────────────────
+PARES_CORRELACAO = [
+    ("Sono",   "Humor",          "positiva", "Quando o sono melhora, o humor tende a melhorar também"),
+    ("Pressao","Humor",           "negativa", "Quando a pressão aumenta, o humor tende a cair"),
+    ("Pressao","Irritabilidade",  "positiva", "Pressão alta está ligada ao aumento de irritabilidade"),
+    ("Sono",   "Nevoa",           "positiva", "Sono ruim está associado a mais névoa mental"),
+    ("Bateria","Humor",           "positiva", "Baixa bateria social coincide com queda no humor"),
+]
+
+def insights_de_correlacao(corr_matrix, registros):
+    if registros < 5:
+        return []
+    insights = []
+    for col1, col2, tipo, descricao in PARES_CORRELACAO:
+        if col1 not in corr_matrix.index or col2 not in corr_matrix.columns:
+            continue
+        corr = corr_matrix.loc[col1, col2]
+        if tipo == "positiva" and corr > 0.5:
+            insights.append(f"{descricao} (força: {corr:.2f})")
+        elif tipo == "negativa" and corr < -0.5:
+            insights.append(f"{descricao} (força: {abs(corr):.2f})")
+    return insights
+
+@cronometrar("analise.calcular_correlacoes")
+def calcular_correlacoes(df):
+    # Pelo MotorCorrelacao, como nos agregados (só registros com as seis
+    # métricas, estados diários juntados em ordem de data): o PDF em lote
+    # sai com os mesmos números do relatório do app
+    if len(df) < 5:
+        return []
+    dias = pd.to_datetime(df["data"], errors="coerce").dt.date
+    valores = np.column_stack([pd.to_numeric(df[m], errors="coerce").to_numpy(dtype=float)
+                               if m in df.columns else np.full(len(df), np.nan)
+                               for m in METRICAS])
+    motor = MotorCorrelacao()
+    for dia, linha in zip(dias, valores):
+        if not pd.isna(dia):
+            motor.adicionar(dia, linha)
+    if not motor.dias:
+        return []
+    return insights_de_correlacao(motor.intervalo(min(motor.dias)).correlacao(), len(df))
+
+@cronometrar("analise.detectar_padroes_semanais")
+def detectar_padroes_semanais(df, desde=None):
+    # Mesmo detector dos agregados, montado de uma vez pelas linhas em
+    # ordem de data; desvios só a partir de desde
+    datas = pd.to_datetime(df["data"], errors="coerce")
+    validas = datas.notna().to_numpy()
+    valores = np.column_stack([pd.to_numeric(df[m], errors="coerce").to_numpy(dtype=float)
+                               if m in df.columns else np.full(len(df), np.nan)
+                               for m in METRICAS])[validas]
+    ordem = np.argsort(datas[validas].to_numpy(), kind="stable")
+    datas = datas[validas].iloc[ordem].reset_index(drop=True)
+    return detector_de_linhas(datas, valores[ordem], desde).descrever(desde=desde)
+
+# ─── DADOS DO RELATÓRIO ───────────────────────────────────────
+def remedios_das_linhas(df_user):
+    # Último texto de remédios repetido nas linhas diárias (formato antigo,
+    # antes da tabela versionada); "" se nenhuma linha tem
+    if "remedios" not in df_user.columns:
+        return ""
+    remedios = df_user["remedios"].dropna().astype(str)
+    remedios = remedios[remedios.str.strip() != ""]
+    return remedios.iloc[-1] if not remedios.empty else ""
+
+def resumo_de_agregados(ag, registros, limite):
+    # Risco, correlação, insights e padrões da janela (a partir de limite)
+    # tirados dos agregados do paciente (diario.agregados): a mesma conta
+    # para a tela (dados_relatorio) e para o PDF do serviço
+    corr = ag.correlacao.intervalo(limite).correlacao()
+    risco, nivel_risco = calcular_risco_burnout(ag.ultimos_registros(desde=limite))
+    return {"corr_7dias":  corr,
+            "risco":       risco,
+            "nivel_risco": nivel_risco,
+            "insights":    insights_de_correlacao(corr, registros),
+            "padroes":     ag.padroes.descrever(desde=limite)}
+
+@cronometrar("analise.preparar_relatorio")
+def preparar_relatorio(df_user, hoje=None, dias=7, remedios=None, agregados=None):
+    # Tudo o que o gerar_pdf precisa para um paciente, a partir das linhas
+    # cruas dele. None quando não há registro na janela. remedios: versão
+    # vigente da tabela de remédios; sem ela, vale o texto das linhas.
+    # agregados: AgregadosUsuario das mesmas linhas, quando já existe (o
+    # serviço); sem ele (lote), as mesmas contas saem das linhas.
+    hoje = hoje or date.today()
+    if df_user.empty:
+        return None
+    if remedios is None:
+        remedios = remedios_das_linhas(df_user)
+    nomes = df_user["nome"].dropna() if "nome" in df_user.columns else pd.Series()
+    df_user = df_user.copy()
+    df_user["data"] = pd.to_datetime(df_user["data"])
+    df_user = df_user.sort_values("data", kind="stable")
+    limite   = pd.to_datetime(hoje - timedelta(days=dias))
+    df_7dias = df_user[df_user["data"] >= limite].copy()
+    if df_7dias.empty:
+        return None
+    if agregados is not None:
+        resumo = resumo_de_agregados(agregados, len(df_7dias), limite.date())
+        risco, nivel_risco = resumo["risco"], resumo["nivel_risco"]
+        insights, padroes = resumo["insights"], resumo["padroes"]
+    else:
+        risco, nivel_risco = calcular_risco_burnout(df_7dias)
+        insights = calcular_correlacoes(df_7dias)
+        padroes = detectar_padroes_semanais(df_user, desde=limite.date())
+    return {"nome_usuario":    str(nomes.iloc[-1]) if not nomes.empty else "",
+            "df_7dias":        df_7dias,
+            "risco":           risco,
+            "nivel_risco":     nivel_risco,
+            "insights":        insights,
+            "padroes":         padroes,
+            "remedios_salvos": remedios,
+            "dias":            dias}
@@ -0,0 +1,205 @@
+"""API HTTP/JSON mínima sobre o ServicoDiario, sem Streamlit.
+
+Para integrações que só precisam do risco, do resumo semanal ou do PDF de
+um paciente, sem passar pelo ciclo de reexecução do app. Só biblioteca
+padrão: um servidor com uma thread por conexão e os caches do serviço
+compartilhados entre elas.
+
+    python -m diario.api --sqlite diario.db --porta 8000
+
+    GET /saude
+    GET /usuarios/<codigo>/risco
+    GET /usuarios/<codigo>/semanas
+    GET /usuarios/<codigo>/relatorio.pdf?dias=N   (padrão 7, até 3650)
+    GET /metricas          (texto do Prometheus)
+    GET /metricas.json
+    GET /alertas?desde=ID&limite=N   (com --fila; ver diario.alertas)
+
+Os dados são clínicos: fora de /saude, toda rota exige o cabeçalho
+"Authorization: Bearer <token>" quando há token (--token ou a variável
+DIARIO_API_TOKEN). Sem token, o servidor só aceita escutar em loopback.
+"""
+import argparse
+import hmac
+import ipaddress
+import json
+import os
+import re
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from diario.armazenamento import ArmazenamentoSQLite
+from diario.dados import ServicoDiario
+from diario.instrumentacao import INSTRUMENTACAO, etapa
+
+MAX_DIAS_PDF = 3650
+ROTA_USUARIO = re.compile(r"^/usuarios/([0-9a-zA-Z_-]+)/(risco|semanas|relatorio\.pdf)$")
+
+
+# ─── HANDLER ──────────────────────────────────────────────────
+class ManipuladorDiario(BaseHTTPRequestHandler):
+    # O servidor guarda o ServicoDiario em self.server.servico
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, formato, *args):
+        if self.server.verboso:
+            super().log_message(formato, *args)
+
+    def _responder(self, status, corpo, tipo="application/json", cabecalhos=None):
+        if tipo == "application/json":
+            corpo = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+            tipo = "application/json; charset=utf-8"
+        self.send_response(status)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(corpo)))
+        for nome, valor in (cabecalhos or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def do_GET(self):
+        caminho, _, consulta = self.path.partition("?")
+        if caminho == "/saude":
+            return self._responder(200, {"ok": True})
+        if not self._autorizado():
+            return self._responder(401, {"erro": "token ausente ou inválido"},
+                                   cabecalhos={"WWW-Authenticate": "Bearer"})
+        if caminho == "/metricas":
+            return self._responder(200, INSTRUMENTACAO.prometheus().encode("utf-8"),
+                                   tipo="text/plain; version=0.0.4; charset=utf-8")
+        if caminho == "/metricas.json":
+            return self._responder(200, INSTRUMENTACAO.instantaneo())
+        if caminho == "/alertas":
+            return self._alertas(parse_qs(consulta))
+        rota = ROTA_USUARIO.match(caminho)
+        if rota is None:
+            return self._responder(404, {"erro": "rota desconhecida"})
+        codigo, recurso = rota.groups()
+        INSTRUMENTACAO.iniciar_execucao()
+        try:
+            with etapa("api.requisicao", recurso=recurso):
+                if recurso == "risco":
+                    return self._risco(codigo)
+                if recurso == "semanas":
+                    return self._semanas(codigo)
+                return self._pdf(codigo, parse_qs(consulta))
+        except Exception as e:
+            return self._responder(500, {"erro": str(e)})
+        finally:
+            INSTRUMENTACAO.log_execucao(rota=caminho)
+
+    def _autorizado(self):
+        # Sem token configurado o acesso já está restrito ao loopback (main)
+        token = self.server.token
+        if not token:
+            return True
+        recebido = self.headers.get("Authorization", "")
+        esquema, _, valor = recebido.partition(" ")
+        return esquema.lower() == "bearer" and hmac.compare_digest(
+            valor.strip().encode("utf-8"), token.encode("utf-8"))
+
+    def _alertas(self, parametros):
+        # Consulta incremental: o cliente guarda o último id recebido
+        if self.server.fila is None:
+            return self._responder(404, {"erro": "fila de alertas não configurada"})
+        try:
+            desde = int(parametros.get("desde", ["0"])[0])
+            limite = min(int(parametros.get("limite", ["100"])[0]), 1000)
+        except ValueError:
+            return self._responder(400, {"erro": "desde e limite devem ser inteiros"})
+        alertas = self.server.fila.ler(desde, limite)
+        return self._responder(200, {"alertas": alertas,
+                                     "ultimo_id": alertas[-1]["id"] if alertas else desde})
+
+    def _risco(self, codigo):
+        resultado = self.server.servico.risco(codigo)
+        if resultado is None:
+            return self._responder(404, {"erro": "sem registros nos últimos 7 dias"})
+        risco, nivel = resultado
+        return self._responder(200, {"codigo_usuario": codigo, "risco": int(risco),
+                                     "nivel": nivel})
+
+    def _semanas(self, codigo):
+        resumo = self.server.servico.resumo_semanas(codigo)
+        if resumo is not None:
+            resumo = resumo.assign(inicio=resumo["inicio"].dt.strftime("%Y-%m-%d"))
+        semanas = [] if resumo is None else json.loads(resumo.to_json(orient="records"))
+        return self._responder(200, {"codigo_usuario": codigo, "semanas": semanas})
+
+    def _pdf(self, codigo, parametros):
+        try:
+            dias = int(parametros.get("dias", ["7"])[0])
+        except ValueError:
+            return self._responder(400, {"erro": "dias deve ser inteiro"})
+        if not 1 <= dias <= MAX_DIAS_PDF:
+            return self._responder(400, {"erro": f"dias deve estar entre 1 e {MAX_DIAS_PDF}"})
+        resultado = self.server.servico.pdf(codigo, dias=dias)
+        if resultado is None:
+            return self._responder(404, {"erro": f"sem registros nos últimos {dias} dias"})
+        nome, conteudo = resultado
+        return self._responder(200, conteudo, tipo="application/pdf", cabecalhos={
+            "Content-Disposition": f'attachment; filename="{nome}"'})
+
+
+def _loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def criar_servidor(servico, host="127.0.0.1", porta=8000, verboso=False, fila=None,
+                   token=None):
+    # Recusa expor os dados na rede sem autenticação
+    if not token and not _loopback(host):
+        raise ValueError(f"host {host!r} fora do loopback exige token (--token ou DIARIO_API_TOKEN)")
+    servidor = ThreadingHTTPServer((host, porta), ManipuladorDiario)
+    servidor.daemon_threads = True
+    servidor.servico = servico
+    servidor.verboso = verboso
+    servidor.fila = fila
+    servidor.token = token
+    return servidor
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sqlite", default="diario.db", help="caminho da base SQLite")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8000)
+    parser.add_argument("--ttl", type=float, default=600,
+                        help="releitura forçada do cache (s)")
+    parser.add_argument("--arquivo", help="diretório do arquivo frio (ferramentas.arquivar)")
+    parser.add_argument("--fila", help="SQLite da fila de alertas (diario.alertas)")
+    parser.add_argument("--token", default=os.environ.get("DIARIO_API_TOKEN"),
+                        help="token Bearer exigido nas rotas (padrão: DIARIO_API_TOKEN)")
+    parser.add_argument("--verboso", action="store_true")
+    args = parser.parse_args(argv)
+    if not args.token and not _loopback(args.host):
+        parser.error(f"--host {args.host} fora do loopback exige --token ou DIARIO_API_TOKEN")
+
+    arquivo = None
+    if args.arquivo:
+        from diario.arquivo import ArquivoHistorico
+        arquivo = ArquivoHistorico(args.arquivo)
+    servico = ServicoDiario(ArmazenamentoSQLite(args.sqlite), ttl=args.ttl, arquivo=arquivo)
+    fila = None
+    if args.fila:
+        from diario.alertas import FilaAlertas
+        fila = FilaAlertas(args.fila)
+    servidor = criar_servidor(servico, args.host, args.porta, args.verboso, fila, args.token)
+    print(f"API do diário em http://{args.host}:{args.porta}", file=sys.stderr)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,847 @@
+import random
+import re
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from diario.esquema import COLUNAS, COLUNAS_REMEDIOS, METRICAS
+from diario.instrumentacao import chamada_backend
+
+
+class ConflitoVersao(Exception):
+    # A base mudou entre a leitura e a gravação (outra sessão ou processo)
+    pass
+
+
+def normalizar_registros(registros):
+    novos = pd.DataFrame(registros)
+    for col in COLUNAS:
+        if col not in novos.columns:
+            novos[col] = ""
+    return novos[COLUNAS]
+
+
+def normalizar_remedios(registros):
+    novos = pd.DataFrame(registros)
+    for col in COLUNAS_REMEDIOS:
+        if col not in novos.columns:
+            novos[col] = ""
+    return novos[COLUNAS_REMEDIOS]
+
+
+def remedios_vigentes(df_remedios):
+    # {codigo_usuario: texto} com a última versão de cada paciente
+    if df_remedios.empty:
+        return {}
+    ordenado = df_remedios.assign(versao=pd.to_numeric(df_remedios["versao"]))
+    ordenado = ordenado.sort_values("versao", kind="stable")
+    ultimas = ordenado.groupby("codigo_usuario", sort=False).tail(1)
+    return dict(zip(ultimas["codigo_usuario"], ultimas["remedios"].fillna("")))
+
+
+def data_iso(valor):
+    # Chave de data comparável entre motores: a planilha pode devolver a data
+    # formatada ("18/10/2026") em vez do texto ISO gravado
+    texto = str(valor).strip()
+    try:
+        ts = pd.to_datetime(texto, dayfirst="/" in texto)
+    except (ValueError, TypeError, OverflowError):
+        return texto
+    return texto if pd.isna(ts) else ts.date().isoformat()
+
+
+DATA_ISO = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def datas_iso(datas):
+    # data_iso vetorizado: o caso comum (texto ISO) sai direto do fatiamento
+    datas = datas.astype(str).str.strip()
+    iso = datas.str.slice(0, 10)
+    fora = ~iso.str.fullmatch(DATA_ISO.pattern)
+    if fora.any():
+        iso[fora] = datas[fora].map(data_iso)
+    return iso
+
+
+def deduplicar(df):
+    # Um registro por (codigo_usuario, data): fica o último gravado, na
+    # posição em que estava. Linhas totalmente vazias saem junto.
+    df = df.dropna(how="all")
+    if df.empty:
+        return df
+    chaves = pd.DataFrame({"c": df["codigo_usuario"].astype(str),
+                           "d": datas_iso(df["data"])})
+    return df[~chaves.duplicated(keep="last").to_numpy()]
+
+
+def tamanho_csv(df):
+    # Bytes da base serializada como a planilha a exporta
+    return len(df.to_csv(index=False).encode("utf-8"))
+
+
+def resumo_compactacao(df, compacta):
+    antes, depois = tamanho_csv(df), tamanho_csv(compacta)
+    return {"linhas_antes":      len(df),
+            "linhas_depois":     len(compacta),
+            "linhas_removidas":  len(df) - len(compacta),
+            "bytes_antes":       antes,
+            "bytes_depois":      depois,
+            "bytes_recuperados": antes - depois}
+
+
+def compactar(armazenamento, simular=False):
+    # Deduplica o histórico inteiro numa passada: uma leitura e, se houver o
+    # que tirar, uma regravação condicionada à versão lida (ConflitoVersao se
+    # alguém gravou no meio; rode pelo CoordenadorGravacao para repetir)
+    versao = armazenamento.versao()
+    df = armazenamento.ler_tudo()
+    compacta = deduplicar(df)
+    if len(compacta) < len(df) and not simular:
+        armazenamento.reescrever(compacta.reset_index(drop=True), versao_esperada=versao)
+    return resumo_compactacao(df, compacta)
+
+
+def versoes_remedios(df):
+    # Reconstrói as versões de remédios a partir das linhas diárias: em ordem
+    # de data, uma versão nova sempre que o texto (não vazio) muda
+    texto = df["remedios"].fillna("").astype(str)
+    linhas = df.assign(remedios=texto, desde=datas_iso(df["data"]))
+    linhas = linhas[texto.str.strip() != ""]
+    if linhas.empty:
+        return normalizar_remedios([])
+    linhas = linhas.sort_values(["codigo_usuario", "desde"], kind="stable")
+    anterior = linhas.groupby("codigo_usuario", sort=False)["remedios"].shift()
+    versoes = linhas[linhas["remedios"] != anterior].copy()
+    versoes["versao"] = versoes.groupby("codigo_usuario", sort=False).cumcount() + 1
+    return versoes[COLUNAS_REMEDIOS].reset_index(drop=True)
+
+
+def migrar_remedios(armazenamento, simular=False):
+    # Passa o texto de remédios repetido em cada linha diária para a tabela
+    # versionada e limpa a coluna nas linhas, numa regravação condicionada à
+    # versão lida (rode pelo CoordenadorGravacao para repetir em conflito).
+    # Quem já tem versões na tabela não ganha versões reconstruídas: a lista
+    # vigente dele já está lá e as cópias das linhas só são apagadas.
+    versao = armazenamento.versao()
+    df = armazenamento.ler_tudo()
+    migrados = set(armazenamento.ler_remedios()["codigo_usuario"])
+    versoes = versoes_remedios(df[~df["codigo_usuario"].isin(migrados)])
+    com_texto = df["remedios"].fillna("").astype(str).str.strip() != ""
+    enxuto = df.assign(remedios="")
+    if not simular:
+        armazenamento.anexar_remedios(versoes.to_dict("records"))
+        if com_texto.any():
+            armazenamento.reescrever(enxuto.reset_index(drop=True),
+                                     versao_esperada=versao)
+    antes = tamanho_csv(df)
+    depois = tamanho_csv(enxuto) + (tamanho_csv(versoes) if len(versoes) else 0)
+    return {"usuarios":          versoes["codigo_usuario"].nunique(),
+            "versoes":           len(versoes),
+            "linhas_limpas":     int(com_texto.sum()),
+            "bytes_antes":       antes,
+            "bytes_depois":      depois,
+            "bytes_recuperados": antes - depois}
+
+
+# ─── INTERFACE ────────────────────────────────────────────────
+class Armazenamento:
+    # Contrato comum dos motores de armazenamento. Quem implementa precisa
+    # de ler_tudo, anexar e reescrever; as leituras por usuário/intervalo e o
+    # upsert têm versões genéricas aqui que os motores indexados substituem.
+    #
+    # versao() devolve um valor que muda a cada gravação (ou None se o motor
+    # não sabe dizer). reescrever(df, versao_esperada) levanta ConflitoVersao
+    # se a base mudou desde que essa versão foi lida.
+    #
+    # motor identifica o armazenamento nas métricas (diario.instrumentacao).
+    #
+    # Os remédios ficam à parte (COLUNAS_REMEDIOS), uma versão por mudança:
+    # ler_remedios(codigo=None) devolve as versões (de todos, se None) e
+    # anexar_remedios grava versões novas.
+    #
+    # ler_alteracoes(cursor) devolve (códigos gravados depois do cursor, novo
+    # cursor) para quem acompanha a base por fora (diario.alertas). cursor
+    # None = desde o começo. A versão genérica usa a data dos registros (o
+    # app só grava o dia de hoje); motores com diário de gravações fazem melhor.
+    motor = "outro"
+
+    def ler_tudo(self):
+        raise NotImplementedError
+
+    def anexar(self, registros):
+        raise NotImplementedError
+
+    def reescrever(self, df, versao_esperada=None):
+        raise NotImplementedError
+
+    def versao(self):
+        return None
+
+    def ler_remedios(self, codigo_usuario=None):
+        raise NotImplementedError
+
+    def anexar_remedios(self, registros):
+        raise NotImplementedError
+
+    def _conferir_versao(self, versao_esperada):
+        if versao_esperada is not None and self.versao() != versao_esperada:
+            raise ConflitoVersao("a base foi alterada por outra gravação")
+
+    def ler_usuario(self, codigo_usuario):
+        df = self.ler_tudo()
+        if df.empty or "codigo_usuario" not in df.columns:
+            return pd.DataFrame(columns=COLUNAS)
+        return df[df["codigo_usuario"] == codigo_usuario]
+
+    def ler_intervalo(self, codigo_usuario, inicio=None, fim=None):
+        # inicio/fim são datas ISO ("AAAA-MM-DD"), ambas inclusivas
+        df = self.ler_usuario(codigo_usuario)
+        datas = df["data"].astype(str)
+        mascara = pd.Series(True, index=df.index)
+        if inicio is not None:
+            mascara &= datas >= str(inicio)
+        if fim is not None:
+            mascara &= datas <= str(fim)
+        return df[mascara]
+
+    def ler_recentes(self, codigos, inicio):
+        # Linhas dos pacientes em codigos com data >= inicio, numa leitura só
+        df = self.ler_tudo()
+        if df.empty:
+            return pd.DataFrame(columns=COLUNAS)
+        mascara = df["codigo_usuario"].isin(list(codigos)).to_numpy()
+        df = df[mascara]
+        return df[(datas_iso(df["data"]) >= str(inicio)).to_numpy()]
+
+    def ler_alteracoes(self, cursor=None):
+        # Cursor = última data vista: relê os pacientes com registro desse dia
+        # em diante (quem salvou de novo hoje aparece outra vez)
+        df = self.ler_tudo()
+        if df.empty:
+            return [], cursor
+        datas = datas_iso(df["data"])
+        validas = datas.str.fullmatch(DATA_ISO.pattern)
+        if cursor is not None:
+            validas &= datas >= cursor
+        codigos = df.loc[validas.to_numpy(), "codigo_usuario"].dropna().unique().tolist()
+        return codigos, (datas[validas].max() if validas.any() else cursor)
+
+    def upsert(self, registros):
+        # Substitui as linhas com o mesmo (codigo_usuario, data) e grava o resto
+        novos = deduplicar(normalizar_registros(registros))
+        versao = self.versao()
+        df_atual = self.ler_tudo()
+        if not df_atual.empty:
+            chaves = set(zip(novos["codigo_usuario"], novos["data"].astype(str)))
+            mesma_chave = [(c, str(d)) in chaves for c, d in
+                           zip(df_atual["codigo_usuario"], df_atual["data"])]
+            df_atual = df_atual[~pd.Series(mesma_chave, index=df_atual.index)]
+        self.reescrever(pd.concat([df_atual, novos], ignore_index=True),
+                        versao_esperada=versao)
+
+    def anexar_reescrevendo(self, registros):
+        # Caminho antigo: lê tudo, concatena e regrava a base inteira.
+        # A versão é lida antes dos dados, então qualquer gravação no meio
+        # do caminho vira ConflitoVersao em vez de linha perdida.
+        novos = normalizar_registros(registros)
+        versao = self.versao()
+        df_final = pd.concat([self.ler_tudo(), novos], ignore_index=True)
+        self.reescrever(df_final, versao_esperada=versao)
+
+
+# ─── GOOGLE SHEETS ────────────────────────────────────────────
+def _coluna_a1(indice):
+    # 0 -> "A", 25 -> "Z", 26 -> "AA"
+    letras = ""
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(ord("A") + resto) + letras
+    return letras
+
+
+class ArmazenamentoGSheets(Armazenamento):
+    # ttl=0 desliga o cache interno do st.connection: quem guarda as
+    # leituras é o CacheDados/CacheUsuarios, que sabe quando houve gravação.
+    # Os remédios versionados ficam numa segunda aba (ABA_REMEDIOS).
+    motor = "gsheets"
+    ABA_REMEDIOS = "remedios"
+
+    def __init__(self, conn, planilha_url, ttl=0):
+        self.conn = conn
+        self.planilha_url = planilha_url
+        self.ttl = ttl
+        self._aba = None
+        self._aba_rem = None
+        self._marca_recentes = None
+
+    def _aba_planilha(self):
+        # Acesso direto à aba via gspread — só existe com Service Account.
+        # Na primeira vez garante o cabeçalho.
+        if self._aba is None:
+            aba = self.conn.client._select_worksheet(spreadsheet=self.planilha_url)
+            if not aba.row_values(1):
+                aba.update(range_name="A1", values=[COLUNAS])
+            self._aba = aba
+        return self._aba
+
+    def _aba_remedios(self, criar=True):
+        # Aba de remédios, achada pela planilha da aba principal. Só a gravação
+        # (criar=True) cria a aba e o cabeçalho; numa leitura, sem a aba ainda
+        # volta None e a tabela conta como vazia
+        if self._aba_rem is None:
+            import gspread
+            planilha = self._aba_planilha().spreadsheet
+            try:
+                aba = planilha.worksheet(self.ABA_REMEDIOS)
+            except gspread.WorksheetNotFound:
+                if not criar:
+                    return None
+                aba = planilha.add_worksheet(title=self.ABA_REMEDIOS, rows=1000,
+                                             cols=len(COLUNAS_REMEDIOS))
+            if not aba.row_values(1):
+                if not criar:
+                    return None
+                aba.update(range_name="A1", values=[COLUNAS_REMEDIOS])
+            self._aba_rem = aba
+        return self._aba_rem
+
+    @classmethod
+    def conectar(cls, planilha_url):
+        # Fora do app (workers, ferramentas): a mesma conexão do Streamlit,
+        # com as credenciais de .streamlit/secrets.toml
+        import streamlit as st
+        from streamlit_gsheets import GSheetsConnection
+        return cls(st.connection("gsheets", type=GSheetsConnection), planilha_url)
+
+    def _chaves(self, aba, inicio=2):
+        # [(linha, data ISO, codigo_usuario)] da linha `inicio` até o fim,
+        # lendo só as colunas data e codigo_usuario
+        col_data = _coluna_a1(COLUNAS.index("data"))
+        col_codigo = _coluna_a1(COLUNAS.index("codigo_usuario"))
+        datas, codigos = aba.batch_get([f"{col_data}{inicio}:{col_data}",
+                                        f"{col_codigo}{inicio}:{col_codigo}"])
+        total = max(len(datas), len(codigos))
+        datas = [datas[i][0] if i < len(datas) and datas[i] else "" for i in range(total)]
+        codigos = [codigos[i][0] if i < len(codigos) and codigos[i] else ""
+                   for i in range(total)]
+        return list(zip(range(inicio, inicio + total),
+                        datas_iso(pd.Series(datas, dtype=object)), codigos))
+
+    def _chaves_desde(self, aba, marca):
+        # Chaves a partir de uma marca [linha, data, codigo_usuario] guardada
+        # antes. Se a linha já não tem essa chave, linhas acima dela foram
+        # apagadas (compactação, duplicatas do upsert): relê desde o começo
+        if marca:
+            linha, data, codigo = marca
+            chaves = self._chaves(aba, linha)
+            if chaves and chaves[0][1:] == (data, codigo):
+                return chaves
+        return self._chaves(aba)
+
+    @chamada_backend("ler_tudo")
+    def ler_tudo(self):
+        df = self.conn.read(spreadsheet=self.planilha_url, usecols=COLUNAS,
+                            ttl=self.ttl)
+        return df.dropna(how="all")
+
+    @chamada_backend("ler_alteracoes")
+    def ler_alteracoes(self, cursor=None):
+        # Cursor [linha, data, codigo_usuario]: a primeira linha do dia mais
+        # recente já visto. O app anexa em ordem e o upsert regrava no lugar,
+        # então tudo o que mudou desde o último ciclo está dessa linha para
+        # baixo: cada ciclo lê só essa cauda das colunas data e
+        # codigo_usuario, e o custo acompanha o dia, não a base. Como na
+        # versão genérica, quem gravou no último dia visto aparece de novo.
+        try:
+            aba = self._aba_planilha()
+        except (AttributeError, NotImplementedError):
+            return super().ler_alteracoes(cursor)
+        desde = cursor[1] if cursor else None
+        chaves = [(linha, data, codigo) for linha, data, codigo in self._chaves_desde(aba, cursor)
+                  if DATA_ISO.fullmatch(data) and (desde is None or data >= desde)]
+        if not chaves:
+            return [], cursor
+        ultima = max(data for _, data, _ in chaves)
+        marca = next([linha, data, codigo] for linha, data, codigo in chaves if data == ultima)
+        return list(dict.fromkeys(codigo for _, _, codigo in chaves if codigo)), marca
+
+    @chamada_backend("ler_recentes")
+    def ler_recentes(self, codigos, inicio):
+        # Acha pelas colunas-chave as linhas dos codigos com data >= inicio e
+        # baixa só o trecho da planilha entre a primeira e a última delas. A
+        # primeira linha com data >= inicio fica marcada (mesmo esquema do
+        # cursor de ler_alteracoes), então a próxima chamada não relê o
+        # começo da planilha.
+        try:
+            aba = self._aba_planilha()
+        except (AttributeError, NotImplementedError):
+            return super().ler_recentes(codigos, inicio)
+        inicio = str(inicio)
+        marca = self._marca_recentes
+        if marca and marca[1] > inicio:
+            marca = None
+        chaves = [(linha, data, codigo) for linha, data, codigo in self._chaves_desde(aba, marca)
+                  if DATA_ISO.fullmatch(data) and data >= inicio]
+        if not chaves:
+            return pd.DataFrame(columns=COLUNAS)
+        self._marca_recentes = list(chaves[0])
+        codigos = set(codigos)
+        linhas = [linha for linha, _, codigo in chaves if codigo in codigos]
+        if not linhas:
+            return pd.DataFrame(columns=COLUNAS)
+        primeira, ultima = min(linhas), max(linhas)
+        valores = aba.get(f"A{primeira}:{_coluna_a1(len(COLUNAS) - 1)}{ultima}")
+        largura = len(COLUNAS)
+        trecho = [(list(v) + [""] * largura)[:largura] for v in valores]
+        trecho += [[""] * largura] * (ultima - primeira + 1 - len(trecho))
+        return pd.DataFrame([trecho[linha - primeira] for linha in linhas], columns=COLUNAS)
+
+    @chamada_backend("ler_remedios")
+    def ler_remedios(self, codigo_usuario=None):
+        # Aba pequena (uma linha por mudança): lida inteira e filtrada aqui
+        aba = self._aba_remedios(criar=False)
+        linhas = aba.get_all_values() if aba is not None else []
+        df = pd.DataFrame(linhas[1:], columns=linhas[0] if linhas else COLUNAS_REMEDIOS)
+        df = normalizar_remedios(df.to_dict("records"))
+        if codigo_usuario is not None:
+            df = df[df["codigo_usuario"] == codigo_usuario]
+        return df
+
+    @chamada_backend("anexar_remedios")
+    def anexar_remedios(self, registros):
+        if not registros:
+            return
+        valores = normalizar_remedios(registros).astype(object).values.tolist()
+        self._aba_remedios().append_rows(valores, value_input_option="RAW",
+                                         table_range="A1")
+
+    @chamada_backend("anexar")
+    def anexar(self, registros):
+        # Envia só as linhas novas (uma chamada append_rows), sem baixar a planilha
+        if not registros:
+            return
+        novos = normalizar_registros(registros)
+        try:
+            aba = self._aba_planilha()
+        except (AttributeError, NotImplementedError):
+            # Cliente de planilha pública não tem gspread — cai no modo antigo
+            self.anexar_reescrevendo(registros)
+            return
+        valores = novos.astype(object).where(pd.notna(novos), "").values.tolist()
+        aba.append_rows(valores, value_input_option="USER_ENTERED",
+                        table_range="A1")
+
+    @chamada_backend("upsert")
+    def upsert(self, registros):
+        # Sem baixar a planilha: lê só as colunas data e codigo_usuario,
+        # sobrescreve no lugar a linha de cada (codigo_usuario, data) que já
+        # existe e anexa as novas. Duplicatas antigas da mesma chave são
+        # apagadas (fica a última, atualizada), todas numa só chamada.
+        # As linhas são endereçadas pelo número: se outro processo anexou ou
+        # apagou linhas depois da leitura, a gravação cairia na linha de outro
+        # paciente. Por isso a versão (número de linhas) é conferida antes de
+        # gravar e a mudança vira ConflitoVersao (o CoordenadorGravacao relê
+        # e repete). Sobra a mesma janela curta do versao().
+        if not registros:
+            return
+        novos = deduplicar(normalizar_registros(registros))
+        try:
+            aba = self._aba_planilha()
+        except (AttributeError, NotImplementedError):
+            super().upsert(registros)
+            return
+        versao = self.versao()
+        linhas_da_chave = {}
+        for numero, data, codigo in self._chaves(aba):
+            linhas_da_chave.setdefault((codigo, data), []).append(numero)
+
+        valores = novos.astype(object).where(pd.notna(novos), "").values.tolist()
+        ultima = _coluna_a1(len(COLUNAS) - 1)
+        atualizacoes, apagar, anexar = [], [], []
+        for linha, codigo, data in zip(valores, novos["codigo_usuario"], novos["data"]):
+            existentes = linhas_da_chave.get((str(codigo), data_iso(data)))
+            if existentes:
+                alvo = existentes[-1]
+                atualizacoes.append({"range": f"A{alvo}:{ultima}{alvo}", "values": [linha]})
+                apagar.extend(existentes[:-1])
+            else:
+                anexar.append(linha)
+        self._conferir_versao(versao)
+        if atualizacoes:
+            aba.batch_update(atualizacoes, value_input_option="USER_ENTERED")
+        if apagar:
+            # De baixo para cima, para não deslocar as linhas que ainda vão sair
+            aba.spreadsheet.batch_update({"requests": [
+                {"deleteDimension": {"range": {"sheetId": aba.id, "dimension": "ROWS",
+                                               "startIndex": numero - 1, "endIndex": numero}}}
+                for numero in sorted(set(apagar), reverse=True)]})
+        if anexar:
+            aba.append_rows(anexar, value_input_option="USER_ENTERED", table_range="A1")
+
+    @chamada_backend("versao")
+    def versao(self):
+        # A planilha não tem versão: usa o número de linhas preenchidas na
+        # coluna A. Não é uma gravação condicional de verdade (sobra uma
+        # janela entre conferir e gravar), mas pega a maioria das colisões
+        # entre processos; dentro do processo quem serializa é o
+        # CoordenadorGravacao.
+        try:
+            return len(self._aba_planilha().col_values(1))
+        except (AttributeError, NotImplementedError):
+            return None
+
+    @chamada_backend("reescrever")
+    def reescrever(self, df, versao_esperada=None):
+        for col in COLUNAS:
+            if col not in df.columns:
+                df[col] = ""
+        self._conferir_versao(versao_esperada)
+        self.conn.update(spreadsheet=self.planilha_url, data=df[COLUNAS])
+
+
+# ─── SQLITE LOCAL ─────────────────────────────────────────────
+class ArmazenamentoSQLite(Armazenamento):
+    # Base local indexada por (codigo_usuario, data). Serve para produção em
+    # um único servidor e para rodar testes e benchmarks sem rede.
+    motor = "sqlite"
+
+    def __init__(self, caminho="diario.db"):
+        self.caminho = caminho
+        self._trava = threading.Lock()
+        self._con = sqlite3.connect(caminho, check_same_thread=False)
+        colunas_sql = ", ".join(
+            f'"{c}" INTEGER' if c in METRICAS else f'"{c}" TEXT' for c in COLUNAS)
+        with self._trava, self._con:
+            self._con.execute(f"CREATE TABLE IF NOT EXISTS registros ({colunas_sql})")
+            self._con.execute("CREATE INDEX IF NOT EXISTS idx_usuario_data "
+                              "ON registros (codigo_usuario, data)")
+            self._con.execute("CREATE TABLE IF NOT EXISTS remedios (codigo_usuario TEXT, "
+                              "versao INTEGER, desde TEXT, remedios TEXT)")
+            self._con.execute("CREATE INDEX IF NOT EXISTS idx_remedios_usuario "
+                              "ON remedios (codigo_usuario, versao)")
+            # Diário de gravações: um código por paciente em cada gravação,
+            # lido por ler_alteracoes a partir do último seq visto
+            self._con.execute("CREATE TABLE IF NOT EXISTS alteracoes (seq INTEGER "
+                              "PRIMARY KEY AUTOINCREMENT, codigo_usuario TEXT)")
+            self._con.execute("CREATE TABLE IF NOT EXISTS meta "
+                              "(chave TEXT PRIMARY KEY, valor INTEGER)")
+            self._con.execute("INSERT OR IGNORE INTO meta VALUES ('versao', 0)")
+
+    def _consultar(self, where="", params=()):
+        sql = f"SELECT * FROM registros {where} ORDER BY rowid"
+        with self._trava:
+            df = pd.read_sql_query(sql, self._con, params=params)
+        return df[COLUNAS]
+
+    def _linhas(self, df):
+        df = df.astype(object).where(pd.notna(df), None)
+        return [tuple(None if v == "" and c in METRICAS else v
+                      for c, v in zip(COLUNAS, linha))
+                for linha in df[COLUNAS].itertuples(index=False)]
+
+    def _inserir(self, cur, df):
+        marcadores = ", ".join("?" for _ in COLUNAS)
+        cur.executemany(f"INSERT INTO registros VALUES ({marcadores})", self._linhas(df))
+        cur.executemany("INSERT INTO alteracoes (codigo_usuario) VALUES (?)",
+                        [(c,) for c in df["codigo_usuario"].dropna().unique()])
+        cur.execute("UPDATE meta SET valor = valor + 1 WHERE chave = 'versao'")
+
+    def _versao(self):
+        return self._con.execute(
+            "SELECT valor FROM meta WHERE chave = 'versao'").fetchone()[0]
+
+    @chamada_backend("versao")
+    def versao(self):
+        with self._trava:
+            return self._versao()
+
+    @chamada_backend("ler_tudo")
+    def ler_tudo(self):
+        return self._consultar()
+
+    @chamada_backend("ler_usuario")
+    def ler_usuario(self, codigo_usuario):
+        return self._consultar("WHERE codigo_usuario = ?", (codigo_usuario,))
+
+    @chamada_backend("ler_intervalo")
+    def ler_intervalo(self, codigo_usuario, inicio=None, fim=None):
+        where, params = "WHERE codigo_usuario = ?", [codigo_usuario]
+        if inicio is not None:
+            where += " AND data >= ?"
+            params.append(str(inicio))
+        if fim is not None:
+            where += " AND data <= ?"
+            params.append(str(fim))
+        return self._consultar(where, tuple(params))
+
+    @chamada_backend("ler_recentes")
+    def ler_recentes(self, codigos, inicio):
+        codigos = list(codigos)
+        partes = []
+        for i in range(0, len(codigos), 500):
+            lote = codigos[i:i + 500]
+            marcadores = ", ".join("?" for _ in lote)
+            partes.append(self._consultar(
+                f"WHERE codigo_usuario IN ({marcadores}) AND data >= ?",
+                (*lote, str(inicio))))
+        if not partes:
+            return pd.DataFrame(columns=COLUNAS)
+        return pd.concat(partes, ignore_index=True)
+
+    @chamada_backend("ler_alteracoes")
+    def ler_alteracoes(self, cursor=None):
+        with self._trava:
+            linhas = self._con.execute(
+                "SELECT seq, codigo_usuario FROM alteracoes WHERE seq > ? ORDER BY seq",
+                (cursor or 0,)).fetchall()
+        if not linhas:
+            return [], cursor
+        return list(dict.fromkeys(c for _, c in linhas)), linhas[-1][0]
+
+    @chamada_backend("anexar")
+    def anexar(self, registros):
+        if not registros:
+            return
+        novos = normalizar_registros(registros)
+        with self._trava, self._con:
+            self._inserir(self._con, novos)
+
+    @chamada_backend("ler_remedios")
+    def ler_remedios(self, codigo_usuario=None):
+        where, params = "", ()
+        if codigo_usuario is not None:
+            where, params = "WHERE codigo_usuario = ?", (codigo_usuario,)
+        sql = f"SELECT * FROM remedios {where} ORDER BY versao, rowid"
+        with self._trava:
+            return pd.read_sql_query(sql, self._con, params=params)[COLUNAS_REMEDIOS]
+
+    @chamada_backend("anexar_remedios")
+    def anexar_remedios(self, registros):
+        if not registros:
+            return
+        linhas = normalizar_remedios(registros).itertuples(index=False)
+        with self._trava, self._con:
+            self._con.executemany("INSERT INTO remedios VALUES (?, ?, ?, ?)",
+                                  [tuple(l) for l in linhas])
+
+    @chamada_backend("upsert")
+    def upsert(self, registros):
+        if not registros:
+            return
+        novos = deduplicar(normalizar_registros(registros))
+        chaves = list(zip(novos["codigo_usuario"], novos["data"].astype(str)))
+        with self._trava, self._con:
+            self._con.executemany(
+                "DELETE FROM registros WHERE codigo_usuario = ? AND data = ?", chaves)
+            self._inserir(self._con, novos)
+
+    @chamada_backend("reescrever")
+    def reescrever(self, df, versao_esperada=None):
+        with self._trava, self._con:
+            # Conferência e gravação na mesma transação: aqui é atômico
+            if versao_esperada is not None and self._versao() != versao_esperada:
+                raise ConflitoVersao("a base foi alterada por outra gravação")
+            self._con.execute("DELETE FROM registros")
+            self._inserir(self._con, normalizar_registros(df.to_dict("records")))
+
+    def liberar_espaco(self):
+        # Depois de uma compactação: devolve ao disco as páginas livres
+        with self._trava:
+            self._con.execute("VACUUM")
+
+
+# ─── SUBSTITUTO LOCAL DA PLANILHA ─────────────────────────────
+class ArmazenamentoMemoria(Armazenamento):
+    # Imita a planilha para testes de estresse e de carga: guarda tudo num
+    # DataFrame e cada chamada paga a latência de rede configurada (fixa,
+    # mais uma cauda exponencial de média `variacao`, como uma API remota
+    # que às vezes demora). Como na planilha, reescrever troca a base
+    # inteira — sem coordenação, duas gravações simultâneas perdem linhas.
+    motor = "memoria"
+
+    def __init__(self, latencia=0.0, variacao=0.0):
+        self.latencia = latencia
+        self.variacao = variacao
+        self.chamadas = 0
+        self._df = pd.DataFrame(columns=COLUNAS)
+        self._remedios = pd.DataFrame(columns=COLUNAS_REMEDIOS)
+        self._alteracoes = []
+        self._versao = 0
+        self._trava = threading.Lock()
+
+    def _rede(self):
+        with self._trava:
+            self.chamadas += 1
+        espera = self.latencia
+        if self.variacao:
+            espera += random.expovariate(1 / self.variacao)
+        if espera:
+            time.sleep(espera)
+
+    @chamada_backend("versao")
+    def versao(self):
+        self._rede()
+        with self._trava:
+            return self._versao
+
+    @chamada_backend("ler_tudo")
+    def ler_tudo(self):
+        self._rede()
+        with self._trava:
+            return self._df.copy()
+
+    @chamada_backend("anexar")
+    def anexar(self, registros):
+        if not registros:
+            return
+        novos = normalizar_registros(registros)
+        self._rede()
+        with self._trava:
+            self._df = pd.concat([self._df, novos], ignore_index=True)
+            self._alteracoes.extend(novos["codigo_usuario"].dropna().unique())
+            self._versao += 1
+
+    @chamada_backend("ler_alteracoes")
+    def ler_alteracoes(self, cursor=None):
+        self._rede()
+        with self._trava:
+            codigos = self._alteracoes[cursor or 0:]
+            return list(dict.fromkeys(codigos)), len(self._alteracoes)
+
+    @chamada_backend("ler_remedios")
+    def ler_remedios(self, codigo_usuario=None):
+        self._rede()
+        with self._trava:
+            df = self._remedios.copy()
+        if codigo_usuario is not None:
+            df = df[df["codigo_usuario"] == codigo_usuario]
+        return df
+
+    @chamada_backend("anexar_remedios")
+    def anexar_remedios(self, registros):
+        if not registros:
+            return
+        novos = normalizar_remedios(registros)
+        self._rede()
+        with self._trava:
+            self._remedios = pd.concat([self._remedios, novos], ignore_index=True)
+
+    @chamada_backend("upsert")
+    def upsert(self, registros):
+        # Mesmo padrão do upsert da planilha: lê a versão e as chaves, decide
+        # quais linhas trocar e só depois grava as linhas do lote, conferindo
+        # a versão. Gravou alguém no meio (outra réplica): ConflitoVersao
+        if not registros:
+            return
+        novos = deduplicar(normalizar_registros(registros))
+        chaves = set(novos["codigo_usuario"].astype(str) + "|" + datas_iso(novos["data"]))
+        self._rede()
+        with self._trava:
+            versao = self._versao
+            atuais = self._df["codigo_usuario"].astype(str) + "|" + datas_iso(self._df["data"])
+            manter = ~atuais.isin(chaves).to_numpy()
+        self._rede()
+        with self._trava:
+            if self._versao != versao:
+                raise ConflitoVersao("a base foi alterada por outra gravação")
+            self._df = pd.concat([self._df[manter], novos], ignore_index=True)
+            self._alteracoes.extend(novos["codigo_usuario"].dropna().unique())
+            self._versao += 1
+
+    @chamada_backend("reescrever")
+    def reescrever(self, df, versao_esperada=None):
+        df = df.reindex(columns=COLUNAS, fill_value="")
+        self._rede()
+        with self._trava:
+            if versao_esperada is not None and self._versao != versao_esperada:
+                raise ConflitoVersao("a base foi alterada por outra gravação")
+            self._df = df.reset_index(drop=True)
+            self._alteracoes.extend(df["codigo_usuario"].dropna().unique())
+            self._versao += 1
+
+
+# ─── COORDENAÇÃO DE GRAVAÇÕES ─────────────────────────────────
+class CoordenadorGravacao:
+    # Serializa as gravações de todas as sessões do processo e, quando a
+    # base muda por fora (outro processo), refaz a operação após um recuo
+    # exponencial. Nenhuma linha é descartada em silêncio: esgotadas as
+    # tentativas, o ConflitoVersao sobe para quem chamou.
+    def __init__(self, armazenamento, tentativas=6, espera=0.05):
+        self.armazenamento = armazenamento
+        self.tentativas = tentativas
+        self.espera = espera
+        self.conflitos = 0
+        self._trava = threading.Lock()
+
+    def executar(self, operacao, *args):
+        with self._trava:
+            for tentativa in range(self.tentativas):
+                try:
+                    return operacao(*args)
+                except ConflitoVersao:
+                    self.conflitos += 1
+                    if tentativa == self.tentativas - 1:
+                        raise
+                    time.sleep(self.espera * 2 ** tentativa * random.uniform(0.5, 1.5))
+
+    def anexar(self, registros, modo="anexar"):
+        if modo == "upsert":
+            return self.upsert(registros)
+        if modo == "anexar":
+            return self.executar(self.armazenamento.anexar, registros)
+        return self.executar(self.armazenamento.anexar_reescrevendo, registros)
+
+    def upsert(self, registros):
+        return self.executar(self.armazenamento.upsert, registros)
+
+
+# ─── GRAVAÇÃO EM LOTE ─────────────────────────────────────────
+class GravadorEmLote:
+    # Junta registros pendentes numa única chamada de gravação.
+    # gravar() bloqueia até a linha estar salva: quem pega a vez descarrega
+    # tudo o que estiver na fila, inclusive os pedidos de outras sessões que
+    # chegaram enquanto a gravação anterior estava em andamento.
+    def __init__(self, funcao_gravar):
+        self._funcao_gravar = funcao_gravar
+        self._trava_fila = threading.Lock()
+        self._trava_gravacao = threading.Lock()
+        self._pendentes = []
+
+    def adicionar(self, dados_dict):
+        pedido = {"dados": dados_dict, "feito": False, "erro": None}
+        with self._trava_fila:
+            self._pendentes.append(pedido)
+        return pedido
+
+    def pendentes(self):
+        with self._trava_fila:
+            return len(self._pendentes)
+
+    def descarregar(self):
+        with self._trava_gravacao:
+            self._descarregar()
+
+    def gravar(self, dados_dict):
+        pedido = self.adicionar(dados_dict)
+        with self._trava_gravacao:
+            if not pedido["feito"]:
+                self._descarregar()
+        if pedido["erro"] is not None:
+            raise pedido["erro"]
+
+    def _descarregar(self):
+        with self._trava_fila:
+            lote, self._pendentes = self._pendentes, []
+        if not lote:
+            return
+        try:
+            self._funcao_gravar([p["dados"] for p in lote])
+        except Exception as e:
+            for p in lote:
+                p["erro"] = e
+        finally:
+            for p in lote:
+                p["feito"] = True
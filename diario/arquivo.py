@@ -0,0 +1,135 @@
+"""Arquivo frio do histórico: linhas antigas em arquivos Arrow por mês.
+
+A base quente (planilha ou SQLite) fica só com os últimos dias; o resto vai
+para DIRETORIO/AAAA-MM.arrow, no formato IPC do Arrow, já tipado (métricas
+int8 com nulos, data em timestamp, textos em dicionário). A leitura usa
+memory map: o sistema operacional só traz do disco as páginas tocadas e nada
+é copiado para o heap antes do filtro por paciente.
+
+Quem precisa do histórico longo (resumo semanal, padrões por dia da semana)
+lê arquivo + base quente pelo ServicoDiario; o caminho diário não passa aqui.
+"""
+import os
+import re
+import threading
+from datetime import date, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from diario.armazenamento import datas_iso, deduplicar
+from diario.esquema import COLUNAS
+from diario.instrumentacao import chamada_backend, contar
+from diario.tipagem import concatenar, tipar
+
+NOME_MES = re.compile(r"^(\d{4})-(\d{2})\.arrow$")
+
+
+def _mes(valor):
+    return str(valor)[:7]
+
+
+def _para_pandas(tabela):
+    df = tabela.to_pandas(types_mapper={pa.int8(): pd.Int8Dtype()}.get)
+    return tipar(df) if df.empty else df[COLUNAS]
+
+
+# ─── ARQUIVO POR MÊS ──────────────────────────────────────────
+class ArquivoHistorico:
+    # Um arquivo por mês, com as linhas ordenadas por paciente e data. Gravar
+    # um mês junta o que já estava lá com as linhas novas (um registro por
+    # codigo_usuario/data, fica o mais novo) e troca o arquivo de uma vez.
+    motor = "arquivo"
+
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        os.makedirs(diretorio, exist_ok=True)
+        self._trava = threading.Lock()
+
+    def _caminho(self, mes):
+        return os.path.join(self.diretorio, f"{mes}.arrow")
+
+    def meses(self):
+        return sorted(f"{m.group(1)}-{m.group(2)}" for m in
+                      map(NOME_MES.match, os.listdir(self.diretorio)) if m)
+
+    def _ler_mes(self, mes, codigo_usuario=None):
+        with pa.memory_map(self._caminho(mes), "r") as origem:
+            tabela = pa.ipc.open_file(origem).read_all()
+        if codigo_usuario is not None:
+            tabela = tabela.filter(pc.equal(tabela["codigo_usuario"],
+                                            pa.scalar(codigo_usuario)))
+        return tabela
+
+    @chamada_backend("ler")
+    def ler(self, codigo_usuario=None, inicio=None, fim=None):
+        # inicio/fim: datas (ou texto ISO), ambas inclusivas; None = sem limite
+        meses = [m for m in self.meses()
+                 if (inicio is None or m >= _mes(inicio))
+                 and (fim is None or m <= _mes(fim))]
+        tabelas = [self._ler_mes(m, codigo_usuario) for m in meses]
+        tabelas = [t for t in tabelas if t.num_rows]
+        if not tabelas:
+            return tipar(pd.DataFrame(columns=COLUNAS))
+        # Uma conversão só para pandas, com os dicionários dos meses unidos
+        df = _para_pandas(pa.concat_tables(tabelas).unify_dictionaries())
+        if inicio is not None:
+            df = df[df["data"] >= pd.Timestamp(inicio)]
+        if fim is not None:
+            df = df[df["data"] <= pd.Timestamp(fim)]
+        return df.reset_index(drop=True)
+
+    @chamada_backend("gravar")
+    def gravar(self, df):
+        # Acrescenta linhas (cruas ou tipadas) aos meses correspondentes
+        if df.empty:
+            return
+        df = tipar(df)
+        df = df[df["data"].notna()]
+        with self._trava:
+            for mes, linhas in df.groupby(df["data"].dt.strftime("%Y-%m"), sort=True):
+                caminho = self._caminho(mes)
+                if os.path.exists(caminho):
+                    linhas = concatenar(_para_pandas(self._ler_mes(mes)), linhas)
+                linhas = deduplicar(linhas)
+                linhas = linhas.sort_values(["codigo_usuario", "data"], kind="stable")
+                tabela = pa.Table.from_pandas(linhas[COLUNAS], preserve_index=False)
+                temporario = f"{caminho}.{os.getpid()}.tmp"
+                with pa.OSFile(temporario, "wb") as destino, \
+                        pa.ipc.new_file(destino, tabela.schema) as escritor:
+                    escritor.write_table(tabela)
+                os.replace(temporario, caminho)
+                contar("arquivo_meses_gravados")
+
+    def resumo(self):
+        meses = self.meses()
+        return {"meses": len(meses),
+                "primeiro": meses[0] if meses else None,
+                "ultimo": meses[-1] if meses else None,
+                "bytes": sum(os.path.getsize(self._caminho(m)) for m in meses)}
+
+
+def arquivar_antigos(armazenamento, arquivo, horizonte_dias=90, hoje=None,
+                     simular=False):
+    # Move para o arquivo as linhas com data anterior a hoje - horizonte e
+    # regrava a base quente sem elas, condicionado à versão lida
+    # (ConflitoVersao se alguém gravou no meio; rode pelo CoordenadorGravacao).
+    # Gravar o arquivo antes da base torna a repetição segura: o mês é
+    # regravado com as mesmas linhas, sem duplicar. Linhas com data ilegível
+    # ficam na base quente.
+    corte = (hoje or date.today()) - timedelta(days=horizonte_dias)
+    versao = armazenamento.versao()
+    df = armazenamento.ler_tudo().reset_index(drop=True)
+    datas = pd.to_datetime(datas_iso(df["data"].astype(object)), format="%Y-%m-%d",
+                           errors="coerce")
+    antigas = (datas < pd.Timestamp(corte)).to_numpy()
+    movidas = df[antigas]
+    if len(movidas) and not simular:
+        arquivo.gravar(movidas)
+        armazenamento.reescrever(df[~antigas].reset_index(drop=True),
+                                 versao_esperada=versao)
+    return {"corte":          str(corte),
+            "linhas_antes":   len(df),
+            "linhas_movidas": len(movidas),
+            "linhas_quentes": len(df) - len(movidas)}
@@ -0,0 +1,260 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from diario.armazenamento import datas_iso
+from diario.tipagem import concatenar
+
+
+class ContadoresCache:
+    # Acertos/falhas para conferir, em produção, quantas leituras realmente
+    # foram até o armazenamento.
+    def __init__(self):
+        self.acertos = 0
+        self.falhas  = 0
+
+    def estatisticas(self):
+        total = self.acertos + self.falhas
+        return {"acertos": self.acertos,
+                "falhas":  self.falhas,
+                "taxa_acerto": round(self.acertos / total, 4) if total else 0.0}
+
+
+def _juntar(df, novos):
+    if df is None or df.empty:
+        return novos.reset_index(drop=True)
+    return concatenar(df, novos)
+
+
+def _posicoes_mesma_chave(df, novos):
+    # Posições das linhas de df com o mesmo (codigo_usuario, data) de novos.
+    # Filtra primeiro pelos códigos (vetorizado) e só compara datas nelas.
+    if df is None or df.empty:
+        return np.array([], dtype=int)
+    chaves = set(zip(novos["codigo_usuario"].astype(str), datas_iso(novos["data"])))
+    pos = np.flatnonzero(df["codigo_usuario"].isin(novos["codigo_usuario"]).to_numpy())
+    if not pos.size:
+        return pos
+    sub = df.iloc[pos]
+    mesma = [chave in chaves for chave in
+             zip(sub["codigo_usuario"].astype(str), datas_iso(sub["data"]))]
+    return pos[np.array(mesma, dtype=bool)]
+
+
+def _substituir(df, novos):
+    # Semântica de upsert: tira as linhas com a mesma chave e anexa as novas
+    remover = _posicoes_mesma_chave(df, novos)
+    if remover.size:
+        manter = np.ones(len(df), dtype=bool)
+        manter[remover] = False
+        df = df[manter]
+    return _juntar(df, novos)
+
+
+# ─── CACHE DA BASE INTEIRA ────────────────────────────────────
+class CacheDados(ContadoresCache):
+    # Cache write-through da leitura completa (ler_dados). Depois de uma
+    # gravação bem-sucedida as linhas novas são aplicadas na cópia em
+    # memória, então a leitura seguinte já enxerga o registro sem voltar à
+    # rede. ttl opcional (segundos) protege contra edições feitas direto na
+    # planilha, fora do app.
+    def __init__(self, carregar, ttl=None):
+        super().__init__()
+        self._carregar = carregar
+        self.ttl = ttl
+        self._df = None
+        self._carregado_em = 0.0
+        # Muda a cada gravação: uma carga que começou antes dela não é guardada
+        self._geracao = 0
+        self._trava = threading.Lock()
+
+    def _valido(self):
+        if self._df is None:
+            return False
+        return self.ttl is None or time.monotonic() - self._carregado_em < self.ttl
+
+    def obter(self):
+        with self._trava:
+            if self._valido():
+                self.acertos += 1
+                return self._df
+            self.falhas += 1
+            geracao = self._geracao
+        df = self._carregar()
+        with self._trava:
+            if geracao == self._geracao:
+                self._df = df
+                self._carregado_em = time.monotonic()
+        return df
+
+    def anexar_linhas(self, novos):
+        with self._trava:
+            self._geracao += 1
+            if self._df is not None:
+                self._df = _juntar(self._df, novos)
+
+    def substituir_linhas(self, novos):
+        with self._trava:
+            self._geracao += 1
+            if self._df is not None:
+                self._df = _substituir(self._df, novos)
+
+    def invalidar(self):
+        with self._trava:
+            self._geracao += 1
+            self._df = None
+
+
+# ─── CACHE POR USUÁRIO ────────────────────────────────────────
+class CacheUsuarios(ContadoresCache):
+    # Cache em memória particionado por codigo_usuario, com limite de
+    # partições e despejo LRU. Cada sessão só carrega e mantém as próprias
+    # linhas, então o custo acompanha o histórico de um paciente e não o da
+    # clínica inteira. Também é write-through: anexar_linhas atualiza a
+    # partição já carregada em vez de descartá-la.
+    def __init__(self, carregar, max_usuarios=500, ttl=None):
+        super().__init__()
+        self._carregar = carregar
+        self.max_usuarios = max_usuarios
+        self.ttl = ttl
+        self._particoes = OrderedDict()
+        # Versão por usuário: muda sempre que as linhas dele mudam (gravação,
+        # recarga ou invalidação). Serve de chave para derivações por sessão
+        # e de geração por usuário: uma carga só é guardada se a versão dele
+        # não mudou no meio, então a gravação de um paciente não descarta a
+        # carga em andamento de outro. _geracao só muda no invalidar geral.
+        self._geracao = 0
+        self._versoes = {}
+        self._trava = threading.Lock()
+
+    def __len__(self):
+        with self._trava:
+            return len(self._particoes)
+
+    def __contains__(self, codigo_usuario):
+        with self._trava:
+            return codigo_usuario in self._particoes
+
+    def versao(self, codigo_usuario):
+        with self._trava:
+            return self._versoes.get(codigo_usuario, 0)
+
+    def _mudou(self, codigo_usuario):
+        self._versoes[codigo_usuario] = self._versoes.get(codigo_usuario, 0) + 1
+
+    def _geracao_de(self, codigo_usuario):
+        return self._geracao, self._versoes.get(codigo_usuario, 0)
+
+    def _valida(self, codigo_usuario):
+        if codigo_usuario not in self._particoes:
+            return False
+        _, carregado_em = self._particoes[codigo_usuario]
+        return self.ttl is None or time.monotonic() - carregado_em < self.ttl
+
+    def obter(self, codigo_usuario):
+        with self._trava:
+            if self._valida(codigo_usuario):
+                self.acertos += 1
+                self._particoes.move_to_end(codigo_usuario)
+                return self._particoes[codigo_usuario][0]
+            self.falhas += 1
+            geracao = self._geracao_de(codigo_usuario)
+        # Carrega fora da trava para não bloquear outros usuários na rede
+        df = self._carregar(codigo_usuario)
+        with self._trava:
+            if geracao == self._geracao_de(codigo_usuario):
+                self._particoes[codigo_usuario] = (df, time.monotonic())
+                self._particoes.move_to_end(codigo_usuario)
+                self._mudou(codigo_usuario)
+                while len(self._particoes) > self.max_usuarios:
+                    self._particoes.popitem(last=False)
+        return df
+
+    def anexar_linhas(self, codigo_usuario, novos):
+        with self._trava:
+            self._mudou(codigo_usuario)
+            if codigo_usuario in self._particoes:
+                df, carregado_em = self._particoes[codigo_usuario]
+                self._particoes[codigo_usuario] = (_juntar(df, novos), carregado_em)
+
+    def substituir_linhas(self, codigo_usuario, novos):
+        with self._trava:
+            self._mudou(codigo_usuario)
+            if codigo_usuario in self._particoes:
+                df, carregado_em = self._particoes[codigo_usuario]
+                self._particoes[codigo_usuario] = (_substituir(df, novos), carregado_em)
+
+    def tem_registro(self, codigo_usuario, novos):
+        # Alguma linha de novos já existe na partição? None se não está carregada
+        with self._trava:
+            if codigo_usuario not in self._particoes:
+                return None
+            df = self._particoes[codigo_usuario][0]
+        return bool(_posicoes_mesma_chave(df, novos).size)
+
+    def invalidar(self, codigo_usuario=None):
+        with self._trava:
+            if codigo_usuario is None:
+                self._geracao += 1
+                for codigo in list(self._versoes):
+                    self._mudou(codigo)
+                self._particoes.clear()
+            else:
+                self._mudou(codigo_usuario)
+                self._particoes.pop(codigo_usuario, None)
+
+
+# ─── REMÉDIOS VIGENTES ────────────────────────────────────────
+class CacheRemedios(ContadoresCache):
+    # Índice {codigo_usuario: última versão} da tabela de remédios. A tabela
+    # só cresce quando alguém muda a lista, então é lida inteira uma vez e
+    # depois mantida por write-through (registrar); a consulta é um dict.
+    def __init__(self, carregar, ttl=None):
+        super().__init__()
+        self._carregar = carregar
+        self.ttl = ttl
+        self._atuais = None
+        self._carregado_em = 0.0
+        self._geracao = 0
+        self._trava = threading.Lock()
+
+    def _valido(self):
+        if self._atuais is None:
+            return False
+        return self.ttl is None or time.monotonic() - self._carregado_em < self.ttl
+
+    def _indice(self):
+        with self._trava:
+            if self._valido():
+                self.acertos += 1
+                return self._atuais
+            self.falhas += 1
+            geracao = self._geracao
+        atuais = {}
+        for registro in self._carregar().to_dict("records"):
+            registro["versao"] = int(registro["versao"])
+            anterior = atuais.get(registro["codigo_usuario"])
+            if anterior is None or registro["versao"] >= anterior["versao"]:
+                atuais[registro["codigo_usuario"]] = registro
+        with self._trava:
+            if geracao == self._geracao:
+                self._atuais = atuais
+                self._carregado_em = time.monotonic()
+        return atuais
+
+    def atual(self, codigo_usuario):
+        # {codigo_usuario, versao, desde, remedios} ou None se nunca gravou
+        return self._indice().get(codigo_usuario)
+
+    def registrar(self, registro):
+        with self._trava:
+            self._geracao += 1
+            if self._atuais is not None:
+                self._atuais[registro["codigo_usuario"]] = dict(registro)
+
+    def invalidar(self):
+        with self._trava:
+            self._geracao += 1
+            self._atuais = None
@@ -0,0 +1,102 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from diario.esquema import METRICAS
+
+
+# ─── CO-MOMENTOS (WELFORD) ────────────────────────────────────
+class CoMomentos:
+    # Média e matriz de co-momentos das seis METRICAS, atualizadas registro
+    # a registro no estilo Welford (numericamente estável, sem somar
+    # quadrados grandes). Dois estados se combinam com a fórmula de Chan,
+    # então qualquer intervalo sai da junção dos estados diários. Só entram
+    # registros com as seis métricas preenchidas.
+    __slots__ = ("n", "media", "m2")
+
+    def __init__(self):
+        k = len(METRICAS)
+        self.n     = 0
+        self.media = np.zeros(k)
+        self.m2    = np.zeros((k, k))
+
+    def adicionar(self, valores):
+        if np.isnan(valores).any():
+            return
+        self.n += 1
+        delta = valores - self.media
+        self.media += delta / self.n
+        self.m2 += np.outer(delta, valores - self.media)
+
+    def __iadd__(self, outro):
+        if outro.n == 0:
+            return self
+        if self.n == 0:
+            self.n, self.media, self.m2 = outro.n, outro.media.copy(), outro.m2.copy()
+            return self
+        n = self.n + outro.n
+        delta = outro.media - self.media
+        self.media = self.media + delta * (outro.n / n)
+        self.m2 = self.m2 + outro.m2 + np.outer(delta, delta) * (self.n * outro.n / n)
+        self.n = n
+        return self
+
+    def copia(self):
+        nova = CoMomentos()
+        nova += self
+        return nova
+
+    def covariancia(self):
+        k = len(METRICAS)
+        if self.n < 2:
+            return pd.DataFrame(np.full((k, k), np.nan), index=METRICAS, columns=METRICAS)
+        m2 = (self.m2 + self.m2.T) / 2
+        return pd.DataFrame(m2 / (self.n - 1), index=METRICAS, columns=METRICAS)
+
+    def correlacao(self):
+        cov = self.covariancia().values
+        desvio = np.sqrt(np.clip(np.diag(cov), 0, None))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = cov / np.outer(desvio, desvio)
+        corr[~np.isfinite(corr)] = np.nan
+        return pd.DataFrame(np.clip(corr, -1, 1), index=METRICAS, columns=METRICAS)
+
+
+# ─── MOTOR DE CORRELAÇÃO ──────────────────────────────────────
+class MotorCorrelacao:
+    # Estado Welford por dia e do histórico inteiro. Correlação de qualquer
+    # intervalo = junção dos estados diários (custo pelo número de dias, não
+    # de linhas); histórico = O(1).
+    def __init__(self):
+        self.dias = {}
+        self.historico = CoMomentos()
+        self.ultimo_dia = None
+
+    def adicionar(self, dia, valores):
+        if dia not in self.dias:
+            self.dias[dia] = CoMomentos()
+        self.dias[dia].adicionar(valores)
+        self.historico.adicionar(valores)
+        if self.ultimo_dia is None or dia > self.ultimo_dia:
+            self.ultimo_dia = dia
+
+    def intervalo(self, inicio=None, fim=None):
+        if inicio is None and fim is None:
+            return self.historico.copia()
+        acumulado = CoMomentos()
+        if not self.dias:
+            return acumulado
+        inicio = inicio or min(self.dias)
+        fim = fim or self.ultimo_dia
+        if (fim - inicio).days + 1 <= len(self.dias):
+            dia = inicio
+            while dia <= fim:
+                if dia in self.dias:
+                    acumulado += self.dias[dia]
+                dia += timedelta(days=1)
+        else:
+            for dia in sorted(self.dias):
+                if inicio <= dia <= fim:
+                    acumulado += self.dias[dia]
+        return acumulado
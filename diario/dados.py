@@ -0,0 +1,227 @@
+import hashlib
+from datetime import date, timedelta
+
+import pandas as pd
+
+from diario.agregados import ArmazemAgregados
+from diario.analise import (calcular_risco_burnout, preparar_relatorio,
+                            remedios_das_linhas, resumo_de_agregados)
+from diario.armazenamento import (CoordenadorGravacao, GravadorEmLote,
+                                  deduplicar, normalizar_registros)
+from diario.cache import CacheDados, CacheRemedios, CacheUsuarios
+from diario.esquema import COLUNAS
+from diario.instrumentacao import etapa
+from diario.tipagem import CarregadorTipado, concatenar, tipar
+from diario.pdf import gerar_pdf, nome_arquivo_relatorio
+
+
+def gerar_codigo(nome, senha):
+    texto = f"{nome.strip().lower()}:{senha.strip()}"
+    return hashlib.md5(texto.encode()).hexdigest()[:8]
+
+
+# ─── SERVIÇO DE DADOS ─────────────────────────────────────────
+class ServicoDiario:
+    # Leitura com cache, gravação coordenada e agregados de um Armazenamento,
+    # sem nada de Streamlit. O app guarda uma instância por processo
+    # (st.cache_resource); a API HTTP, os scripts e os workers criam a sua.
+    # Tudo o que entra nos caches passa por tipar (diario.tipagem).
+    #
+    # arquivo: ArquivoHistorico opcional com as linhas antigas (diario.arquivo).
+    # O caminho diário (janela de 7 dias, risco) só lê a base quente; os
+    # agregados e o PDF, que usam o histórico longo, leem arquivo + base.
+    #
+    # medir_memoria: resumo de memória de cada carga (CarregadorTipado), só
+    # para diagnóstico; o app liga quando alguém abre o painel (?debug=1).
+    def __init__(self, armazenamento, max_usuarios=500, ttl=None, arquivo=None,
+                 medir_memoria=False):
+        self.armazenamento  = armazenamento
+        self.arquivo        = arquivo
+        self.coordenador    = CoordenadorGravacao(armazenamento)
+        self.carga_dados    = CarregadorTipado(armazenamento.ler_tudo, medir_memoria)
+        self.carga_usuarios = CarregadorTipado(armazenamento.ler_usuario, medir_memoria)
+        self.cache_dados    = CacheDados(self.carga_dados, ttl=ttl)
+        self.cache_usuarios = CacheUsuarios(self.carga_usuarios,
+                                            max_usuarios=max_usuarios, ttl=ttl)
+        self.cache_remedios = CacheRemedios(armazenamento.ler_remedios, ttl=ttl)
+        self.agregados      = ArmazemAgregados(self._carregar_historico,
+                                               max_usuarios=max_usuarios,
+                                               versao=self.cache_usuarios.versao)
+        self.gravador       = GravadorEmLote(self.salvar_registros)
+
+    def ler_dados(self):
+        try:
+            return self.cache_dados.obter()
+        except Exception:
+            return tipar(pd.DataFrame(columns=COLUNAS))
+
+    def ler_dados_usuario(self, codigo_usuario):
+        try:
+            return self.cache_usuarios.obter(codigo_usuario)
+        except Exception:
+            return tipar(pd.DataFrame(columns=COLUNAS))
+
+    def ler_historico_usuario(self, codigo_usuario):
+        # Arquivo + base quente; se o mesmo dia estiver nos dois, vale a base
+        return self._com_arquivo(codigo_usuario, self.ler_dados_usuario(codigo_usuario))
+
+    def _carregar_historico(self, codigo_usuario):
+        # Para os agregados: aqui um erro de leitura sobe em vez de virar um
+        # histórico vazio que ficaria guardado
+        return self._com_arquivo(codigo_usuario, self.cache_usuarios.obter(codigo_usuario))
+
+    def _com_arquivo(self, codigo_usuario, quentes):
+        if self.arquivo is None:
+            return quentes
+        antigas = self.arquivo.ler(codigo_usuario)
+        if antigas.empty:
+            return quentes
+        return deduplicar(concatenar(antigas, quentes)).reset_index(drop=True)
+
+    def agregados_usuario(self, codigo_usuario):
+        # Passa antes pelo cache por usuário: vencido o ttl ele relê a
+        # partição, a versão muda e os agregados são remontados com ela.
+        # Erro de leitura sobe (a API responde 500, o app avisa).
+        self.cache_usuarios.obter(codigo_usuario)
+        return self.agregados.obter(codigo_usuario)
+
+    def salvar_registros(self, registros, modo="upsert"):
+        # modo="upsert": um registro por (codigo_usuario, data); salvar de novo
+        # no mesmo dia substitui o anterior
+        # modo="anexar": envia só as linhas novas
+        # modo="reescrever": lê tudo, concatena e regrava a base inteira
+        if not registros:
+            return
+        registros = self._separar_remedios(registros)
+        self.coordenador.anexar(registros, modo=modo)
+        # Write-through: aplica as linhas gravadas nos caches em vez de reler.
+        # Agregados antes do cache por usuário: quando a versão do usuário
+        # muda, os agregados já incluem as linhas novas
+        novos = tipar(normalizar_registros(registros))
+        if modo != "upsert":
+            self.agregados.registrar(novos)
+            self.cache_dados.anexar_linhas(novos)
+            for codigo, linhas in novos.groupby("codigo_usuario", sort=False):
+                self.cache_usuarios.anexar_linhas(codigo, linhas)
+            return
+
+        novos = deduplicar(novos)
+        self.cache_dados.substituir_linhas(novos)
+        for codigo, linhas in novos.groupby("codigo_usuario", sort=False):
+            if self.cache_usuarios.tem_registro(codigo, linhas) is False:
+                self.agregados.registrar(linhas)
+                self.cache_usuarios.anexar_linhas(codigo, linhas)
+                continue
+            # Dia já registrado (ou partição fora do cache): os agregados não
+            # sabem descontar um registro, então são remontados a partir das
+            # linhas em cache — invalidados antes e depois da troca para não
+            # sobrar uma montagem feita com as linhas antigas
+            self.agregados.invalidar(codigo)
+            self.cache_usuarios.substituir_linhas(codigo, linhas)
+            self.agregados.invalidar(codigo)
+
+    def salvar_registro(self, dados_dict, modo="upsert"):
+        self.salvar_registros([dados_dict], modo=modo)
+
+    # ─── REMÉDIOS VERSIONADOS ─────────────────────────────────
+    # A lista de remédios não vai mais em cada linha diária: cada paciente
+    # tem versões numa tabela à parte, e só se grava uma nova quando o
+    # texto muda. Pacientes ainda não migrados (ferramentas.migrar_remedios)
+    # continuam lendo o texto repetido nas linhas antigas.
+    def versao_remedios(self, codigo_usuario):
+        try:
+            return self.cache_remedios.atual(codigo_usuario)
+        except Exception:
+            return None
+
+    def remedios_atuais(self, codigo_usuario):
+        atual = self.versao_remedios(codigo_usuario)
+        if atual is not None:
+            return atual["remedios"]
+        return remedios_das_linhas(self.ler_historico_usuario(codigo_usuario))
+
+    def atualizar_remedios(self, codigo_usuario, remedios, desde=None):
+        # Número da versão vigente depois da chamada (0 se nunca houve lista)
+        return self.coordenador.executar(self._gravar_remedios, codigo_usuario,
+                                         remedios or "", str(desde or date.today()))
+
+    def _gravar_remedios(self, codigo_usuario, remedios, desde):
+        # Direto no cache, sem o versao_remedios: se a leitura falhar, o erro
+        # sobe em vez de o paciente parecer novo e ganhar outra versão 1
+        atual = self.cache_remedios.atual(codigo_usuario)
+        if atual is None:
+            # Primeira versão: também vale para quem só tinha o texto nas
+            # linhas antigas, que passa a ter a lista na tabela
+            if not remedios.strip():
+                return 0
+        elif atual["remedios"] == remedios:
+            return atual["versao"]
+        registro = {"codigo_usuario": codigo_usuario,
+                    "versao":         (atual["versao"] if atual else 0) + 1,
+                    "desde":          desde,
+                    "remedios":       remedios}
+        self.armazenamento.anexar_remedios([registro])
+        self.cache_remedios.registrar(registro)
+        return registro["versao"]
+
+    def _separar_remedios(self, registros):
+        # Quem ainda manda "remedios" junto do registro diário (API, scripts
+        # antigos): o texto vira versão na tabela e a linha segue sem ele
+        limpos = []
+        for registro in registros:
+            remedios = registro.get("remedios")
+            if isinstance(remedios, str) and remedios.strip():
+                self.atualizar_remedios(registro["codigo_usuario"], remedios,
+                                        desde=registro.get("data"))
+                registro = dict(registro, remedios="")
+            limpos.append(registro)
+        return limpos
+
+    # ─── CONSULTAS DO RELATÓRIO ───────────────────────────────
+    def risco(self, codigo_usuario, hoje=None, dias=7):
+        # (risco, nivel) da janela de `dias` dias; None sem registro nela
+        limite = (hoje or date.today()) - timedelta(days=dias)
+        ultimos = self.agregados_usuario(codigo_usuario).ultimos_registros(desde=limite)
+        if ultimos.empty:
+            return None
+        return calcular_risco_burnout(ultimos)
+
+    def resumo_semanas(self, codigo_usuario):
+        return self.agregados_usuario(codigo_usuario).resumo_semanas()
+
+    def dados_relatorio(self, codigo_usuario, nome_usuario, remedios_salvos, hoje=None):
+        # Entradas das seções do relatório no app. "sem_registros" ou
+        # "sem_semana" quando não há o que mostrar.
+        ag = self.agregados_usuario(codigo_usuario)
+        if ag.total.registros == 0:
+            return "sem_registros"
+
+        # Só a janela de 7 dias vira datetime; o histórico inteiro fica nos agregados
+        limite   = (hoje or date.today()) - timedelta(days=7)
+        df_user  = self.cache_usuarios.obter(codigo_usuario)
+        with etapa("relatorio.janela_7dias"):
+            df_7dias = df_user[df_user["data"] >= pd.Timestamp(limite)]
+            df_7dias = df_7dias.sort_values("data")
+        if df_7dias.empty:
+            return "sem_semana"
+
+        # Uma única matriz de correlação da janela alimenta insights e mapa de
+        # calor; o PDF (pdf) usa o mesmo resumo_de_agregados
+        with etapa("relatorio.agregados"):
+            resumo = resumo_de_agregados(ag, len(df_7dias), limite)
+        return dict(resumo, ag=ag, df_7dias=df_7dias, nome_usuario=nome_usuario,
+                    remedios_salvos=remedios_salvos)
+
+    def pdf(self, codigo_usuario, hoje=None, dias=7):
+        # (nome do arquivo, bytes) do relatório dos últimos `dias` dias; None
+        # sem registro nessa janela. Risco, insights e padrões vêm dos mesmos
+        # agregados da tela, então o PDF mostra os números do app
+        hoje = hoje or date.today()
+        ag = self.agregados_usuario(codigo_usuario)
+        dados = preparar_relatorio(self._carregar_historico(codigo_usuario),
+                                   hoje=hoje, dias=dias, agregados=ag,
+                                   remedios=self.remedios_atuais(codigo_usuario))
+        if dados is None:
+            return None
+        return (nome_arquivo_relatorio(dados["nome_usuario"], hoje, codigo_usuario),
+                gerar_pdf(**dados).getvalue())
@@ -0,0 +1,7 @@
+# ─── ESQUEMA DOS REGISTROS ────────────────────────────────────
+METRICAS = ["Humor", "Sono", "Pressao", "Irritabilidade", "Bateria", "Nevoa"]
+COLUNAS  = ["data", "nome", "codigo_usuario", "Humor", "Irritabilidade",
+            "Bateria", "Sono", "Nevoa", "Pressao", "remedios"]
+
+# Remédios versionados: uma linha por mudança da lista de cada paciente
+COLUNAS_REMEDIOS = ["codigo_usuario", "versao", "desde", "remedios"]
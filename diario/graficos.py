@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from diario.esquema import METRICAS
+from diario.instrumentacao import cronometrar
+
+CORES_METRICAS = {
+    "Humor":          "#2196F3",
+    "Sono":           "#9C27B0",
+    "Pressao":        "#F44336",
+    "Irritabilidade": "#FF9800",
+    "Bateria":        "#4CAF50",
+    "Nevoa":          "#00BCD4"
+}
+# Acima disto cada série é reduzida por LTTB antes de virar traço do plotly
+MAX_PONTOS = 150
+
+
+# ─── REDUÇÃO DE PONTOS ────────────────────────────────────────
+def lttb(x, y, limite):
+    # Largest-Triangle-Three-Buckets: escolhe `limite` pontos que preservam o
+    # desenho da série (picos e vales ficam). Devolve as posições escolhidas,
+    # sempre com o primeiro e o último ponto. x e y: arrays numéricos sem NaN.
+    n = len(x)
+    if limite >= n or limite < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    bordas = np.linspace(1, n - 1, limite - 1).astype(int)
+    escolhidos = np.empty(limite, dtype=int)
+    escolhidos[0], escolhidos[-1] = 0, n - 1
+    a = 0
+    for i in range(limite - 2):
+        inicio, fim = bordas[i], bordas[i + 1]
+        # Vértice do próximo bucket: média dele (ou o último ponto)
+        prox_fim = bordas[i + 2] if i + 2 < len(bordas) else n
+        cx = x[fim:prox_fim].mean() if prox_fim > fim else x[-1]
+        cy = y[fim:prox_fim].mean() if prox_fim > fim else y[-1]
+        area = np.abs((x[a] - cx) * (y[inicio:fim] - y[a])
+                      - (x[a] - x[inicio:fim]) * (cy - y[a]))
+        a = inicio + int(np.argmax(area))
+        escolhidos[i + 1] = a
+    return escolhidos
+
+def _reduzir(x, y, limite):
+    # Tira os NaN e aplica LTTB; x pode ser datas
+    x = pd.Series(x).reset_index(drop=True)
+    y = pd.Series(y, dtype=float).reset_index(drop=True)
+    validos = y.notna().to_numpy()
+    x, y = x[validos], y[validos]
+    if len(y) <= limite:
+        return x, y
+    eixo = (x.astype("int64") if pd.api.types.is_datetime64_any_dtype(x)
+            else np.arange(len(x)))
+    pos = lttb(np.asarray(eixo, dtype=float), y.to_numpy(), limite)
+    return x.iloc[pos], y.iloc[pos]
+
+
+# ─── FIGURAS DO RELATÓRIO ─────────────────────────────────────
+@cronometrar("figura.risco")
+def figura_risco(risco, nivel_risco):
+    cor_barra = "#4CAF50" if risco < 40 else ("#FF9800" if risco < 70 else "#F44336")
+    fig_gauge = go.Figure(go.Indicator(
+        mode="gauge+number",
+        value=risco,
+        title={"text": f"Nível de Risco — {nivel_risco}", "font": {"size": 18, "color": "#333"}},
+        number={"suffix": "%", "font": {"size": 36, "color": "#333"}},
+        gauge={"axis": {"range": [0,100]}, "bar": {"color": cor_barra},
+               "steps": [{"range": [0,40],  "color": "#e8f5e9"},
+                          {"range": [40,70], "color": "#fff8e1"},
+                          {"range": [70,100],"color": "#ffebee"}]}
+    ))
+    fig_gauge.update_layout(paper_bgcolor="#f8f9fa", font=dict(color="#333"),
+                            height=280, margin=dict(l=30,r=30,t=60,b=20))
+    return fig_gauge
+
+@cronometrar("figura.evolucao")
+def figura_evolucao(df_7dias, max_pontos=MAX_PONTOS):
+    # Linhas por métrica + linha de tendência (regressão linear) pontilhada.
+    # A regressão usa todos os pontos; o traço leva no máximo max_pontos
+    # (LTTB) e a tendência, por ser reta, só as duas pontas.
+    fig = go.Figure()
+    marcador = 7 if len(df_7dias) <= 31 else 3
+    for metrica in METRICAS:
+        if metrica not in df_7dias.columns:
+            continue
+        x_traco, y_traco = _reduzir(df_7dias["data"], df_7dias[metrica], max_pontos)
+        fig.add_trace(go.Scatter(
+            x=x_traco, y=y_traco,
+            mode="lines+markers", name=metrica,
+            line=dict(color=CORES_METRICAS[metrica], width=2),
+            marker=dict(size=marcador)
+        ))
+        if len(df_7dias) >= 3:
+            x_num = np.arange(len(df_7dias))
+            y_val = df_7dias[metrica].values.astype(float)
+            try:
+                z = np.polyfit(x_num, y_val, 1)
+                p = np.poly1d(z)
+                sinal = "↑ subindo" if z[0] > 0.1 else ("↓ caindo" if z[0] < -0.1 else "→ estável")
+                pontas = x_num[[0, -1]]
+                fig.add_trace(go.Scatter(
+                    x=df_7dias["data"].iloc[pontas], y=p(pontas), mode="lines",
+                    name=f"Tendência {metrica} ({sinal})",
+                    line=dict(color=CORES_METRICAS[metrica], width=1, dash="dot"),
+                    opacity=0.45
+                ))
+            except:
+                pass
+    fig.update_layout(
+        plot_bgcolor="#ffffff", paper_bgcolor="#f8f9fa", font=dict(color="#333"),
+        legend=dict(bgcolor="#ffffff", bordercolor="#e0e0e0"),
+        xaxis=dict(gridcolor="#e0e0e0", title="Data"),
+        yaxis=dict(gridcolor="#e0e0e0", range=[0,6], tickmode="linear",
+                   dtick=1, title="Nível (1-5)"),
+        hovermode="x unified", margin=dict(l=20,r=20,t=40,b=20)
+    )
+    return fig
+
+@cronometrar("figura.perfil")
+def figura_perfil(df_7dias):
+    # Radar com a média de cada métrica
+    labels = [m for m in METRICAS if m in df_7dias.columns]
+    medias = [df_7dias[m].mean() for m in labels]
+    fig_radar = go.Figure(go.Scatterpolar(
+        r=medias + [medias[0]], theta=labels + [labels[0]],
+        fill="toself", fillcolor="rgba(33,150,243,0.15)",
+        line=dict(color="#2196F3", width=2), marker=dict(size=6)
+    ))
+    fig_radar.update_layout(
+        polar=dict(bgcolor="#ffffff",
+            radialaxis=dict(visible=True, range=[0,5], gridcolor="#e0e0e0", color="#555"),
+            angularaxis=dict(gridcolor="#e0e0e0", color="#333")),
+        paper_bgcolor="#f8f9fa", font=dict(color="#333"),
+        margin=dict(l=40,r=40,t=40,b=40)
+    )
+    return fig_radar
+
+@cronometrar("figura.correlacoes")
+def figura_correlacoes(corr_matrix):
+    fig_corr = px.imshow(corr_matrix, text_auto=True,
+                         color_continuous_scale="RdBu", zmin=-1, zmax=1,
+                         title="Quanto cada indicador influencia o outro")
+    fig_corr.update_layout(paper_bgcolor="#f8f9fa", font=dict(color="#333"),
+                           margin=dict(l=20,r=20,t=60,b=20))
+    return fig_corr
+
+@cronometrar("figura.semanas")
+def figura_semanas(resumo_semanas, max_pontos=MAX_PONTOS):
+    # Eixo de datas (segunda de cada semana): cada métrica é reduzida por
+    # conta própria e num eixo de categorias as semanas que só uma delas
+    # manteve iriam para o fim; com datas a ordem vem do próprio valor
+    fig_semanas = go.Figure()
+    rotulos = resumo_semanas["semana"].reset_index(drop=True)
+    for metrica in METRICAS:
+        if metrica in resumo_semanas.columns:
+            x_traco, y_traco = _reduzir(resumo_semanas["inicio"], resumo_semanas[metrica],
+                                        max_pontos)
+            fig_semanas.add_trace(go.Scatter(
+                x=x_traco, y=y_traco, customdata=rotulos[x_traco.index],
+                hovertemplate="%{y} (semana %{customdata})",
+                mode="lines+markers", name=metrica,
+                line=dict(color=CORES_METRICAS[metrica], width=2),
+                marker=dict(size=8)
+            ))
+    fig_semanas.update_layout(
+        title="Evolução semanal ao longo do tempo",
+        plot_bgcolor="#ffffff", paper_bgcolor="#f8f9fa", font=dict(color="#333"),
+        xaxis=dict(title="Semana", type="date", hoverformat="%d/%m/%Y",
+                   gridcolor="#e0e0e0"),
+        yaxis=dict(title="Média (1-5)", range=[0,6], tickmode="linear",
+                   dtick=1, gridcolor="#e0e0e0"),
+        hovermode="x unified", margin=dict(l=20,r=20,t=60,b=20)
+    )
+    return fig_semanas
@@ -0,0 +1,187 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import pandas as pd
+
+log = logging.getLogger("diario.metricas")
+
+
+def _chave(nome, rotulos):
+    return nome, tuple(sorted(rotulos.items()))
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _rotulos_prometheus(rotulos):
+    if not rotulos:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in rotulos) + "}"
+
+
+def tamanho_bytes(dados):
+    # Tamanho em memória do que foi lido/gravado: aproximação barata do
+    # tráfego com o armazenamento
+    if isinstance(dados, pd.DataFrame):
+        return int(dados.memory_usage(deep=True, index=False).sum())
+    if isinstance(dados, (list, tuple)):
+        return sum(len(str(v)) for registro in dados if isinstance(registro, dict)
+                   for v in registro.values())
+    return 0
+
+
+class Medida:
+    # O que o `with etapa(...)` devolve; ms fica preenchido na saída
+    __slots__ = ("nome", "ms")
+
+    def __init__(self, nome):
+        self.nome = nome
+        self.ms = None
+
+
+# ─── REGISTRO DE MÉTRICAS ─────────────────────────────────────
+class Instrumentacao:
+    # Tempo por etapa (contagem, soma e máximo) e contadores com rótulos,
+    # acumulados no processo inteiro para exportação. Além disso cada thread
+    # pode abrir uma "execução" (um rerun do app, uma requisição da API) e
+    # guardar só as etapas dela, na ordem em que terminaram.
+    def __init__(self):
+        self._tempos = {}
+        self._contadores = {}
+        self._trava = threading.Lock()
+        self._local = threading.local()
+
+    def iniciar_execucao(self):
+        self._local.etapas = []
+        self._local.profundidade = 0
+
+    def etapas_execucao(self):
+        return list(getattr(self._local, "etapas", None) or [])
+
+    def registrar_tempo(self, nome, segundos, **rotulos):
+        chave = _chave(nome, rotulos)
+        with self._trava:
+            n, soma, maximo = self._tempos.get(chave, (0, 0.0, 0.0))
+            self._tempos[chave] = (n + 1, soma + segundos, max(maximo, segundos))
+
+    def contar(self, nome, valor=1, **rotulos):
+        chave = _chave(nome, rotulos)
+        with self._trava:
+            self._contadores[chave] = self._contadores.get(chave, 0) + valor
+
+    @contextmanager
+    def etapa(self, nome, **rotulos):
+        local = self._local
+        profundidade = getattr(local, "profundidade", 0)
+        local.profundidade = profundidade + 1
+        medida = Medida(nome)
+        inicio = time.perf_counter()
+        try:
+            yield medida
+        finally:
+            segundos = time.perf_counter() - inicio
+            local.profundidade = profundidade
+            medida.ms = round(segundos * 1000, 3)
+            self.registrar_tempo(nome, segundos, **rotulos)
+            etapas = getattr(local, "etapas", None)
+            if etapas is not None:
+                etapas.append(dict(rotulos, etapa=nome, ms=medida.ms,
+                                   nivel=profundidade))
+
+    def cronometrar(self, nome, **rotulos):
+        def decorador(funcao):
+            @wraps(funcao)
+            def envolvida(*args, **kwargs):
+                with self.etapa(nome, **rotulos):
+                    return funcao(*args, **kwargs)
+            return envolvida
+        return decorador
+
+    def zerar(self):
+        with self._trava:
+            self._tempos.clear()
+            self._contadores.clear()
+
+    # ─── EXPORTAÇÃO ───────────────────────────────────────────
+    def instantaneo(self):
+        with self._trava:
+            tempos = dict(self._tempos)
+            contadores = dict(self._contadores)
+        return {
+            "etapas": [dict(rotulos, etapa=nome, n=n, total_s=round(soma, 6),
+                            max_s=round(maximo, 6))
+                       for (nome, rotulos), (n, soma, maximo) in sorted(tempos.items())],
+            "contadores": [dict(rotulos, nome=nome, valor=valor)
+                           for (nome, rotulos), valor in sorted(contadores.items())],
+        }
+
+    def prometheus(self, prefixo="diario"):
+        # Formato texto do Prometheus (também serve para o textfile collector)
+        with self._trava:
+            tempos = sorted(self._tempos.items())
+            contadores = sorted(self._contadores.items())
+        linhas = [f"# HELP {prefixo}_etapa_segundos Tempo gasto em cada etapa",
+                  f"# TYPE {prefixo}_etapa_segundos summary"]
+        for (nome, rotulos), (n, soma, _) in tempos:
+            r = _rotulos_prometheus((("etapa", nome),) + rotulos)
+            linhas.append(f"{prefixo}_etapa_segundos_count{r} {n}")
+            linhas.append(f"{prefixo}_etapa_segundos_sum{r} {soma:.6f}")
+        linhas += [f"# HELP {prefixo}_etapa_segundos_max Maior tempo observado na etapa",
+                   f"# TYPE {prefixo}_etapa_segundos_max gauge"]
+        for (nome, rotulos), (_, _, maximo) in tempos:
+            r = _rotulos_prometheus((("etapa", nome),) + rotulos)
+            linhas.append(f"{prefixo}_etapa_segundos_max{r} {maximo:.6f}")
+        vistos = set()
+        for (nome, rotulos), valor in contadores:
+            if nome not in vistos:
+                vistos.add(nome)
+                linhas.append(f"# TYPE {prefixo}_{nome}_total counter")
+            linhas.append(f"{prefixo}_{nome}_total{_rotulos_prometheus(rotulos)} {valor}")
+        return "\n".join(linhas) + "\n"
+
+    def exportar_arquivo(self, caminho):
+        # Grava o texto do Prometheus de forma atômica (nunca meio arquivo)
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(temporario, caminho)
+
+    def log_execucao(self, **extra):
+        # Uma linha JSON por execução no logger "diario.metricas"
+        if log.isEnabledFor(logging.INFO):
+            log.info(json.dumps(dict(extra, etapas=self.etapas_execucao()),
+                                ensure_ascii=False))
+
+
+INSTRUMENTACAO = Instrumentacao()
+etapa = INSTRUMENTACAO.etapa
+cronometrar = INSTRUMENTACAO.cronometrar
+contar = INSTRUMENTACAO.contar
+
+
+def chamada_backend(operacao):
+    # Decora os métodos dos motores de armazenamento: tempo da chamada,
+    # contagem por motor/operação e bytes lidos (DataFrame devolvido) ou
+    # gravados (primeiro argumento)
+    def decorador(metodo):
+        @wraps(metodo)
+        def envolvido(self, *args, **kwargs):
+            motor = self.motor
+            with etapa(f"backend.{operacao}", motor=motor):
+                resultado = metodo(self, *args, **kwargs)
+            contar("backend_chamadas", motor=motor, operacao=operacao)
+            if isinstance(resultado, pd.DataFrame):
+                contar("backend_bytes", tamanho_bytes(resultado), motor=motor,
+                       direcao="leitura")
+            elif args:
+                contar("backend_bytes", tamanho_bytes(args[0]), motor=motor,
+                       direcao="gravacao")
+            return resultado
+        return envolvido
+    return decorador
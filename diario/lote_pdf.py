@@ -0,0 +1,72 @@
+import multiprocessing
+import time
+import zipfile
+from datetime import date
+
+import pandas as pd
+
+from diario.analise import preparar_relatorio
+from diario.pdf import gerar_pdf, nome_arquivo_relatorio
+
+
+# ─── PDFs EM LOTE ─────────────────────────────────────────────
+def _gerar_um(tarefa):
+    # Roda no processo filho: recebe as linhas cruas de um paciente
+    codigo, registros, hoje, remedios, dias = tarefa
+    dados = preparar_relatorio(pd.DataFrame(registros), hoje=hoje, dias=dias,
+                               remedios=remedios)
+    if dados is None:
+        return codigo, None, None
+    nome = nome_arquivo_relatorio(dados["nome_usuario"], hoje, codigo)
+    # Sem CACHE_PDF: cada paciente sai uma vez só, guardar seria só hash e memória
+    return codigo, nome, gerar_pdf(**dados, cache=None).getvalue()
+
+
+def _tarefas(df, codigos, hoje, remedios, dias):
+    for codigo, df_user in df.groupby("codigo_usuario", sort=False, observed=True):
+        if codigos is None or codigo in codigos:
+            yield codigo, df_user.to_dict("records"), hoje, remedios.get(codigo), dias
+
+
+def gerar_pdfs_lote(df, destino, codigos=None, processos=None, hoje=None,
+                    progresso=None, remedios=None, dias=7):
+    # Gera o relatório de cada paciente num pool de processos e grava cada
+    # PDF no ZIP assim que fica pronto (nada se acumula em memória).
+    # destino: caminho ou arquivo binário aberto. progresso(feitos, total)
+    # é chamado a cada relatório. processos=1 roda tudo no processo atual.
+    # remedios: {codigo_usuario: texto} da tabela versionada (remedios_vigentes).
+    # dias: janela de cada relatório (7 = semanal).
+    hoje = hoje or date.today()
+    remedios = remedios or {}
+    presentes = set(df["codigo_usuario"].dropna().unique())
+    codigos = presentes & set(codigos) if codigos is not None else None
+    total = len(presentes if codigos is None else codigos)
+    tarefas = _tarefas(df, codigos, hoje, remedios, dias)
+
+    gerados, ignorados = 0, []
+    inicio = time.perf_counter()
+    # PDF já vem comprimido pelo ReportLab: ZIP_STORED evita gastar CPU à toa
+    with zipfile.ZipFile(destino, "w", compression=zipfile.ZIP_STORED) as zf:
+        if processos == 1:
+            resultados, pool = map(_gerar_um, tarefas), None
+        else:
+            pool = multiprocessing.Pool(processos)
+            resultados = pool.imap_unordered(_gerar_um, tarefas, chunksize=4)
+        try:
+            for feitos, (codigo, nome, conteudo) in enumerate(resultados, 1):
+                if conteudo is None:
+                    ignorados.append(codigo)
+                else:
+                    zf.writestr(nome, conteudo)
+                    gerados += 1
+                if progresso:
+                    progresso(feitos, total)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+    segundos = time.perf_counter() - inicio
+    return {"gerados":   gerados,
+            "ignorados": ignorados,
+            "segundos":  round(segundos, 3),
+            "relatorios_por_segundo": round(gerados / segundos, 2) if segundos else 0.0}
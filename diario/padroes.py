@@ -0,0 +1,214 @@
+# ─── PADRÕES POR DIA DA SEMANA E MUDANÇAS BRUSCAS ─────────────
+# Registro a registro. Para cada dia da semana e cada uma das seis METRICAS
+# o detector mantém contagem, média e soma dos quadrados dos desvios
+# (Welford). Um dia da semana só vira padrão quando a diferença para os
+# outros dias é grande (pelo menos EFEITO_MINIMO pontos na escala 1-5) e
+# estatisticamente significativa: teste t de Welch, dia contra o resto, com
+# os graus de liberdade de Welch-Satterthwaite (com poucas semanas a normal
+# aprovaria padrões que são só ruído), a variância do dia limitada por baixo
+# pela do resto e correção de Bonferroni pelos 7 × 6 testes.
+# ferramentas.falsos_padroes mede quantos pacientes sem padrão nenhum
+# ganham um.
+#
+# Mudanças bruscas comparam cada registro novo com a média e a variância
+# móveis (exponenciais) da métrica: |z| >= LIMITE_DESVIO vira desvio. Tudo
+# custa O(1) por registro, então cinco anos de histórico não pesam mais que
+# um mês na hora do relatório.
+import math
+
+import numpy as np
+
+from diario.esquema import METRICAS
+
+DIAS_SEMANA = ("Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo")
+# métrica: (artigo, nome no texto)
+ROTULOS = {"Humor":          ("o", "Humor"),
+           "Sono":           ("o", "Sono"),
+           "Pressao":        ("a", "Pressão"),
+           "Irritabilidade": ("a", "Irritabilidade"),
+           "Bateria":        ("a", "Bateria social"),
+           "Nevoa":          ("a", "Névoa mental")}
+
+ALFA = 0.05
+MIN_POR_DIA = 4          # semanas com registro naquele dia da semana
+EFEITO_MINIMO = 0.5      # pontos na escala 1-5
+JANELA_DESVIO = 28       # alfa da média móvel = 2 / (JANELA_DESVIO + 1)
+MIN_DESVIO = 14          # registros antes de começar a apontar desvios
+LIMITE_DESVIO = 3.0
+DESVIO_PADRAO_MINIMO = 0.5
+MAX_DESVIOS = 100
+# Registros anteriores a desde que bastam para a média móvel esquecer o
+# começo da série (peso (1 - alfa)^280 < 1e-8)
+AQUECIMENTO = 10 * JANELA_DESVIO
+
+
+def _beta_incompleta(x, a, b):
+    # I_x(a, b) regularizada, por fração contínua (Lentz); sem scipy
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    if x > (a + 1) / (a + b + 2):
+        return 1 - _beta_incompleta(1 - x, b, a)
+    minimo = 1e-300
+    c, d = 1.0, 1 - (a + b) * x / (a + 1)
+    d = 1 / (d if abs(d) > minimo else minimo)
+    h = d
+    for m in range(1, 300):
+        for numerador in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                          -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1 + numerador * d
+            d = 1 / (d if abs(d) > minimo else minimo)
+            c = 1 + numerador / c
+            c = c if abs(c) > minimo else minimo
+            h *= d * c
+        if abs(d * c - 1) < 1e-12:
+            break
+    log_frente = (math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b)
+                  + a * math.log(x) + b * math.log1p(-x))
+    return math.exp(log_frente) * h / a
+
+
+def p_valor_t(t, gl):
+    # P(|T| >= |t|) na t de Student com gl graus de liberdade (não inteiros valem)
+    if not math.isfinite(t):
+        return 0.0
+    return _beta_incompleta(gl / (gl + t * t), gl / 2, 0.5)
+
+
+# ─── DETECTOR ─────────────────────────────────────────────────
+class DetectorPadroes:
+    # Estado: matrizes 7 × 6 (dia da semana × métrica) de Welford, média e
+    # variância móveis por métrica e os últimos desvios encontrados.
+    # Registros fora de ordem entram nas estatísticas por dia da semana,
+    # mas não no acompanhamento de desvios, que só segue o dia mais recente.
+    def __init__(self):
+        k = len(METRICAS)
+        self.n     = np.zeros((7, k))
+        self.media = np.zeros((7, k))
+        self.m2    = np.zeros((7, k))
+        self.alfa_movel = 2 / (JANELA_DESVIO + 1)
+        self.n_movel     = np.zeros(k)
+        self.media_movel = np.zeros(k)
+        self.var_movel   = np.zeros(k)
+        self.ultimo_dia = None
+        self.desvios = []
+
+    def adicionar(self, dia, valores):
+        presentes = ~np.isnan(valores)
+        x = np.where(presentes, valores, 0.0)
+        d = dia.weekday()
+        self.n[d] += presentes
+        delta = np.where(presentes, x - self.media[d], 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.media[d] += np.where(presentes, delta / self.n[d], 0.0)
+        self.m2[d] += np.where(presentes, delta * (x - self.media[d]), 0.0)
+
+        if self.ultimo_dia is not None and dia < self.ultimo_dia:
+            return
+        self.ultimo_dia = dia
+        self._acompanhar(dia, valores, presentes)
+
+    def _acompanhar(self, dia, valores, presentes):
+        desvio_padrao = np.maximum(np.sqrt(self.var_movel), DESVIO_PADRAO_MINIMO)
+        z = (valores - self.media_movel) / desvio_padrao
+        for j in np.flatnonzero(presentes & (self.n_movel >= MIN_DESVIO)
+                                & (np.abs(np.nan_to_num(z)) >= LIMITE_DESVIO)):
+            self.desvios.append({"dia": dia, "metrica": METRICAS[j],
+                                 "valor": float(valores[j]),
+                                 "esperado": float(self.media_movel[j]),
+                                 "z": float(z[j])})
+        del self.desvios[:-MAX_DESVIOS]
+        # Média e variância exponenciais (atualização incremental de West)
+        primeiro = presentes & (self.n_movel == 0)
+        self.media_movel[primeiro] = valores[primeiro]
+        seguintes = presentes & ~primeiro
+        diferenca = np.where(seguintes, valores - self.media_movel, 0.0)
+        incremento = self.alfa_movel * diferenca
+        self.media_movel += incremento
+        self.var_movel = np.where(seguintes, (1 - self.alfa_movel)
+                                  * (self.var_movel + diferenca * incremento),
+                                  self.var_movel)
+        self.n_movel += presentes
+
+    def efeitos(self):
+        # Dias da semana que se destacam: lista de dicts com dia, métrica,
+        # médias do dia e dos outros dias, o t do teste de Welch e o p-valor
+        n_total = self.n.sum(axis=0)
+        limite = ALFA / (7 * len(METRICAS))
+        efeitos = []
+        for d in range(7):
+            resto = [o for o in range(7) if o != d]
+            n_resto = n_total - self.n[d]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                # Média e M2 dos outros seis dias (junção de Chan)
+                media_resto = (self.n[resto] * self.media[resto]).sum(axis=0) / n_resto
+                m2_resto = (self.m2[resto] + self.n[resto]
+                            * (self.media[resto] - media_resto) ** 2).sum(axis=0)
+                var_resto = m2_resto / (n_resto - 1)
+                # Sem padrão as duas variâncias são iguais: a do dia não desce
+                # abaixo da do resto, senão poucas semanas parecidas por acaso
+                # (notas inteiras repetem muito) inflam o t
+                var_dia = np.maximum(self.m2[d] / (self.n[d] - 1), var_resto)
+                diferenca = self.media[d] - media_resto
+                erro_dia = var_dia / self.n[d]
+                erro_resto = var_resto / n_resto
+                t = diferenca / np.sqrt(erro_dia + erro_resto)
+                # Graus de liberdade de Welch-Satterthwaite
+                gl = (erro_dia + erro_resto) ** 2 / (erro_dia ** 2 / (self.n[d] - 1)
+                                                     + erro_resto ** 2 / (n_resto - 1))
+            for j, metrica in enumerate(METRICAS):
+                if self.n[d, j] < MIN_POR_DIA or n_resto[j] < MIN_POR_DIA:
+                    continue
+                if abs(diferenca[j]) < EFEITO_MINIMO:
+                    continue
+                # Variância zero dos dois lados dá t infinito: passa
+                p = p_valor_t(float(t[j]), float(gl[j]))
+                if p >= limite:
+                    continue
+                efeitos.append({"dia": d, "metrica": metrica,
+                                "media_dia": float(self.media[d, j]),
+                                "media_resto": float(media_resto[j]),
+                                "t": float(t[j]), "p": p})
+        return efeitos
+
+    def descrever(self, desde=None):
+        # Frases do relatório: padrões por dia da semana e desvios a partir de desde
+        frases = []
+        for e in self.efeitos():
+            artigo, nome = ROTULOS[e["metrica"]]
+            sentido = "alt" if e["media_dia"] > e["media_resto"] else "baix"
+            frases.append(f"Toda {DIAS_SEMANA[e['dia']]} {artigo} {nome} costuma ser "
+                          f"mais {sentido}{artigo} ({e['media_dia']:.1f} contra "
+                          f"{e['media_resto']:.1f} nos outros dias)")
+        for d in self.desvios:
+            if desde is None or d["dia"] >= desde:
+                _, nome = ROTULOS[d["metrica"]]
+                frases.append(f"{d['dia']:%d/%m}: {nome} em {d['valor']:g}, fora do "
+                              f"habitual (em torno de {d['esperado']:.1f})")
+        return frases
+
+
+def detector_de_linhas(datas, valores, desde=None):
+    # Detector montado de uma vez a partir de linhas já em ordem de data
+    # (datas: Series datetime64; valores: matriz n × 6). As estatísticas por
+    # dia da semana saem vetorizadas; a média móvel só percorre AQUECIMENTO
+    # linhas antes de desde, o que dá os mesmos desvios a partir de desde.
+    detector = DetectorPadroes()
+    dias_semana = datas.dt.dayofweek.to_numpy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for d in range(7):
+            bloco = valores[dias_semana == d]
+            n = (~np.isnan(bloco)).sum(axis=0)
+            media = np.where(n > 0, np.nansum(bloco, axis=0) / n, 0.0)
+            detector.n[d] = n
+            detector.media[d] = media
+            detector.m2[d] = np.nansum((bloco - media) ** 2, axis=0)
+    dias = datas.dt.date.to_numpy()
+    inicio = 0
+    if desde is not None:
+        inicio = max(int(np.searchsorted(datas.to_numpy(), np.datetime64(desde))) - AQUECIMENTO, 0)
+    for dia, linha in zip(dias[inicio:], valores[inicio:]):
+        detector.ultimo_dia = dia
+        detector._acompanhar(dia, linha, ~np.isnan(linha))
+    return detector
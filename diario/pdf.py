@@ -0,0 +1,370 @@
+import hashlib
+import io
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import date
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, HRFlowable
+from reportlab.platypus.flowables import Flowable
+from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from reportlab.pdfbase import pdfdoc
+from reportlab.pdfgen.canvas import Canvas
+
+from diario.cache import ContadoresCache
+from diario.esquema import METRICAS
+from diario.instrumentacao import contar, etapa
+
+
+def nome_arquivo_relatorio(nome_usuario, dia, codigo_usuario=None):
+    partes = ["relatorio", nome_usuario.replace(" ", "_")]
+    if codigo_usuario:
+        partes.append(codigo_usuario)
+    return "_".join(partes + [str(dia)]) + ".pdf"
+
+# ─── ESTILOS (montados uma vez por processo) ──────────────────
+@lru_cache(maxsize=None)
+def _estilos():
+    return {
+        "titulo": ParagraphStyle("titulo",
+            fontSize=20, fontName="Helvetica-Bold",
+            textColor=colors.HexColor("#1a237e"),
+            spaceAfter=6, alignment=TA_CENTER),
+        "subtitulo": ParagraphStyle("subtitulo",
+            fontSize=13, fontName="Helvetica-Bold",
+            textColor=colors.HexColor("#283593"),
+            spaceAfter=4, spaceBefore=14),
+        "corpo": ParagraphStyle("corpo",
+            fontSize=10, fontName="Helvetica",
+            textColor=colors.HexColor("#333333"),
+            spaceAfter=4, leading=16),
+        "alerta": ParagraphStyle("alerta",
+            fontSize=11, fontName="Helvetica-Bold",
+            textColor=colors.HexColor("#cc0000"),
+            spaceAfter=4),
+        "atencao": ParagraphStyle("atencao",
+            fontSize=11, fontName="Helvetica-Bold",
+            textColor=colors.HexColor("#e65100"),
+            spaceAfter=4),
+        "ok": ParagraphStyle("ok",
+            fontSize=11, fontName="Helvetica-Bold",
+            textColor=colors.HexColor("#2e7d32"),
+            spaceAfter=4),
+        "rodape": ParagraphStyle("rodape",
+            fontSize=8, fontName="Helvetica",
+            textColor=colors.HexColor("#888888"),
+            alignment=TA_CENTER),
+    }
+
+def _estilo_tabela(cor_cabecalho, padding):
+    return TableStyle([
+        ("BACKGROUND",    (0,0), (-1,0),  colors.HexColor(cor_cabecalho)),
+        ("TEXTCOLOR",     (0,0), (-1,0),  colors.white),
+        ("FONTNAME",      (0,0), (-1,0),  "Helvetica-Bold"),
+        ("FONTSIZE",      (0,0), (-1,-1), 9),
+        ("ALIGN",         (0,0), (-1,-1), "CENTER"),
+        ("ROWBACKGROUNDS",(0,1), (-1,-1),
+         [colors.HexColor("#f5f5f5"), colors.white]),
+        ("GRID",          (0,0), (-1,-1), 0.5, colors.HexColor("#cccccc")),
+        ("TOPPADDING",    (0,0), (-1,-1), padding),
+        ("BOTTOMPADDING", (0,0), (-1,-1), padding),
+    ])
+
+# Table.setStyle só lê os comandos, então o mesmo TableStyle serve a todos
+ESTILO_TABELA_MEDIAS = _estilo_tabela("#3949ab", 6)
+ESTILO_TABELA_DIARIA = _estilo_tabela("#5c6bc0", 5)
+# Linhas por tabela da seção diária: um bloco cabe numa página A4
+LINHAS_POR_BLOCO = 30
+
+# ─── TABELA DIÁRIA EM BLOCOS ──────────────────────────────────
+def blocos_diarios(df, tamanho=None, formato_data="%d/%m"):
+    # Linhas da tabela diária (já como texto) em blocos de `tamanho`
+    # (LINHAS_POR_BLOCO), cada bloco formatado coluna a coluna. Só um bloco
+    # existe por vez.
+    tamanho = tamanho or LINHAS_POR_BLOCO
+    df = df.sort_values("data", kind="stable")
+    for inicio in range(0, len(df), tamanho):
+        bloco = df.iloc[inicio:inicio + tamanho]
+        colunas = [bloco["data"].dt.strftime(formato_data).to_numpy()]
+        for m in METRICAS:
+            if m not in bloco.columns:
+                colunas.append(np.full(len(bloco), "—", dtype=object))
+                continue
+            valores = pd.to_numeric(bloco[m], errors="coerce")
+            colunas.append(np.where(valores.notna(),
+                                    valores.round().astype("Int64").astype(str), "—"))
+        yield [list(linha) for linha in zip(*colunas)]
+
+class _BlocosPendentes(Flowable):
+    # Marcador na lista de flowables: o documento troca por uma tabela do
+    # próximo bloco na hora de desenhar, e volta o marcador logo atrás
+    def __init__(self, blocos):
+        super().__init__()
+        self.blocos = blocos
+
+    def wrap(self, largura, altura):
+        return 0, 0
+
+    def draw(self):
+        pass
+
+class CanvasCompacto(Canvas):
+    # O ReportLab guarda o conteúdo de cada página como texto cru até o
+    # save e só comprime no fim. Aqui a página é comprimida assim que fecha
+    # (stream já com /Filter, que o ReportLab não filtra de novo), então o
+    # que fica em memória por página é a versão comprimida. O conteúdo é o
+    # mesmo; só sai sem a camada ASCII85 do padrão, e o arquivo fica menor.
+    def showPage(self):
+        super().showPage()
+        pagina = self._doc.Pages.pages[-1]
+        if pagina.stream and pagina.compression and not pagina.Contents:
+            conteudo = pagina.stream
+            if isinstance(conteudo, str):
+                conteudo = conteudo.encode("utf8")
+            dicionario = pdfdoc.PDFDictionary()
+            dicionario["Filter"] = pdfdoc.PDFArray([pdfdoc.PDFName("FlateDecode")])
+            pagina.Contents = pdfdoc.PDFStream(dicionario, zlib.compress(conteudo))
+            pagina.Contents.__Comment__ = "page stream"
+            pagina.stream = None
+
+class DocumentoRelatorio(SimpleDocTemplate):
+    # SimpleDocTemplate que monta as tabelas da seção diária sob demanda:
+    # a lista de flowables nunca tem mais de um bloco, e cada um é liberado
+    # depois de ir para a página
+    def filterFlowables(self, flowables):
+        marcador = flowables[0] if flowables else None
+        if not isinstance(marcador, _BlocosPendentes):
+            return
+        linhas = next(marcador.blocos, None)
+        if linhas is None:
+            flowables[0] = None
+            return
+        tabela = Table([["Data"] + METRICAS] + linhas,
+                       colWidths=[2*cm] + [2.4*cm]*len(METRICAS))
+        tabela.setStyle(ESTILO_TABELA_DIARIA)
+        flowables.insert(0, tabela)
+
+# ─── CACHE DE PDFs ────────────────────────────────────────────
+class CachePDF(ContadoresCache):
+    # PDFs prontos guardados pelo hash do conteúdo de entrada, com limite
+    # de bytes e despejo LRU. Mesmo paciente, mesmos 7 dias e mesmo dia de
+    # geração = mesmos bytes, sem passar pelo ReportLab de novo.
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.bytes_usados = 0
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    def __len__(self):
+        with self._trava:
+            return len(self._itens)
+
+    def obter(self, chave):
+        with self._trava:
+            conteudo = self._itens.get(chave)
+            if conteudo is None:
+                self.falhas += 1
+                return None
+            self.acertos += 1
+            self._itens.move_to_end(chave)
+            return conteudo
+
+    def guardar(self, chave, conteudo):
+        if len(conteudo) > self.max_bytes:
+            return
+        with self._trava:
+            if chave in self._itens:
+                self.bytes_usados -= len(self._itens.pop(chave))
+            self._itens[chave] = conteudo
+            self.bytes_usados += len(conteudo)
+            while self.bytes_usados > self.max_bytes:
+                _, antigo = self._itens.popitem(last=False)
+                self.bytes_usados -= len(antigo)
+
+CACHE_PDF = CachePDF()
+
+def chave_pdf(nome_usuario, df_7dias, risco, nivel_risco,
+              insights, padroes, remedios_salvos, dias=7):
+    h = hashlib.sha256()
+    # "Gerado em" sai no PDF, então o dia faz parte da chave
+    for parte in (date.today().isoformat(), nome_usuario, str(risco), nivel_risco,
+                  str(dias), remedios_salvos, *insights, "|", *padroes, "|", *df_7dias.columns):
+        h.update(str(parte).encode())
+        h.update(b"\0")
+    h.update(pd.util.hash_pandas_object(df_7dias, index=False).values.tobytes())
+    return h.hexdigest()
+
+# ─── GERADOR DE PDF ───────────────────────────────────────────
+def gerar_pdf(nome_usuario, df_7dias, risco, nivel_risco,
+              insights, padroes, remedios_salvos, cache=CACHE_PDF, dias=7,
+              destino=None):
+    # cache=None força a geração (sem consultar nem guardar). dias: tamanho
+    # da janela de df_7dias (7 no relatório semanal, até o histórico todo).
+    # destino: caminho ou arquivo binário aberto; o PDF vai direto para ele,
+    # sem cache nem cópia em memória, e é ele que volta
+    args = (nome_usuario, df_7dias, risco, nivel_risco,
+            insights, padroes, remedios_salvos, dias)
+    if cache is None or destino is not None:
+        with etapa("pdf.montar"):
+            return _montar_pdf(*args, destino=destino)
+    chave = chave_pdf(*args)
+    conteudo = cache.obter(chave)
+    contar("pdf_cache", resultado="falha" if conteudo is None else "acerto")
+    if conteudo is None:
+        with etapa("pdf.montar"):
+            conteudo = _montar_pdf(*args).getvalue()
+        cache.guardar(chave, conteudo)
+    contar("pdf_bytes", len(conteudo))
+    return io.BytesIO(conteudo)
+
+def _montar_pdf(nome_usuario, df_7dias, risco, nivel_risco,
+                insights, padroes, remedios_salvos, dias=7, destino=None):
+
+    buffer = io.BytesIO() if destino is None else destino
+    doc = DocumentoRelatorio(buffer, pagesize=A4,
+                            rightMargin=2*cm, leftMargin=2*cm,
+                            topMargin=2*cm, bottomMargin=2*cm)
+
+    estilos          = _estilos()
+    estilo_titulo    = estilos["titulo"]
+    estilo_subtitulo = estilos["subtitulo"]
+    estilo_corpo     = estilos["corpo"]
+    estilo_alerta    = estilos["alerta"]
+    estilo_ok        = estilos["ok"]
+
+    elementos = []
+
+    # Cabeçalho
+    elementos.append(Paragraph("🧠 Relatório de Saúde Mental", estilo_titulo))
+    elementos.append(Paragraph(f"Paciente: {nome_usuario}", estilo_titulo))
+    elementos.append(Spacer(1, 0.3*cm))
+    elementos.append(HRFlowable(width="100%", thickness=1,
+                                color=colors.HexColor("#3949ab")))
+    elementos.append(Spacer(1, 0.3*cm))
+
+    periodo_ini = df_7dias["data"].min().strftime("%d/%m/%Y")
+    periodo_fim = df_7dias["data"].max().strftime("%d/%m/%Y")
+    elementos.append(Paragraph(
+        f"Período analisado: {periodo_ini} a {periodo_fim}   |   "
+        f"Registros: {len(df_7dias)} de {dias} dias   |   "
+        f"Gerado em: {date.today().strftime('%d/%m/%Y')}",
+        estilo_corpo))
+    elementos.append(Spacer(1, 0.4*cm))
+
+    # Medicamentos
+    if remedios_salvos.strip():
+        elementos.append(Paragraph("Medicamentos em uso", estilo_subtitulo))
+        for linha in remedios_salvos.strip().split("\n"):
+            if linha.strip():
+                elementos.append(Paragraph(f"• {linha.strip()}", estilo_corpo))
+        elementos.append(Spacer(1, 0.3*cm))
+
+    # Risco de burnout
+    elementos.append(Paragraph("Risco de Burnout", estilo_subtitulo))
+    elementos.append(HRFlowable(width="100%", thickness=0.5,
+                                color=colors.HexColor("#cccccc")))
+    elementos.append(Spacer(1, 0.2*cm))
+
+    if risco >= 70:
+        elementos.append(Paragraph(
+            f"⚠ ALTO RISCO — {risco}%  |  {nivel_risco}", estilo_alerta))
+        elementos.append(Paragraph(
+            "O paciente apresenta indicadores críticos. "
+            "Recomenda-se revisão urgente dos procedimentos terapêuticos.",
+            estilo_corpo))
+    elif risco >= 40:
+        elementos.append(Paragraph(
+            f"⚠ ATENÇÃO — {risco}%  |  {nivel_risco}", estilos["atencao"]))
+        elementos.append(Paragraph(
+            "O paciente apresenta sinais de alerta moderados. "
+            "Recomenda-se atenção redobrada.",
+            estilo_corpo))
+    else:
+        elementos.append(Paragraph(
+            f"✓ ESTÁVEL — {risco}%  |  {nivel_risco}", estilo_ok))
+        elementos.append(Paragraph(
+            "Nenhum sinal crítico detectado nesta semana.", estilo_corpo))
+
+    elementos.append(Spacer(1, 0.4*cm))
+
+    # Tabela de médias
+    titulo_medias = "Médias da Semana" if dias <= 7 else "Médias do Período"
+    elementos.append(Paragraph(f"{titulo_medias} por Indicador", estilo_subtitulo))
+    elementos.append(HRFlowable(width="100%", thickness=0.5,
+                                color=colors.HexColor("#cccccc")))
+    elementos.append(Spacer(1, 0.2*cm))
+
+    cabecalho = ["Indicador", "Média (1-5)", "Mínimo", "Máximo", "Tendência"]
+    linhas = [cabecalho]
+    for m in METRICAS:
+        if m not in df_7dias.columns:
+            continue
+        serie = df_7dias[m].dropna()
+        media = serie.mean()
+        minv  = serie.min()
+        maxv  = serie.max()
+        if len(serie) >= 3:
+            z = np.polyfit(np.arange(len(serie)), serie.values.astype(float), 1)
+            tend = "↑ Subindo" if z[0] > 0.1 else ("↓ Caindo" if z[0] < -0.1 else "→ Estável")
+        else:
+            tend = "—"
+        linhas.append([m, f"{media:.1f}", f"{minv:.0f}", f"{maxv:.0f}", tend])
+
+    tabela = Table(linhas, colWidths=[4*cm, 3*cm, 2.5*cm, 2.5*cm, 3.5*cm])
+    tabela.setStyle(ESTILO_TABELA_MEDIAS)
+    elementos.append(tabela)
+    elementos.append(Spacer(1, 0.5*cm))
+
+    # Tabela diária
+    elementos.append(Paragraph("Registros Diários", estilo_subtitulo))
+    elementos.append(HRFlowable(width="100%", thickness=0.5,
+                                color=colors.HexColor("#cccccc")))
+    elementos.append(Spacer(1, 0.2*cm))
+
+    # Uma tabela por bloco de LINHAS_POR_BLOCO, montada só na hora de desenhar
+    formato_data = "%d/%m" if dias <= 31 else "%d/%m/%Y"
+    elementos.append(_BlocosPendentes(blocos_diarios(df_7dias, formato_data=formato_data)))
+    elementos.append(Spacer(1, 0.5*cm))
+
+    # Insights
+    if insights:
+        elementos.append(Paragraph("Correlações Identificadas", estilo_subtitulo))
+        elementos.append(HRFlowable(width="100%", thickness=0.5,
+                                    color=colors.HexColor("#cccccc")))
+        elementos.append(Spacer(1, 0.2*cm))
+        for ins in insights:
+            elementos.append(Paragraph(f"• {ins}", estilo_corpo))
+        elementos.append(Spacer(1, 0.3*cm))
+
+    # Padrões
+    if padroes:
+        elementos.append(Paragraph("Padrões por Dia da Semana", estilo_subtitulo))
+        elementos.append(HRFlowable(width="100%", thickness=0.5,
+                                    color=colors.HexColor("#cccccc")))
+        elementos.append(Spacer(1, 0.2*cm))
+        for p in padroes:
+            elementos.append(Paragraph(f"• {p}", estilo_corpo))
+        elementos.append(Spacer(1, 0.3*cm))
+
+    # Rodapé
+    elementos.append(HRFlowable(width="100%", thickness=1,
+                                color=colors.HexColor("#3949ab")))
+    elementos.append(Spacer(1, 0.2*cm))
+    elementos.append(Paragraph(
+        "Este relatório foi gerado automaticamente pelo Monitor de Saúde Mental. "
+        "As informações são de caráter auxiliar e devem ser interpretadas "
+        "pelo profissional de saúde responsável.",
+        estilos["rodape"]))
+
+    doc.build(elementos, canvasmaker=CanvasCompacto)
+    if destino is None:
+        buffer.seek(0)
+    return buffer
@@ -0,0 +1,95 @@
+import threading
+
+import pandas as pd
+
+from diario.armazenamento import datas_iso, normalizar_registros
+from diario.esquema import COLUNAS, METRICAS
+from diario.instrumentacao import tamanho_bytes
+
+# Esquema em memória: métricas 1-5 em Int8 (inteiro de 1 byte com máscara de
+# ausentes), data já convertida e textos repetidos como categoria
+TIPOS = dict({m: "Int8" for m in METRICAS},
+             data="datetime64[ns]", nome="category",
+             codigo_usuario="category", remedios="category")
+CATEGORICAS = [c for c, tipo in TIPOS.items() if tipo == "category"]
+
+
+def _metrica(serie):
+    valores = pd.to_numeric(serie, errors="coerce").round()
+    return valores.where(valores.between(-128, 127)).astype("Int8")
+
+
+def tipar(df):
+    # Converte linhas cruas (do armazenamento ou recém-gravadas) para o
+    # esquema TIPOS. A data é lida uma vez aqui: quem consome já recebe
+    # datetime64 e não precisa de pd.to_datetime.
+    if not isinstance(df, pd.DataFrame):
+        df = normalizar_registros(df)
+    colunas = {}
+    for col in COLUNAS:
+        serie = df[col] if col in df.columns else pd.Series(pd.NA, index=df.index)
+        if col in METRICAS:
+            colunas[col] = _metrica(serie)
+        elif col == "data":
+            colunas[col] = pd.to_datetime(datas_iso(serie), format="%Y-%m-%d",
+                                          errors="coerce").astype(TIPOS["data"])
+        else:
+            colunas[col] = serie.astype("category")
+    return pd.DataFrame(colunas, index=df.index).reset_index(drop=True)
+
+
+def concatenar(df, novos):
+    # pd.concat de categorias diferentes vira object: une as categorias antes
+    novos = novos.reset_index(drop=True)
+    for col in CATEGORICAS:
+        if col in df.columns and col in novos.columns \
+                and isinstance(df[col].dtype, pd.CategoricalDtype) \
+                and isinstance(novos[col].dtype, pd.CategoricalDtype):
+            faltam = novos[col].cat.categories.difference(df[col].cat.categories)
+            if len(faltam):
+                df = df.assign(**{col: df[col].cat.add_categories(faltam)})
+            novos = novos.assign(**{col: novos[col].cat.set_categories(
+                df[col].cat.categories)})
+    return pd.concat([df, novos], ignore_index=True)
+
+
+def resumo_memoria(bruto, df):
+    antes, depois = tamanho_bytes(bruto), tamanho_bytes(df)
+    return {"linhas":       len(bruto),
+            "bytes_antes":  antes,
+            "bytes_depois": depois,
+            "razao":        round(antes / depois, 2) if depois else 0.0}
+
+
+# ─── CARREGADOR TIPADO ────────────────────────────────────────
+class CarregadorTipado:
+    # Envolve uma função de leitura do armazenamento (ler_tudo, ler_usuario)
+    # e devolve o resultado já tipado. Com medir_memoria, guarda o resumo de
+    # memória da última carga e o acumulado, para o painel de diagnóstico.
+    # Desligado por padrão: o memory_usage(deep=True) das duas cópias pesa
+    # tanto quanto a própria tipagem em cada carga.
+    def __init__(self, carregar, medir_memoria=False):
+        self._carregar = carregar
+        self.medir_memoria = medir_memoria
+        self.ultimo = None
+        self.bytes_antes = 0
+        self.bytes_depois = 0
+        self._trava = threading.Lock()
+
+    def __call__(self, *args):
+        bruto = self._carregar(*args)
+        df = tipar(bruto)
+        if self.medir_memoria:
+            resumo = resumo_memoria(bruto, df)
+            with self._trava:
+                self.ultimo = resumo
+                self.bytes_antes += resumo["bytes_antes"]
+                self.bytes_depois += resumo["bytes_depois"]
+        return df
+
+    def estatisticas(self):
+        with self._trava:
+            return {"medindo":      self.medir_memoria,
+                    "ultima_carga": self.ultimo,
+                    "bytes_antes":  self.bytes_antes,
+                    "bytes_depois": self.bytes_depois}
@@ -0,0 +1 @@
+# Ferramentas de linha de comando (estresse, benchmarks, manutenção da base).
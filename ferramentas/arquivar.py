@@ -0,0 +1,58 @@
+"""Move o histórico antigo da base quente para o arquivo frio (Arrow por mês).
+
+Linhas com data anterior a hoje - HORIZONTE dias vão para DESTINO/AAAA-MM.arrow
+e saem da planilha/SQLite, que fica só com o período recente lido a cada
+acesso. O app (DIARIO_ARQUIVO=DESTINO) e a API (--arquivo DESTINO) continuam
+enxergando o histórico inteiro no resumo semanal, nos padrões e no PDF.
+Pode ser agendado (cron) e repetido: um mês já arquivado é regravado sem
+duplicar linhas.
+
+    python -m ferramentas.arquivar --sqlite diario.db --destino arquivo/ --horizonte 90
+    python -m ferramentas.arquivar --gsheets URL_DA_PLANILHA --destino arquivo/ --simular
+
+--gsheets usa a mesma conexão do app (credenciais em .streamlit/secrets.toml).
+"""
+import argparse
+import os
+import sys
+
+from diario.armazenamento import ArmazenamentoSQLite, CoordenadorGravacao
+from diario.arquivo import ArquivoHistorico, arquivar_antigos
+from ferramentas.compactar import _armazenamento_gsheets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    origem = parser.add_mutually_exclusive_group(required=True)
+    origem.add_argument("--sqlite", help="caminho da base SQLite")
+    origem.add_argument("--gsheets", help="URL da planilha")
+    parser.add_argument("--destino", required=True, help="diretório do arquivo frio")
+    parser.add_argument("--horizonte", type=int, default=90,
+                        help="dias mantidos na base quente")
+    parser.add_argument("--simular", action="store_true",
+                        help="só conta o que seria movido, sem gravar")
+    args = parser.parse_args(argv)
+
+    if args.sqlite:
+        armazenamento = ArmazenamentoSQLite(args.sqlite)
+    else:
+        armazenamento = _armazenamento_gsheets(args.gsheets)
+    arquivo = ArquivoHistorico(args.destino)
+    resumo = CoordenadorGravacao(armazenamento).executar(
+        arquivar_antigos, armazenamento, arquivo, args.horizonte, None, args.simular)
+
+    acao = "seriam movidas" if args.simular else "movidas"
+    print(f"{resumo['linhas_movidas']:,} linhas anteriores a {resumo['corte']} {acao} "
+          f"({resumo['linhas_antes']:,} -> {resumo['linhas_quentes']:,} na base quente)")
+    info = arquivo.resumo()
+    print(f"arquivo: {info['meses']} meses ({info['primeiro']} a {info['ultimo']}), "
+          f"{info['bytes']:,} bytes")
+    if args.sqlite and not args.simular and resumo["linhas_movidas"]:
+        antes = os.path.getsize(args.sqlite)
+        armazenamento.liberar_espaco()
+        print(f"arquivo SQLite: {antes:,} -> {os.path.getsize(args.sqlite):,} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""Benchmark do PDF de período longo: tempo e memória por número de linhas.
+
+Cada tamanho roda num processo próprio, porque o pico de memória residente
+(ru_maxrss) só cresce dentro de um processo. O pico é medido a partir da
+memória com a base já montada, então mostra só o custo do PDF. --bloco 0
+desenha a tabela diária numa tabela só, como era antes dos blocos.
+
+    python -m ferramentas.bench_pdf --linhas 7,365,3650
+    python -m ferramentas.bench_pdf --linhas 3650 --destino arquivo --bloco 0
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from diario import pdf
+from diario.esquema import METRICAS
+
+
+def gerar_linhas(linhas, semente=0):
+    rng = np.random.default_rng(semente)
+    df = pd.DataFrame({m: pd.array(rng.integers(1, 6, size=linhas), dtype="Int8")
+                       for m in METRICAS})
+    df.insert(0, "data", pd.date_range(end=pd.Timestamp.today().normalize(),
+                                       periods=linhas))
+    return df
+
+
+def _pico_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def medir(linhas, destino="memoria", bloco=None):
+    # Roda no processo filho: um PDF de `linhas` registros diários
+    df = gerar_linhas(linhas)
+    if bloco is not None:
+        pdf.LINHAS_POR_BLOCO = bloco or linhas
+    antes = _pico_kb()
+    inicio = time.perf_counter()
+    argumentos = dict(nome_usuario="Paciente", df_7dias=df, risco=50, nivel_risco="Atenção",
+                      insights=[], padroes=[], remedios_salvos="", cache=None, dias=linhas)
+    if destino == "arquivo":
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = os.path.join(pasta, "relatorio.pdf")
+            pdf.gerar_pdf(destino=caminho, **argumentos)
+            tamanho = os.path.getsize(caminho)
+    else:
+        tamanho = len(pdf.gerar_pdf(**argumentos).getvalue())
+    return {"linhas":   linhas,
+            "segundos": round(time.perf_counter() - inicio, 3),
+            "pico_mb":  round((_pico_kb() - antes) / 1024, 1),
+            "bytes":    tamanho}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--linhas", default="7,365,3650",
+                        help="tamanhos separados por vírgula")
+    parser.add_argument("--destino", choices=["memoria", "arquivo"], default="memoria")
+    parser.add_argument("--bloco", type=int, default=None,
+                        help="linhas por tabela (0 = tabela única)")
+    parser.add_argument("--saida", help="grava o resultado em JSON")
+    parser.add_argument("--filho", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.filho is not None:
+        print(json.dumps(medir(args.filho, args.destino, args.bloco)))
+        return 0
+
+    resultados = []
+    for linhas in (int(x) for x in args.linhas.split(",")):
+        comando = [sys.executable, "-m", "ferramentas.bench_pdf", "--filho", str(linhas),
+                   "--destino", args.destino]
+        if args.bloco is not None:
+            comando += ["--bloco", str(args.bloco)]
+        saida = subprocess.run(comando, check=True, capture_output=True, text=True).stdout
+        resultado = json.loads(saida)
+        resultados.append(resultado)
+        print(f"{resultado['linhas']:>6} linhas: {resultado['segundos']:.3f}s, "
+              f"pico +{resultado['pico_mb']} MB, {resultado['bytes'] / 1024:.0f} KB")
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump({"destino": args.destino, "bloco": args.bloco,
+                       "resultados": resultados}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""Benchmark do risco de burnout em lote (clínica inteira).
+
+Gera pacientes × dias sintéticos, mede calcular_risco_burnout_lote e
+confere, numa amostra de pacientes, que o resultado é idêntico ao de
+calcular_risco_burnout aplicado paciente a paciente.
+
+    python -m ferramentas.bench_risco_lote --pacientes 10000 --dias 365
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from diario.analise import calcular_risco_burnout, calcular_risco_burnout_lote
+from diario.esquema import METRICAS
+
+
+def gerar_base(pacientes, dias, semente=0):
+    # Uma linha por paciente por dia, em ordem cronológica (como a planilha)
+    rng = np.random.default_rng(semente)
+    n = pacientes * dias
+    datas = pd.date_range(end=pd.Timestamp.today().normalize(), periods=dias)
+    codigos = pd.Categorical([f"u{i:06d}" for i in range(pacientes)])
+    df = pd.DataFrame({
+        "data": np.repeat(datas.strftime("%Y-%m-%d").to_numpy(), pacientes),
+        "codigo_usuario": codigos[np.tile(np.arange(pacientes), dias)],
+    })
+    for m in METRICAS:
+        df[m] = rng.integers(1, 6, size=n)
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pacientes", type=int, default=10_000)
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--amostra", type=int, default=500,
+                        help="pacientes conferidos contra a função individual")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    df = gerar_base(args.pacientes, args.dias)
+    print(f"base: {args.pacientes} pacientes × {args.dias} dias = {len(df):,} linhas")
+
+    tempos = []
+    for _ in range(args.repeticoes):
+        inicio = time.perf_counter()
+        resultado = calcular_risco_burnout_lote(df)
+        tempos.append(time.perf_counter() - inicio)
+    print(f"lote: melhor {min(tempos):.3f}s, média {sum(tempos) / len(tempos):.3f}s "
+          f"({len(resultado)} pacientes)")
+
+    rng = np.random.default_rng(1)
+    amostra = rng.choice(resultado.index.to_numpy(), size=min(args.amostra, len(resultado)),
+                         replace=False)
+    por_usuario = df[df["codigo_usuario"].isin(amostra)].groupby(
+        "codigo_usuario", observed=True)
+    inicio = time.perf_counter()
+    divergencias = 0
+    for codigo, df_user in por_usuario:
+        esperado = calcular_risco_burnout(df_user)
+        obtido = (int(resultado.at[codigo, "risco"]), resultado.at[codigo, "nivel"])
+        if esperado != obtido:
+            divergencias += 1
+    duracao = time.perf_counter() - inicio
+    print(f"individual: {len(amostra)} pacientes em {duracao:.3f}s "
+          f"(~{duracao / len(amostra) * len(resultado):.1f}s para todos)")
+    print(f"divergências: {divergencias}")
+    return 1 if divergencias else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
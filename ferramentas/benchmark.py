@@ -0,0 +1,170 @@
+"""Benchmark dos caminhos quentes do diário, com saída em JSON.
+
+Para cada escala (pacientes × dias) gera uma base sintética e mede: filtro
+de um paciente e da janela de 7 dias, risco de burnout (um paciente e lote),
+correlações, padrões semanais, comparação entre semanas, agregados, figuras
+do relatório e o PDF (janela de 7 dias e histórico inteiro). Também guarda
+a memória da base crua e depois de tipada (diario.tipagem).
+
+O JSON guarda a mediana e o melhor tempo de cada caso. Com --comparar, os
+tempos são confrontados com um JSON anterior e o script sai com código 1 se
+algum caso ficou mais lento que a tolerância.
+
+    python -m ferramentas.benchmark --saida bench.json
+    python -m ferramentas.benchmark --escalas 50x30,200x365 --comparar bench.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from diario.agregados import construir_agregados
+from diario.analise import (calcular_correlacoes, calcular_risco_burnout,
+                            calcular_risco_burnout_lote,
+                            detectar_padroes_semanais)
+from diario.esquema import METRICAS
+from diario.graficos import (figura_correlacoes, figura_evolucao, figura_perfil,
+                             figura_risco, figura_semanas)
+from diario.pdf import gerar_pdf
+from diario.tipagem import resumo_memoria, tipar
+from ferramentas.sintetico import gerar_dados
+
+ESCALAS_PADRAO = "50x30,200x365,500x1825"
+
+
+def medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return {"mediana_ms": round(statistics.median(tempos), 3),
+            "melhor_ms":  round(min(tempos), 3),
+            "repeticoes": repeticoes}
+
+
+def casos(df, hoje):
+    # (nome, função sem argumentos) de cada caminho quente, sobre o paciente
+    # com mais linhas da base
+    codigo = df["codigo_usuario"].value_counts().index[0]
+    limite = str(hoje - timedelta(days=7))
+
+    def filtrar():
+        df_user = df[df["codigo_usuario"] == codigo]
+        return df_user[df_user["data"] >= limite]
+
+    df_user = df[df["codigo_usuario"] == codigo].copy()
+    df_user["data"] = pd.to_datetime(df_user["data"])
+    df_user = df_user.sort_values("data", kind="stable")
+    df_7dias = df_user[df_user["data"] >= pd.Timestamp(limite)]
+    resumo = construir_agregados(df_user).resumo_semanas()
+    corr = df_7dias[METRICAS].corr()
+    dados_pdf = dict(nome_usuario="Paciente", risco=50, nivel_risco="Atenção",
+                     insights=calcular_correlacoes(df_7dias),
+                     padroes=detectar_padroes_semanais(df_user),
+                     remedios_salvos=str(df_user["remedios"].iloc[-1]), cache=None)
+
+    def figuras():
+        figura_risco(50, "Atenção")
+        figura_evolucao(df_7dias)
+        figura_perfil(df_7dias)
+        figura_correlacoes(corr.round(2))
+        if resumo is not None:
+            figura_semanas(resumo)
+
+    return [
+        ("tipar_base",             lambda: tipar(df)),
+        ("filtro_usuario_7dias",   filtrar),
+        ("risco_burnout",          lambda: calcular_risco_burnout(df_7dias)),
+        ("risco_burnout_lote",     lambda: calcular_risco_burnout_lote(df)),
+        ("correlacoes",            lambda: calcular_correlacoes(df_7dias)),
+        ("padroes_semanais",       lambda: detectar_padroes_semanais(df_user)),
+        ("resumo_semanas",         lambda: construir_agregados(df_user).resumo_semanas()),
+        ("construir_agregados",    lambda: construir_agregados(df_user)),
+        ("figuras_relatorio",      figuras),
+        ("figura_evolucao_historico", lambda: figura_evolucao(df_user)),
+        ("gerar_pdf_7dias",        lambda: gerar_pdf(df_7dias=df_7dias, **dados_pdf)),
+        ("gerar_pdf_historico",    lambda: gerar_pdf(df_7dias=df_user, **dados_pdf)),
+    ], len(df_user)
+
+
+def _versao_git():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(atual, anterior, tolerancia):
+    # Imprime a razão atual/anterior de cada caso; devolve os que pioraram
+    piores = []
+    for escala, resultados in atual["escalas"].items():
+        antigos = anterior.get("escalas", {}).get(escala, {}).get("casos", {})
+        for nome, medida in resultados["casos"].items():
+            if nome not in antigos:
+                continue
+            razao = medida["mediana_ms"] / max(antigos[nome]["mediana_ms"], 1e-6)
+            marca = " <-- mais lento" if razao > tolerancia else ""
+            print(f"  {escala:>10} {nome:<28} {razao:6.2f}x{marca}")
+            if razao > tolerancia:
+                piores.append((escala, nome, razao))
+    return piores
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--escalas", default=ESCALAS_PADRAO,
+                        help="lista pacientesxdias separada por vírgula")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--saida", help="grava os resultados neste JSON")
+    parser.add_argument("--comparar", help="JSON de uma rodada anterior")
+    parser.add_argument("--tolerancia", type=float, default=1.25,
+                        help="razão acima da qual um caso conta como regressão")
+    args = parser.parse_args(argv)
+
+    hoje = date.today()
+    resultado = {"versao": _versao_git(),
+                 "quando": datetime.now().isoformat(timespec="seconds"),
+                 "python": platform.python_version(),
+                 "pandas": pd.__version__,
+                 "maquina": platform.platform(),
+                 "escalas": {}}
+    for escala in args.escalas.split(","):
+        pacientes, dias = (int(x) for x in escala.lower().split("x"))
+        df = gerar_dados(pacientes, dias, hoje=hoje)
+        lista, linhas_usuario = casos(df, hoje)
+        memoria = resumo_memoria(df, tipar(df))
+        print(f"{escala}: {len(df):,} linhas, paciente medido com {linhas_usuario} linhas")
+        print(f"  memória: {memoria['bytes_antes']:,} -> {memoria['bytes_depois']:,} bytes "
+              f"({memoria['razao']}x menor tipada)")
+        medidas = {}
+        for nome, funcao in lista:
+            medidas[nome] = medir(funcao, args.repeticoes)
+            print(f"  {nome:<28} {medidas[nome]['mediana_ms']:>10.3f} ms")
+        resultado["escalas"][escala] = {"linhas": len(df),
+                                        "linhas_usuario": linhas_usuario,
+                                        "memoria": memoria,
+                                        "casos": medidas}
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+        print(f"resultados em {args.saida}")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            anterior = json.load(f)
+        print(f"comparação com {args.comparar} (versão {anterior.get('versao')}):")
+        if comparar(resultado, anterior, args.tolerancia):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
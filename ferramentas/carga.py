@@ -0,0 +1,213 @@
+"""Teste de carga: muitas sessões de pacientes na mesma janela da manhã.
+
+Cada sessão simulada faz o caminho do app: login (gerar_codigo e remédios
+atuais, como a primeira página), salvar o questionário do dia (pelo
+GravadorEmLote, como o botão de salvar) e abrir o relatório
+(dados_relatorio); com --pdf, baixa também o PDF. Tudo contra o substituto
+local da planilha (ArmazenamentoMemoria), com latência por chamada fixa mais
+uma cauda exponencial (--variacao). Várias réplicas do app são simuladas
+com um ServicoDiario cada sobre a mesma base; como ficam todas neste
+processo, dividem o GIL: medem caches e coordenação separados, não CPUs a
+mais. O upsert do substituto confere a versão entre a leitura das chaves e a
+gravação, como o da planilha, então gravações de réplicas diferentes
+colidem de verdade e aparecem em "conflitos" (refeitas pelo coordenador).
+
+As sessões chegam espalhadas em --janela segundos (0 = todas juntas). Sai a
+vazão e os percentis p50/p95/p99 de cada etapa; --comparar confronta os p95
+com um JSON anterior e sai com código 1 se algum piorou além da tolerância.
+Também sai com 1 se alguma sessão falhou ou algum registro não chegou.
+
+    python -m ferramentas.carga --sessoes 200 --latencia 0.2 --variacao 0.1
+    python -m ferramentas.carga --sessoes 500 --replicas 4 --janela 30 --saida carga.json
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from datetime import date, datetime
+
+import numpy as np
+
+from diario.armazenamento import ArmazenamentoMemoria
+from diario.dados import ServicoDiario, gerar_codigo
+from diario.esquema import METRICAS
+from ferramentas.sintetico import gerar_dados, senha_sintetica
+
+ETAPAS = ("login", "salvar", "relatorio", "pdf")
+
+
+def montar_base(pacientes, historico, latencia, variacao):
+    # Base com `historico` dias por paciente, gravada antes de ligar a latência
+    base = ArmazenamentoMemoria()
+    if historico:
+        df = gerar_dados(pacientes, historico, duplicados=0, remedios_longos=0)
+        base.anexar(df[df["data"] < str(date.today())].to_dict("records"))
+    base.latencia, base.variacao = latencia, variacao
+    base.chamadas = 0
+    return base
+
+
+def sessao(servico, i, pdf, tempos):
+    # Uma visita: login -> salvar -> relatório (-> PDF). tempos[etapa] recebe
+    # a duração de cada passo, em segundos
+    def medir(etapa, funcao, *args):
+        inicio = time.perf_counter()
+        resultado = funcao(*args)
+        tempos[etapa].append(time.perf_counter() - inicio)
+        return resultado
+
+    nome = f"Paciente {i}"
+
+    def login():
+        codigo = gerar_codigo(nome, senha_sintetica(i))
+        servico.versao_remedios(codigo)
+        return codigo, servico.remedios_atuais(codigo)
+
+    codigo, remedios = medir("login", login)
+    respostas = np.random.default_rng(i).integers(1, 6, len(METRICAS))
+    registro = dict({m: int(v) for m, v in zip(METRICAS, respostas)},
+                    data=str(date.today()), nome=nome, codigo_usuario=codigo, remedios="")
+    medir("salvar", servico.gravador.gravar, registro)
+    medir("relatorio", servico.dados_relatorio, codigo, nome, remedios)
+    if pdf:
+        medir("pdf", servico.pdf, codigo)
+    return codigo
+
+
+def percentis(duracoes):
+    if not duracoes:
+        return None
+    ms = np.asarray(duracoes) * 1000
+    return {"n":      len(ms),
+            "p50_ms": round(float(np.percentile(ms, 50)), 1),
+            "p95_ms": round(float(np.percentile(ms, 95)), 1),
+            "p99_ms": round(float(np.percentile(ms, 99)), 1),
+            "max_ms": round(float(ms.max()), 1)}
+
+
+def rodar(sessoes, pacientes, historico, replicas, latencia, variacao, janela, pdf):
+    base = montar_base(pacientes, historico, latencia, variacao)
+    servicos = [ServicoDiario(base) for _ in range(replicas)]
+    tempos = {etapa: [] for etapa in ETAPAS}
+    trava = threading.Lock()
+    codigos, erros = set(), []
+    chegadas = np.sort(np.random.default_rng(0).uniform(0, janela, sessoes)) if janela \
+        else np.zeros(sessoes)
+    largada = threading.Event()
+    inicio = None
+
+    def visitante(i):
+        largada.wait()
+        espera = inicio + chegadas[i] - time.perf_counter()
+        if espera > 0:
+            time.sleep(espera)
+        proprios = {etapa: [] for etapa in ETAPAS}
+        try:
+            codigo = sessao(servicos[i % replicas], i % pacientes, pdf, proprios)
+        except Exception as e:
+            with trava:
+                erros.append(repr(e))
+            return
+        with trava:
+            codigos.add(codigo)
+            for etapa, duracoes in proprios.items():
+                tempos[etapa].extend(duracoes)
+
+    threads = [threading.Thread(target=visitante, args=(i,)) for i in range(sessoes)]
+    for t in threads:
+        t.start()
+    inicio = time.perf_counter()
+    largada.set()
+    for t in threads:
+        t.join()
+    duracao = time.perf_counter() - inicio
+
+    hoje = base.ler_tudo()
+    hoje = hoje[hoje["data"] == str(date.today())]
+    faltando = len(codigos - set(hoje["codigo_usuario"]))
+    return {"sessoes":          sessoes,
+            "concluidas":       sessoes - len(erros),
+            "erros":            erros[:10],
+            "registros_perdidos": faltando,
+            "segundos":         round(duracao, 3),
+            "sessoes_por_s":    round((sessoes - len(erros)) / duracao, 2),
+            "chamadas_backend": base.chamadas,
+            "conflitos":        sum(s.coordenador.conflitos for s in servicos),
+            "etapas":           {etapa: percentis(d) for etapa, d in tempos.items() if d}}
+
+
+def comparar(atual, anterior, tolerancia):
+    # Razão entre os p95 de cada etapa; devolve as que pioraram
+    piores = []
+    for etapa, medida in atual["etapas"].items():
+        antiga = anterior.get("etapas", {}).get(etapa)
+        if not antiga:
+            continue
+        razao = medida["p95_ms"] / max(antiga["p95_ms"], 1e-6)
+        marca = " <-- mais lento" if razao > tolerancia else ""
+        print(f"  {etapa:<10} p95 {razao:6.2f}x{marca}")
+        if razao > tolerancia:
+            piores.append((etapa, razao))
+    return piores
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessoes", type=int, default=100, help="visitas simuladas")
+    parser.add_argument("--pacientes", type=int, default=None,
+                        help="pacientes distintos (padrão: um por sessão)")
+    parser.add_argument("--historico", type=int, default=90,
+                        help="dias de histórico de cada paciente antes de hoje")
+    parser.add_argument("--replicas", type=int, default=1,
+                        help="processos do app sobre a mesma base")
+    parser.add_argument("--latencia", type=float, default=0.05,
+                        help="latência fixa por chamada à planilha, em segundos")
+    parser.add_argument("--variacao", type=float, default=0.02,
+                        help="média da cauda exponencial somada à latência (s)")
+    parser.add_argument("--janela", type=float, default=0.0,
+                        help="segundos em que as sessões chegam (0 = todas juntas)")
+    parser.add_argument("--pdf", action="store_true", help="cada sessão baixa o PDF")
+    parser.add_argument("--saida", help="grava o resultado neste JSON")
+    parser.add_argument("--comparar", help="JSON de uma rodada anterior")
+    parser.add_argument("--tolerancia", type=float, default=1.25,
+                        help="razão de p95 acima da qual uma etapa conta como regressão")
+    args = parser.parse_args(argv)
+    pacientes = args.pacientes or args.sessoes
+
+    resultado = rodar(args.sessoes, pacientes, args.historico, args.replicas,
+                      args.latencia, args.variacao, args.janela, args.pdf)
+    resultado = dict({"quando": datetime.now().isoformat(timespec="seconds"),
+                      "parametros": {"pacientes": pacientes, "historico": args.historico,
+                                     "replicas": args.replicas, "latencia": args.latencia,
+                                     "variacao": args.variacao, "janela": args.janela,
+                                     "pdf": args.pdf}},
+                     **resultado)
+
+    print(f"{resultado['concluidas']}/{args.sessoes} sessões em {resultado['segundos']}s "
+          f"({resultado['sessoes_por_s']} sessões/s), {resultado['chamadas_backend']} "
+          f"chamadas à base, {resultado['conflitos']} conflitos")
+    for etapa, p in resultado["etapas"].items():
+        print(f"  {etapa:<10} p50 {p['p50_ms']:>8.1f} ms  p95 {p['p95_ms']:>8.1f} ms  "
+              f"p99 {p['p99_ms']:>8.1f} ms  máx {p['max_ms']:>8.1f} ms")
+    for erro in resultado["erros"]:
+        print(f"  erro: {erro}")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+        print(f"resultado em {args.saida}")
+    falhou = bool(resultado["erros"]) or resultado["registros_perdidos"] > 0
+    if resultado["registros_perdidos"]:
+        print(f"FALHA: {resultado['registros_perdidos']} registros de hoje não chegaram à base")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            anterior = json.load(f)
+        print(f"comparação com {args.comparar} ({anterior.get('quando')}):")
+        if comparar(resultado, anterior, args.tolerancia):
+            falhou = True
+    return 1 if falhou else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
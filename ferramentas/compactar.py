@@ -0,0 +1,80 @@
+"""Compacta o histórico: um registro por (codigo_usuario, data).
+
+Antes do upsert, salvar duas vezes no mesmo dia gerava duas linhas. Este
+comando lê a base uma vez, fica com o último registro de cada paciente em
+cada dia e regrava tudo numa única operação, informando quantas linhas e
+bytes foram recuperados. Rode com o app parado (ou em horário sem uso): a
+regravação é condicionada à versão lida e é refeita se alguém gravar no meio.
+
+    python -m ferramentas.compactar --sqlite diario.db
+    python -m ferramentas.compactar --csv planilha.csv --saida compacta.csv
+    python -m ferramentas.compactar --gsheets URL_DA_PLANILHA --simular
+
+--gsheets usa a mesma conexão do app (credenciais em .streamlit/secrets.toml).
+"""
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+from diario.armazenamento import (ArmazenamentoSQLite, CoordenadorGravacao,
+                                  compactar, deduplicar, resumo_compactacao)
+from diario.esquema import COLUNAS
+
+
+def _armazenamento_gsheets(url):
+    from diario.armazenamento import ArmazenamentoGSheets
+    return ArmazenamentoGSheets.conectar(url)
+
+
+def _compactar_csv(entrada, saida, simular):
+    df = pd.read_csv(entrada, usecols=COLUNAS, dtype=str, keep_default_na=False)
+    df = df[(df != "").any(axis=1)]
+    compacta = deduplicar(df)
+    if not simular:
+        compacta.to_csv(saida, index=False)
+    return resumo_compactacao(df, compacta)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    origem = parser.add_mutually_exclusive_group(required=True)
+    origem.add_argument("--sqlite", help="caminho da base SQLite")
+    origem.add_argument("--csv", help="CSV exportado da planilha")
+    origem.add_argument("--gsheets", help="URL da planilha")
+    parser.add_argument("--saida", help="CSV compactado (com --csv)")
+    parser.add_argument("--simular", action="store_true",
+                        help="só conta o que seria removido, sem gravar")
+    args = parser.parse_args(argv)
+
+    if args.csv:
+        if not args.saida and not args.simular:
+            parser.error("--csv precisa de --saida (ou --simular)")
+        resumo = _compactar_csv(args.csv, args.saida, args.simular)
+    else:
+        if args.sqlite:
+            armazenamento = ArmazenamentoSQLite(args.sqlite)
+            arquivo_antes = os.path.getsize(args.sqlite)
+        else:
+            armazenamento = _armazenamento_gsheets(args.gsheets)
+        resumo = CoordenadorGravacao(armazenamento).executar(
+            compactar, armazenamento, args.simular)
+        if args.sqlite and not args.simular:
+            armazenamento.liberar_espaco()
+            resumo["arquivo_bytes_antes"] = arquivo_antes
+            resumo["arquivo_bytes_depois"] = os.path.getsize(args.sqlite)
+
+    acao = "seriam removidas" if args.simular else "removidas"
+    print(f"{resumo['linhas_removidas']:,} linhas duplicadas {acao} "
+          f"({resumo['linhas_antes']:,} -> {resumo['linhas_depois']:,})")
+    print(f"{resumo['bytes_recuperados']:,} bytes recuperados em CSV "
+          f"({resumo['bytes_antes']:,} -> {resumo['bytes_depois']:,})")
+    if "arquivo_bytes_antes" in resumo:
+        print(f"arquivo SQLite: {resumo['arquivo_bytes_antes']:,} -> "
+              f"{resumo['arquivo_bytes_depois']:,} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""Teste de estresse das gravações simultâneas.
+
+Dispara N salvamentos ao mesmo tempo contra o substituto local da planilha
+(ArmazenamentoMemoria, com latência simulada) e confere se todas as linhas
+chegaram. Vários "processos" são simulados com coordenadores independentes
+sobre a mesma base, como várias réplicas do app apontando para a mesma
+planilha.
+
+    python -m ferramentas.estresse_gravacao --sessoes 200 --processos 4
+
+Sai com código 1 se alguma linha se perder.
+"""
+import argparse
+import sys
+import threading
+import time
+from datetime import date
+
+import pandas as pd
+
+from diario.armazenamento import (ArmazenamentoMemoria, CoordenadorGravacao,
+                                  GravadorEmLote, normalizar_registros)
+
+
+def _registro(i):
+    return {"data": str(date.today()), "nome": f"paciente {i}",
+            "codigo_usuario": f"u{i:05d}", "Humor": 3, "Irritabilidade": 2,
+            "Bateria": 3, "Sono": 4, "Nevoa": 3, "Pressao": 2, "remedios": ""}
+
+
+def _disparar(n, salvar):
+    # Todas as threads esperam na barreira e gravam juntas
+    barreira = threading.Barrier(n)
+    erros = []
+
+    def sessao(i):
+        barreira.wait()
+        try:
+            salvar(i, _registro(i))
+        except Exception as e:
+            erros.append(e)
+
+    threads = [threading.Thread(target=sessao, args=(i,)) for i in range(n)]
+    inicio = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - inicio, erros
+
+
+def sem_coordenacao(n, latencia):
+    # O salvar_registro antigo: lê tudo, concatena e regrava sem conferir nada
+    base = ArmazenamentoMemoria(latencia=latencia)
+
+    def salvar(_, dados):
+        df = pd.concat([base.ler_tudo(), normalizar_registros([dados])],
+                       ignore_index=True)
+        base.reescrever(df)
+
+    duracao, erros = _disparar(n, salvar)
+    return base, duracao, erros
+
+
+def coordenado(n, latencia, processos, modo):
+    base = ArmazenamentoMemoria(latencia=latencia)
+    coordenadores = [CoordenadorGravacao(base) for _ in range(processos)]
+    gravadores = [GravadorEmLote(lambda regs, c=c: c.anexar(regs, modo=modo))
+                  for c in coordenadores]
+
+    def salvar(i, dados):
+        gravadores[i % processos].gravar(dados)
+
+    duracao, erros = _disparar(n, salvar)
+    conflitos = sum(c.conflitos for c in coordenadores)
+    return base, duracao, erros, conflitos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessoes", type=int, default=100)
+    parser.add_argument("--processos", type=int, default=3)
+    parser.add_argument("--latencia", type=float, default=0.005,
+                        help="latência simulada por chamada, em segundos")
+    args = parser.parse_args(argv)
+    n = args.sessoes
+
+    base, duracao, _ = sem_coordenacao(n, args.latencia)
+    salvos = len(base.ler_tudo())
+    print(f"sem coordenação        : {salvos}/{n} linhas "
+          f"({n - salvos} perdidas) em {duracao:.2f}s")
+
+    ok = True
+    for modo in ("anexar", "upsert", "reescrever"):
+        base, duracao, erros, conflitos = coordenado(
+            n, args.latencia, args.processos, modo)
+        df = base.ler_tudo()
+        salvos = df["codigo_usuario"].nunique()
+        print(f"coordenado ({modo:<10}): {salvos}/{n} linhas em {duracao:.2f}s, "
+              f"{base.chamadas} chamadas, {conflitos} conflitos, {len(erros)} erros")
+        if salvos != n or len(df) != n or erros:
+            ok = False
+
+    if not ok:
+        print("FALHA: linhas perdidas ou duplicadas com coordenação")
+        return 1
+    print("OK: nenhuma linha perdida")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""Taxa de falsos padrões por dia da semana em pacientes só com ruído.
+
+Gera pacientes sem efeito nenhum de dia da semana e conta quantos saem com
+pelo menos um padrão em DetectorPadroes.efeitos(). Com Bonferroni a taxa
+deve ficar em torno de ALFA ou abaixo; acima de --limite o comando sai
+com erro.
+
+    python -m ferramentas.falsos_padroes
+    python -m ferramentas.falsos_padroes --dias 56,120,365 --pacientes 2000
+
+Modelos: "uniforme" (notas 1-5 sorteadas com a mesma chance, o pior caso
+para o teste) e "nivel" (nível e variação próprios por métrica, arredondados
+para a escala).
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from diario.esquema import METRICAS
+from diario.padroes import ALFA, detector_de_linhas
+
+MODELOS = ("uniforme", "nivel")
+
+
+def gerar_valores(rng, modelo, dias):
+    # Matriz dias × 6 de notas inteiras 1-5, sem efeito de dia da semana
+    k = len(METRICAS)
+    if modelo == "uniforme":
+        return rng.integers(1, 6, size=(dias, k)).astype(float)
+    base = rng.uniform(1.8, 4.2, size=k)
+    desvio = rng.uniform(0.3, 1.2, size=k)
+    return np.clip(np.rint(base + rng.normal(0, 1, (dias, k)) * desvio), 1, 5)
+
+
+def taxa_falsos(dias, pacientes, modelo, falhas=0.15, semente=0):
+    # Fração dos pacientes com ao menos um padrão detectado
+    rng = np.random.default_rng(semente)
+    datas = pd.Series(pd.date_range(end=pd.Timestamp.today().normalize(), periods=dias))
+    com_padrao = 0
+    for _ in range(pacientes):
+        valores = gerar_valores(rng, modelo, dias)
+        presente = rng.random(dias) >= falhas
+        detector = detector_de_linhas(datas[presente].reset_index(drop=True),
+                                      valores[presente])
+        com_padrao += bool(detector.efeitos())
+    return com_padrao / pacientes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dias", default="28,56,120,365",
+                        help="tamanhos do histórico, separados por vírgula")
+    parser.add_argument("--pacientes", type=int, default=500)
+    parser.add_argument("--modelos", default=",".join(MODELOS))
+    parser.add_argument("--limite", type=float, default=ALFA,
+                        help="taxa máxima aceita (padrão: ALFA)")
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    acima = 0
+    print(f"{'modelo':<10}{'dias':>6}{'falsos':>9}")
+    for modelo in args.modelos.split(","):
+        if modelo not in MODELOS:
+            parser.error(f"modelo desconhecido: {modelo}")
+        for dias in (int(d) for d in args.dias.split(",")):
+            taxa = taxa_falsos(dias, args.pacientes, modelo, semente=args.semente)
+            marca = "  <- acima do limite" if taxa > args.limite else ""
+            acima += taxa > args.limite
+            print(f"{modelo:<10}{dias:>6}{taxa:>9.1%}{marca}")
+    return 1 if acima else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
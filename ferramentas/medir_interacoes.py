@@ -0,0 +1,122 @@
+"""Mede o custo por interação do app (caixa de remédios, abas do relatório).
+
+Roda o streamlit_app.py com o AppTest sobre uma base SQLite temporária com
+um paciente e N dias de histórico. Para cada interação mostra o tempo da
+página inteira (o que toda interação custava antes dos fragmentos) e o do
+fragmento que de fato reexecuta no servidor.
+
+O AppTest sempre reexecuta o script inteiro, então o tempo do fragmento vem
+de st.session_state.tempos_ms, gravado pelo próprio app.
+
+    python -m ferramentas.medir_interacoes --dias 365 --repeticoes 20
+    python -m ferramentas.medir_interacoes --app /tmp/versao_antiga.py
+"""
+import argparse
+import hashlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from diario.armazenamento import ArmazenamentoSQLite
+from diario.esquema import METRICAS
+
+APP_PADRAO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          "streamlit_app.py")
+ABAS = ["📈 Evolução", "🎯 Perfil", "🔗 Correlações", "📆 Semanas", "📅 Padrões"]
+
+
+def _codigo(nome, senha):
+    # Mesmo cálculo do gerar_codigo do app (importar o app executaria a página)
+    texto = f"{nome.strip().lower()}:{senha.strip()}"
+    return hashlib.md5(texto.encode()).hexdigest()[:8]
+
+
+def criar_base(caminho, dias, nome, senha):
+    rng = np.random.default_rng(0)
+    codigo = _codigo(nome, senha)
+    hoje = date.today()
+    registros = []
+    for i in range(dias, 0, -1):
+        registro = {"data": str(hoje - timedelta(days=i)), "nome": nome,
+                    "codigo_usuario": codigo, "remedios": "Sertralina 50mg - manhã"}
+        registro.update({m: int(v) for m, v in zip(METRICAS, rng.integers(1, 6, len(METRICAS)))})
+        registros.append(registro)
+    ArmazenamentoSQLite(caminho).anexar(registros)
+
+
+def _mediana(valores):
+    return round(statistics.median(valores), 2) if valores else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", default=APP_PADRAO)
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--repeticoes", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    from streamlit.testing.v1 import AppTest
+
+    pasta = tempfile.mkdtemp()
+    caminho = os.path.join(pasta, "diario.db")
+    criar_base(caminho, args.dias, "Borboleta", "x")
+    os.environ["DIARIO_ARMAZENAMENTO"] = "sqlite"
+    os.environ["DIARIO_SQLITE"] = caminho
+
+    at = AppTest.from_file(os.path.abspath(args.app), default_timeout=120).run()
+    at.text_input[0].input("Borboleta")
+    at.text_input[1].input("x")
+    at.button[0].click().run()
+    [b for b in at.button if "Gerar" in b.label][0].click().run()
+    if at.exception:
+        print(at.exception, file=sys.stderr)
+        return 1
+
+    def interagir(acao):
+        inicio = time.perf_counter()
+        acao()
+        at.run()
+        total = (time.perf_counter() - inicio) * 1000
+        tempos = at.session_state["tempos_ms"] if "tempos_ms" in at.session_state else {}
+        # Um tempo ausente (None) indica trecho lido antes de a etapa fechar
+        invalidos = {k: v for k, v in tempos.items() if not isinstance(v, (int, float))}
+        if invalidos:
+            raise SystemExit(f"tempos_ms com valores não numéricos: {invalidos}")
+        return total, tempos
+
+    medidas = {"remedios": ([], [], []), "aba": ([], [], [])}
+    for i in range(args.repeticoes):
+        def editar(i=i):
+            at.text_area[0].input(f"Sertralina 50mg - manhã\nrevisão {i}")
+        total, tempos = interagir(editar)
+        medidas["remedios"][0].append(total)
+        if "pagina" in tempos:
+            medidas["remedios"][1].append(tempos["pagina"])
+            medidas["remedios"][2].append(tempos["medicamentos"])
+
+        def trocar_aba(i=i):
+            at.session_state["abas_relatorio"] = ABAS[i % len(ABAS)]
+        total, tempos = interagir(trocar_aba)
+        medidas["aba"][0].append(total)
+        if "pagina" in tempos:
+            medidas["aba"][1].append(tempos["pagina"])
+            medidas["aba"][2].append(tempos["relatorio"])
+        if at.exception:
+            print(at.exception, file=sys.stderr)
+            return 1
+
+    print(f"app: {args.app} — {args.dias} dias, {args.repeticoes} repetições (medianas, ms)")
+    print(f"{'interação':<12}{'AppTest':>10}{'página':>10}{'fragmento':>11}")
+    for nome, (total, pagina, fragmento) in medidas.items():
+        print(f"{nome:<12}{_mediana(total):>10}{str(_mediana(pagina)):>10}"
+              f"{str(_mediana(fragmento)):>11}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
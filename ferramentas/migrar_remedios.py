@@ -0,0 +1,57 @@
+"""Migra os remédios das linhas diárias para a tabela versionada.
+
+Até aqui cada registro diário levava o texto inteiro dos remédios, mesmo
+sem mudança. Este comando reconstrói, para cada paciente, uma versão por
+troca de lista (com a data em que apareceu), grava essas versões na tabela
+de remédios e regrava a base com a coluna "remedios" vazia, informando o
+espaço economizado. Pode ser rodado de novo: quem já tem versões é pulado.
+Rode com o app parado (ou em horário sem uso): a regravação é condicionada
+à versão lida e é refeita se alguém gravar no meio.
+
+    python -m ferramentas.migrar_remedios --sqlite diario.db
+    python -m ferramentas.migrar_remedios --gsheets URL_DA_PLANILHA --simular
+
+--gsheets usa a mesma conexão do app (credenciais em .streamlit/secrets.toml)
+e cria a aba "remedios" se ela não existir.
+"""
+import argparse
+import os
+import sys
+
+from diario.armazenamento import (ArmazenamentoSQLite, CoordenadorGravacao,
+                                  migrar_remedios)
+from ferramentas.compactar import _armazenamento_gsheets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    origem = parser.add_mutually_exclusive_group(required=True)
+    origem.add_argument("--sqlite", help="caminho da base SQLite")
+    origem.add_argument("--gsheets", help="URL da planilha")
+    parser.add_argument("--simular", action="store_true",
+                        help="só conta o que seria migrado, sem gravar")
+    args = parser.parse_args(argv)
+
+    if args.sqlite:
+        armazenamento = ArmazenamentoSQLite(args.sqlite)
+        arquivo_antes = os.path.getsize(args.sqlite)
+    else:
+        armazenamento = _armazenamento_gsheets(args.gsheets)
+    resumo = CoordenadorGravacao(armazenamento).executar(
+        migrar_remedios, armazenamento, args.simular)
+
+    acao = "seriam gravadas" if args.simular else "gravadas"
+    print(f"{resumo['versoes']:,} versões de remédios {acao} para "
+          f"{resumo['usuarios']:,} pacientes")
+    print(f"{resumo['linhas_limpas']:,} linhas diárias sem a cópia dos remédios")
+    print(f"{resumo['bytes_recuperados']:,} bytes recuperados em CSV "
+          f"({resumo['bytes_antes']:,} -> {resumo['bytes_depois']:,})")
+    if args.sqlite and not args.simular:
+        armazenamento.liberar_espaco()
+        print(f"arquivo SQLite: {arquivo_antes:,} -> "
+              f"{os.path.getsize(args.sqlite):,} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
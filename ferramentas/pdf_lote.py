@@ -0,0 +1,66 @@
+"""Gera os PDFs de todos os pacientes (ou de uma lista) num único ZIP.
+
+Usado na entrega semanal para a psicóloga. Lê a base SQLite local ou um CSV
+exportado da planilha e distribui os relatórios num pool de processos.
+
+    python -m ferramentas.pdf_lote --sqlite diario.db --saida relatorios.zip
+    python -m ferramentas.pdf_lote --csv planilha.csv --usuarios ab12cd34,ef56ab78
+    python -m ferramentas.pdf_lote --sqlite diario.db --arquivo arquivo/
+    python -m ferramentas.pdf_lote --sqlite diario.db --arquivo arquivo/ --dias 3650
+"""
+import argparse
+import sys
+
+import pandas as pd
+
+from diario.armazenamento import ArmazenamentoSQLite, deduplicar, remedios_vigentes
+from diario.esquema import COLUNAS
+from diario.lote_pdf import gerar_pdfs_lote
+from diario.tipagem import concatenar, tipar
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    origem = parser.add_mutually_exclusive_group(required=True)
+    origem.add_argument("--sqlite", help="caminho da base SQLite")
+    origem.add_argument("--csv", help="CSV exportado da planilha")
+    parser.add_argument("--saida", default="relatorios.zip")
+    parser.add_argument("--usuarios", help="codigo_usuario separados por vírgula")
+    parser.add_argument("--processos", type=int, default=None,
+                        help="tamanho do pool (padrão: número de CPUs)")
+    parser.add_argument("--arquivo", help="diretório do arquivo frio: padrões "
+                                          "semanais com o histórico inteiro")
+    parser.add_argument("--dias", type=int, default=7,
+                        help="janela de cada relatório (padrão: 7, semanal)")
+    args = parser.parse_args(argv)
+
+    remedios = None
+    if args.sqlite:
+        armazenamento = ArmazenamentoSQLite(args.sqlite)
+        df = armazenamento.ler_tudo()
+        remedios = remedios_vigentes(armazenamento.ler_remedios())
+    else:
+        df = pd.read_csv(args.csv, usecols=COLUNAS).dropna(how="all")
+    codigos = args.usuarios.split(",") if args.usuarios else None
+    if args.arquivo:
+        from diario.arquivo import ArquivoHistorico
+        # Como no ServicoDiario: um registro por dia, a versão quente vence
+        antigas = ArquivoHistorico(args.arquivo).ler()
+        df = deduplicar(concatenar(antigas, tipar(df))).reset_index(drop=True)
+
+    def progresso(feitos, total):
+        print(f"\r{feitos}/{total} relatórios", end="", file=sys.stderr, flush=True)
+
+    resumo = gerar_pdfs_lote(df, args.saida, codigos=codigos,
+                             processos=args.processos, progresso=progresso,
+                             remedios=remedios, dias=args.dias)
+    print(file=sys.stderr)
+    print(f"{resumo['gerados']} PDFs em {args.saida} — {resumo['segundos']}s, "
+          f"{resumo['relatorios_por_segundo']} relatórios/s")
+    if resumo["ignorados"]:
+        print(f"{len(resumo['ignorados'])} pacientes sem registro nos últimos {args.dias} dias")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
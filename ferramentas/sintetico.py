@@ -0,0 +1,123 @@
+"""Gera bases sintéticas no formato da planilha (COLUNAS).
+
+N pacientes × M dias com um comportamento plausível: cada paciente tem um
+nível próprio por métrica, oscilações que duram alguns dias (AR(1)), efeito
+de dia da semana, dias sem registro, dias registrados duas vezes e listas de
+remédios que mudam de tempos em tempos (algumas bem longas).
+
+    python -m ferramentas.sintetico --pacientes 200 --dias 365 --csv base.csv
+    python -m ferramentas.sintetico --pacientes 200 --dias 365 --sqlite base.db
+"""
+import argparse
+import sys
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from diario.armazenamento import ArmazenamentoSQLite
+from diario.dados import gerar_codigo
+from diario.esquema import COLUNAS, METRICAS
+
+REMEDIOS = ["Sertralina 50mg - manhã", "Escitalopram 10mg - manhã",
+            "Fluoxetina 20mg - manhã", "Bupropiona 150mg - manhã",
+            "Clonazepam 0,5mg - noite", "Quetiapina 25mg - noite",
+            "Lítio 300mg - 12/12h", "Melatonina 3mg - noite",
+            "Venlafaxina 75mg - manhã", "Trazodona 50mg - noite"]
+# Efeito médio de cada dia da semana (segunda = 0) sobre as métricas
+EFEITO_DIA_SEMANA = {"Pressao": [0.6, 0.3, 0.1, 0.0, -0.2, -0.5, -0.3],
+                     "Humor":   [-0.4, -0.2, 0.0, 0.0, 0.2, 0.4, 0.2],
+                     "Sono":    [-0.3, 0.0, 0.0, 0.0, 0.0, 0.3, 0.3]}
+
+
+def senha_sintetica(i):
+    # Nome "Paciente i" + esta senha entra no app como o paciente i
+    return f"senha{i}"
+
+
+def _texto_remedios(rng, longo):
+    escolhidos = rng.choice(REMEDIOS, size=rng.integers(1, 4), replace=False)
+    texto = "\n".join(escolhidos)
+    if longo:
+        obs = "Obs.: tomar após as refeições; evitar álcool; ajuste combinado na última consulta. "
+        texto += "\n" + obs * int(rng.integers(10, 30))
+    return texto
+
+
+def gerar_dados(pacientes=100, dias=365, falhas=0.15, duplicados=0.02,
+                remedios_longos=0.05, semente=0, hoje=None):
+    # DataFrame com COLUNAS, datas em texto ISO e linhas na ordem em que
+    # chegariam na planilha (dia a dia, pacientes intercalados)
+    rng = np.random.default_rng(semente)
+    hoje = pd.Timestamp(hoje or date.today())
+    datas = pd.date_range(end=hoje, periods=dias)
+    dia_semana = datas.dayofweek.to_numpy()
+
+    valores = {}
+    for m in METRICAS:
+        base = rng.uniform(1.8, 4.2, size=pacientes)
+        ruido = np.empty((dias, pacientes))
+        atual = rng.normal(0, 0.6, size=pacientes)
+        for t in range(dias):
+            atual = 0.7 * atual + rng.normal(0, 0.6, size=pacientes)
+            ruido[t] = atual
+        efeito = np.asarray(EFEITO_DIA_SEMANA.get(m, [0.0] * 7))[dia_semana][:, None]
+        valores[m] = np.clip(np.rint(base + ruido + efeito), 1, 5).astype(int)
+
+    # Remédios: cada paciente troca a lista em média a cada ~60 dias
+    versoes_remedios = np.cumsum(rng.random((dias, pacientes)) < 1 / 60, axis=0)
+    longos = rng.random(pacientes) < remedios_longos
+
+    presente = rng.random((dias, pacientes)) >= falhas
+    t_idx, p_idx = np.nonzero(presente)
+    df = pd.DataFrame({"data": datas.strftime("%Y-%m-%d").to_numpy()[t_idx],
+                       "paciente": p_idx})
+    pares, qual = np.unique(np.stack([p_idx, versoes_remedios[t_idx, p_idx]]),
+                            axis=1, return_inverse=True)
+    textos = np.array([_texto_remedios(rng, longos[p]) for p in pares[0]], dtype=object)
+    df["remedios"] = textos[qual.ravel()]
+    for m in METRICAS:
+        df[m] = valores[m][t_idx, p_idx]
+
+    # Dia registrado duas vezes: segunda linha com outra resposta, logo depois
+    if duplicados > 0 and len(df):
+        dup = df.sample(frac=duplicados, random_state=semente).copy()
+        for m in METRICAS:
+            dup[m] = rng.integers(1, 6, size=len(dup))
+        df = pd.concat([df, dup]).sort_values(["data", "paciente"], kind="stable")
+
+    nomes = np.array([f"Paciente {i}" for i in range(pacientes)], dtype=object)
+    codigos = np.array([gerar_codigo(f"Paciente {i}", senha_sintetica(i))
+                        for i in range(pacientes)], dtype=object)
+    df["nome"] = nomes[df["paciente"].to_numpy()]
+    df["codigo_usuario"] = codigos[df["paciente"].to_numpy()]
+    return df[COLUNAS].reset_index(drop=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pacientes", type=int, default=100)
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--falhas", type=float, default=0.15,
+                        help="fração de dias sem registro")
+    parser.add_argument("--duplicados", type=float, default=0.02,
+                        help="fração de dias registrados duas vezes")
+    parser.add_argument("--semente", type=int, default=0)
+    destino = parser.add_mutually_exclusive_group(required=True)
+    destino.add_argument("--csv")
+    destino.add_argument("--sqlite")
+    args = parser.parse_args(argv)
+
+    df = gerar_dados(args.pacientes, args.dias, falhas=args.falhas,
+                     duplicados=args.duplicados, semente=args.semente)
+    if args.csv:
+        df.to_csv(args.csv, index=False)
+    else:
+        ArmazenamentoSQLite(args.sqlite).anexar(df.to_dict("records"))
+    print(f"{len(df):,} linhas ({args.pacientes} pacientes × {args.dias} dias) em "
+          f"{args.csv or args.sqlite}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,23 @@
 import streamlit as st
 from streamlit_gsheets import GSheetsConnection
-import pandas as pd
 from datetime import date, timedelta
-import plotly.graph_objects as go
-import plotly.express as px
-import hashlib
-import numpy as np
-import io
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, HRFlowable
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
+import os
+import time
+from functools import partial, wraps
+from diario.esquema import METRICAS
+from diario.armazenamento import ArmazenamentoGSheets, ArmazenamentoSQLite
+from diario.dados import ServicoDiario, gerar_codigo
+from diario.graficos import (figura_correlacoes, figura_evolucao, figura_perfil,
+                             figura_risco, figura_semanas)
+from diario.instrumentacao import INSTRUMENTACAO, etapa, log
+from diario.pdf import gerar_pdf, nome_arquivo_relatorio
 
 st.set_page_config(page_title="Monitor de Saúde Mental", layout="wide", page_icon="🧠")
+_inicio_execucao = time.perf_counter()
+INSTRUMENTACAO.iniciar_execucao()
+# Verdadeiro enquanto o script inteiro roda; no fim vira False, e um fragmento
+# que roda com ele False é um rerun só do fragmento (ver cronometrado)
+_execucao_completa = True
 
 # ─── ESTILO VISUAL ────────────────────────────────────────────
 st.markdown("""
@@ -31,312 +34,258 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ─── CONFIGURAÇÕES ────────────────────────────────────────────
-CORES_METRICAS = {
-    "Humor":          "#2196F3",
-    "Sono":           "#9C27B0",
-    "Pressao":        "#F44336",
-    "Irritabilidade": "#FF9800",
-    "Bateria":        "#4CAF50",
-    "Nevoa":          "#00BCD4"
-}
-METRICAS = ["Humor", "Sono", "Pressao", "Irritabilidade", "Bateria", "Nevoa"]
 EMOJIS   = {"Humor":"😊","Sono":"😴","Pressao":"🌡️",
             "Irritabilidade":"😤","Bateria":"🔋","Nevoa":"🧩"}
 
-conn = st.connection("gsheets", type=GSheetsConnection)
 SHEET_URL = "https://docs.google.com/spreadsheets/d/1vSR4W34p1g80bie4CjRdyzm1_OJliRpA0VUtnNz1D_g/edit?usp=sharing"
-COLUNAS   = ["data", "nome", "codigo_usuario", "Humor", "Irritabilidade",
-             "Bateria", "Sono", "Nevoa", "Pressao", "remedios"]
+
+# Motor de armazenamento: "gsheets" (padrão) ou "sqlite" para rodar offline
+ARMAZENAMENTO = os.environ.get("DIARIO_ARMAZENAMENTO", "gsheets")
+SQLITE_PATH   = os.environ.get("DIARIO_SQLITE", "diario.db")
+# Diretório do arquivo frio (ferramentas.arquivar); vazio = só a base quente
+ARQUIVO_DIR   = os.environ.get("DIARIO_ARQUIVO", "")
+MAX_USUARIOS_CACHE = 500
+# Releitura forçada (s) para pegar edições feitas direto na planilha
+TTL_SEGURANCA_CACHE = 600
+# Períodos (dias) que podem ser escolhidos para os gráficos do relatório
+PERIODOS_RELATORIO = [7, 30, 90, 365]
+# Arquivo com as métricas no formato do Prometheus, regravado a cada execução
+# (para o textfile collector do node_exporter); vazio desliga
+METRICAS_ARQUIVO = os.environ.get("DIARIO_METRICAS_ARQUIVO", "")
+
+@st.cache_resource
+def obter_armazenamento():
+    if ARMAZENAMENTO == "sqlite":
+        return ArmazenamentoSQLite(SQLITE_PATH)
+    conn = st.connection("gsheets", type=GSheetsConnection)
+    return ArmazenamentoGSheets(conn, SHEET_URL)
 
 # ─── FUNÇÕES DE DADOS ─────────────────────────────────────────
-def gerar_codigo(nome, senha):
-    texto = f"{nome.strip().lower()}:{senha.strip()}"
-    return hashlib.md5(texto.encode()).hexdigest()[:8]
+# Caches, gravação e consultas ficam em diario.dados (sem Streamlit); aqui só
+# uma instância por processo
+@st.cache_resource
+def servico():
+    arquivo = None
+    if ARQUIVO_DIR:
+        from diario.arquivo import ArquivoHistorico
+        arquivo = ArquivoHistorico(ARQUIVO_DIR)
+    return ServicoDiario(obter_armazenamento(), max_usuarios=MAX_USUARIOS_CACHE,
+                         ttl=TTL_SEGURANCA_CACHE, arquivo=arquivo)
 
 def ler_dados():
+    return servico().ler_dados()
+
+def ler_dados_usuario(codigo_usuario):
+    return servico().ler_dados_usuario(codigo_usuario)
+
+def salvar_registros(registros, modo="upsert"):
+    servico().salvar_registros(registros, modo=modo)
+
+def salvar_registro(dados_dict, modo="upsert"):
+    servico().salvar_registro(dados_dict, modo=modo)
+
+# ─── DERIVAÇÕES POR SESSÃO ────────────────────────────────────
+def derivados_usuario(codigo_usuario, nome_usuario):
+    # Remédios atuais e dados do relatório guardados na sessão. Só são
+    # refeitos quando as linhas do usuário mudam (versão do cache, que sobe a
+    # cada gravação ou recarga), quando sai uma versão nova dos remédios ou
+    # quando o dia vira.
+    versao_remedios = (servico().versao_remedios(codigo_usuario) or {}).get("versao")
+    chave = (codigo_usuario, servico().cache_usuarios.versao(codigo_usuario),
+             versao_remedios, date.today())
+    derivados = st.session_state.get("derivados")
+    if derivados is None or derivados["chave"] != chave:
+        derivados = {"chave": chave,
+                     "remedios_salvos": servico().remedios_atuais(codigo_usuario)}
+        st.session_state.derivados = derivados
+    if "relatorio" not in derivados and st.session_state.relatorio_aberto:
+        try:
+            derivados["relatorio"] = servico().dados_relatorio(
+                codigo_usuario, nome_usuario, derivados["remedios_salvos"])
+        except Exception as e:
+            # Leitura falhou: nada fica guardado e a próxima execução tenta de novo
+            derivados["erro_relatorio"] = str(e)
+    return derivados
+
+def exportar_metricas():
+    # Caminho inválido ou disco cheio não derrubam a página: fica o aviso no log
+    if not METRICAS_ARQUIVO:
+        return
     try:
-        df = conn.read(spreadsheet=SHEET_URL, usecols=COLUNAS, ttl=5)
-        return df.dropna(how="all")
-    except:
-        return pd.DataFrame(columns=COLUNAS)
-
-def salvar_registro(dados_dict):
-    df_atual = ler_dados()
-    novo = pd.DataFrame([dados_dict])
-    df_final = pd.concat([df_atual, novo], ignore_index=True)
-    for col in COLUNAS:
-        if col not in df_final.columns:
-            df_final[col] = ""
-    df_final = df_final[COLUNAS]
-    conn.update(spreadsheet=SHEET_URL, data=df_final)
-
-def calcular_risco_burnout(df):
-    if df.empty:
-        return 0, "Sem dados"
-    pontos = 0
-    total  = 0
-    pesos = {"Pressao":        (True,  2.0),
-             "Humor":          (False, 2.0),
-             "Sono":           (False, 1.5),
-             "Irritabilidade": (True,  1.5),
-             "Bateria":        (False, 1.0),
-             "Nevoa":          (False, 1.0)}
-    for col, (direto, peso) in pesos.items():
-        if col in df.columns:
-            media = df[col].tail(5).mean()
-            val   = (media / 5) if direto else ((5 - media) / 5)
-            pontos += val * peso
-            total  += peso
-    risco = round((pontos / total) * 100) if total > 0 else 0
-    if risco >= 70:
-        nivel = "Alto Risco"
-    elif risco >= 40:
-        nivel = "Atenção"
+        INSTRUMENTACAO.exportar_arquivo(METRICAS_ARQUIVO)
+    except OSError as e:
+        log.warning("não foi possível exportar as métricas em %s: %s", METRICAS_ARQUIVO, e)
+
+def cronometrado(nome):
+    # Etapa "ui.<nome>" na instrumentação; o tempo da última execução de cada
+    # trecho também fica em st.session_state.tempos_ms. Num rerun só do
+    # fragmento as etapas da thread recomeçam do zero e a execução é
+    # registrada no fim, como a da página inteira
+    def decorador(funcao):
+        @wraps(funcao)
+        def envolvida(*args, **kwargs):
+            so_fragmento = not _execucao_completa
+            if so_fragmento:
+                INSTRUMENTACAO.iniciar_execucao()
+            try:
+                with etapa(f"ui.{nome}") as medida:
+                    return funcao(*args, **kwargs)
+            finally:
+                # medida.ms só é preenchido quando o with fecha
+                st.session_state.tempos_ms[nome] = medida.ms
+                if so_fragmento:
+                    INSTRUMENTACAO.log_execucao(fragmento=nome, ms=medida.ms)
+                    exportar_metricas()
+        return envolvida
+    return decorador
+
+# ─── SEÇÕES DO RELATÓRIO ──────────────────────────────────────
+def secao_resumo(rel):
+    df_7dias = rel["df_7dias"]
+    risco = rel["risco"]
+    nivel_risco = rel["nivel_risco"]
+    nome_usuario = rel["nome_usuario"]
+
+    # RISCO DE BURNOUT
+    st.markdown("### 🔥 Risco de Burnout")
+    fig_gauge = figura_risco(risco, nivel_risco)
+    st.plotly_chart(fig_gauge, use_container_width=True)
+
+    # CARDS
+    st.markdown("### 📋 Resumo da Semana")
+    cols = st.columns(len(METRICAS))
+    for i, m in enumerate(METRICAS):
+        if m in df_7dias.columns:
+            media = df_7dias[m].mean()
+            delta = (df_7dias[m].iloc[-1] - df_7dias[m].iloc[0]
+                     if len(df_7dias) > 1 else 0)
+            cols[i].metric(label=f"{EMOJIS[m]} {m}",
+                           value=f"{media:.1f} / 5",
+                           delta=f"{delta:+.0f} vs início")
+
+    # PARTICIPAÇÃO
+    registros = len(df_7dias)
+    if registros < 7:
+        st.warning(f"📅 Você registrou {registros} de 7 dias esta semana.")
     else:
-        nivel = "Estável"
-    return risco, nivel
-
-def calcular_correlacoes(df):
-    if len(df) < 5:
-        return []
-    insights = []
-    pares = [
-        ("Sono",   "Humor",          "positiva", "Quando o sono melhora, o humor tende a melhorar também"),
-        ("Pressao","Humor",           "negativa", "Quando a pressão aumenta, o humor tende a cair"),
-        ("Pressao","Irritabilidade",  "positiva", "Pressão alta está ligada ao aumento de irritabilidade"),
-        ("Sono",   "Nevoa",           "positiva", "Sono ruim está associado a mais névoa mental"),
-        ("Bateria","Humor",           "positiva", "Baixa bateria social coincide com queda no humor"),
-    ]
-    for col1, col2, tipo, descricao in pares:
-        if col1 not in df.columns or col2 not in df.columns:
-            continue
-        corr = df[col1].corr(df[col2])
-        if tipo == "positiva" and corr > 0.5:
-            insights.append(f"{descricao} (força: {corr:.2f})")
-        elif tipo == "negativa" and corr < -0.5:
-            insights.append(f"{descricao} (força: {abs(corr):.2f})")
-    return insights
-
-def detectar_padroes_semanais(df):
-    if len(df) < 7:
-        return []
-    dias_pt = {0:"Segunda",1:"Terça",2:"Quarta",
-               3:"Quinta",4:"Sexta",5:"Sábado",6:"Domingo"}
-    df = df.copy()
-    df["dia_semana"] = df["data"].dt.dayofweek
-    padroes = []
-    for metrica in ["Humor", "Sono", "Pressao"]:
-        if metrica not in df.columns:
-            continue
-        media_geral = df[metrica].mean()
-        por_dia = df.groupby("dia_semana")[metrica].mean()
-        for dia_num, media_dia in por_dia.items():
-            if media_dia < media_geral * 0.75 and metrica in ["Humor","Sono"]:
-                padroes.append(f"Toda {dias_pt[dia_num]} o {metrica} costuma ser mais baixo")
-            if media_dia > media_geral * 1.25 and metrica == "Pressao":
-                padroes.append(f"Toda {dias_pt[dia_num]} a Pressão costuma ser mais alta")
-    return padroes
-
-def comparar_semanas(df_user):
-    if len(df_user) < 7:
-        return None
-    df_user = df_user.copy().sort_values("data")
-    df_user["semana"] = (df_user["data"].dt.isocalendar().week.astype(str)
-                         + "/" + df_user["data"].dt.year.astype(str))
-    return df_user.groupby("semana")[METRICAS].mean().round(2).reset_index()
-
-# ─── GERADOR DE PDF ───────────────────────────────────────────
-def gerar_pdf(nome_usuario, df_7dias, risco, nivel_risco,
-              insights, padroes, remedios_salvos):
-
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4,
-                            rightMargin=2*cm, leftMargin=2*cm,
-                            topMargin=2*cm, bottomMargin=2*cm)
-
-    styles = getSampleStyleSheet()
-    estilo_titulo = ParagraphStyle("titulo",
-        fontSize=20, fontName="Helvetica-Bold",
-        textColor=colors.HexColor("#1a237e"),
-        spaceAfter=6, alignment=TA_CENTER)
-    estilo_subtitulo = ParagraphStyle("subtitulo",
-        fontSize=13, fontName="Helvetica-Bold",
-        textColor=colors.HexColor("#283593"),
-        spaceAfter=4, spaceBefore=14)
-    estilo_corpo = ParagraphStyle("corpo",
-        fontSize=10, fontName="Helvetica",
-        textColor=colors.HexColor("#333333"),
-        spaceAfter=4, leading=16)
-    estilo_alerta = ParagraphStyle("alerta",
-        fontSize=11, fontName="Helvetica-Bold",
-        textColor=colors.HexColor("#cc0000"),
-        spaceAfter=4)
-    estilo_ok = ParagraphStyle("ok",
-        fontSize=11, fontName="Helvetica-Bold",
-        textColor=colors.HexColor("#2e7d32"),
-        spaceAfter=4)
-
-    elementos = []
-
-    # Cabeçalho
-    elementos.append(Paragraph("🧠 Relatório de Saúde Mental", estilo_titulo))
-    elementos.append(Paragraph(f"Paciente: {nome_usuario}", estilo_titulo))
-    elementos.append(Spacer(1, 0.3*cm))
-    elementos.append(HRFlowable(width="100%", thickness=1,
-                                color=colors.HexColor("#3949ab")))
-    elementos.append(Spacer(1, 0.3*cm))
-
-    periodo_ini = df_7dias["data"].min().strftime("%d/%m/%Y")
-    periodo_fim = df_7dias["data"].max().strftime("%d/%m/%Y")
-    elementos.append(Paragraph(
-        f"Período analisado: {periodo_ini} a {periodo_fim}   |   "
-        f"Registros: {len(df_7dias)} de 7 dias   |   "
-        f"Gerado em: {date.today().strftime('%d/%m/%Y')}",
-        estilo_corpo))
-    elementos.append(Spacer(1, 0.4*cm))
-
-    # Medicamentos
-    if remedios_salvos.strip():
-        elementos.append(Paragraph("Medicamentos em uso", estilo_subtitulo))
-        for linha in remedios_salvos.strip().split("\n"):
-            if linha.strip():
-                elementos.append(Paragraph(f"• {linha.strip()}", estilo_corpo))
-        elementos.append(Spacer(1, 0.3*cm))
-
-    # Risco de burnout
-    elementos.append(Paragraph("Risco de Burnout", estilo_subtitulo))
-    elementos.append(HRFlowable(width="100%", thickness=0.5,
-                                color=colors.HexColor("#cccccc")))
-    elementos.append(Spacer(1, 0.2*cm))
+        st.success("🎉 Semana completa! Todos os 7 dias registrados.")
 
+    # ALERTA FINAL
     if risco >= 70:
-        elementos.append(Paragraph(
-            f"⚠ ALTO RISCO — {risco}%  |  {nivel_risco}", estilo_alerta))
-        elementos.append(Paragraph(
-            "O paciente apresenta indicadores críticos. "
-            "Recomenda-se revisão urgente dos procedimentos terapêuticos.",
-            estilo_corpo))
+        st.markdown(f"""<div style="background:#fff0f0;border:2px solid #F44336;
+        border-radius:12px;padding:20px;margin-top:15px">
+        <h3 style="color:#cc0000;margin-top:0">🔴 ALTO RISCO — Ação Recomendada</h3>
+        <p style="color:#444">O paciente <b>{nome_usuario}</b> apresenta risco de burnout
+        de <b>{risco}%</b>. Recomenda-se revisão urgente.</p></div>""",
+        unsafe_allow_html=True)
     elif risco >= 40:
-        elementos.append(Paragraph(
-            f"⚠ ATENÇÃO — {risco}%  |  {nivel_risco}",
-            ParagraphStyle("atencao", fontSize=11, fontName="Helvetica-Bold",
-                           textColor=colors.HexColor("#e65100"), spaceAfter=4)))
-        elementos.append(Paragraph(
-            "O paciente apresenta sinais de alerta moderados. "
-            "Recomenda-se atenção redobrada.",
-            estilo_corpo))
+        st.markdown(f"""<div style="background:#fffbe6;border:2px solid #FF9800;
+        border-radius:12px;padding:20px;margin-top:15px">
+        <h3 style="color:#e65100;margin-top:0">🟡 ATENÇÃO — Monitorar de Perto</h3>
+        <p style="color:#444">O paciente <b>{nome_usuario}</b> apresenta risco moderado
+        de <b>{risco}%</b>.</p></div>""", unsafe_allow_html=True)
     else:
-        elementos.append(Paragraph(
-            f"✓ ESTÁVEL — {risco}%  |  {nivel_risco}", estilo_ok))
-        elementos.append(Paragraph(
-            "Nenhum sinal crítico detectado nesta semana.", estilo_corpo))
-
-    elementos.append(Spacer(1, 0.4*cm))
-
-    # Tabela de médias
-    elementos.append(Paragraph("Médias da Semana por Indicador", estilo_subtitulo))
-    elementos.append(HRFlowable(width="100%", thickness=0.5,
-                                color=colors.HexColor("#cccccc")))
-    elementos.append(Spacer(1, 0.2*cm))
-
-    cabecalho = ["Indicador", "Média (1-5)", "Mínimo", "Máximo", "Tendência"]
-    linhas = [cabecalho]
-    for m in METRICAS:
-        if m not in df_7dias.columns:
-            continue
-        serie = df_7dias[m].dropna()
-        media = serie.mean()
-        minv  = serie.min()
-        maxv  = serie.max()
-        if len(serie) >= 3:
-            z = np.polyfit(np.arange(len(serie)), serie.values.astype(float), 1)
-            tend = "↑ Subindo" if z[0] > 0.1 else ("↓ Caindo" if z[0] < -0.1 else "→ Estável")
-        else:
-            tend = "—"
-        linhas.append([m, f"{media:.1f}", f"{minv:.0f}", f"{maxv:.0f}", tend])
-
-    tabela = Table(linhas, colWidths=[4*cm, 3*cm, 2.5*cm, 2.5*cm, 3.5*cm])
-    tabela.setStyle(TableStyle([
-        ("BACKGROUND",    (0,0), (-1,0),  colors.HexColor("#3949ab")),
-        ("TEXTCOLOR",     (0,0), (-1,0),  colors.white),
-        ("FONTNAME",      (0,0), (-1,0),  "Helvetica-Bold"),
-        ("FONTSIZE",      (0,0), (-1,-1), 9),
-        ("ALIGN",         (0,0), (-1,-1), "CENTER"),
-        ("ROWBACKGROUNDS",(0,1), (-1,-1),
-         [colors.HexColor("#f5f5f5"), colors.white]),
-        ("GRID",          (0,0), (-1,-1), 0.5, colors.HexColor("#cccccc")),
-        ("TOPPADDING",    (0,0), (-1,-1), 6),
-        ("BOTTOMPADDING", (0,0), (-1,-1), 6),
-    ]))
-    elementos.append(tabela)
-    elementos.append(Spacer(1, 0.5*cm))
-
-    # Tabela diária
-    elementos.append(Paragraph("Registros Diários", estilo_subtitulo))
-    elementos.append(HRFlowable(width="100%", thickness=0.5,
-                                color=colors.HexColor("#cccccc")))
-    elementos.append(Spacer(1, 0.2*cm))
-
-    colunas_diario = ["Data"] + METRICAS
-    dados_diario = [colunas_diario]
-    for _, row in df_7dias.sort_values("data").iterrows():
-        linha = [row["data"].strftime("%d/%m")]
-        for m in METRICAS:
-            linha.append(str(int(row[m])) if m in row and pd.notna(row[m]) else "—")
-        dados_diario.append(linha)
-
-    tab_diario = Table(dados_diario,
-                       colWidths=[2*cm] + [2.4*cm]*len(METRICAS))
-    tab_diario.setStyle(TableStyle([
-        ("BACKGROUND",    (0,0), (-1,0),  colors.HexColor("#5c6bc0")),
-        ("TEXTCOLOR",     (0,0), (-1,0),  colors.white),
-        ("FONTNAME",      (0,0), (-1,0),  "Helvetica-Bold"),
-        ("FONTSIZE",      (0,0), (-1,-1), 9),
-        ("ALIGN",         (0,0), (-1,-1), "CENTER"),
-        ("ROWBACKGROUNDS",(0,1), (-1,-1),
-         [colors.HexColor("#f5f5f5"), colors.white]),
-        ("GRID",          (0,0), (-1,-1), 0.5, colors.HexColor("#cccccc")),
-        ("TOPPADDING",    (0,0), (-1,-1), 5),
-        ("BOTTOMPADDING", (0,0), (-1,-1), 5),
-    ]))
-    elementos.append(tab_diario)
-    elementos.append(Spacer(1, 0.5*cm))
-
-    # Insights
+        st.success(f"🟢 Risco baixo ({risco}%) — Nenhum sinal crítico esta semana!")
+
+def secao_evolucao(rel):
+    # Média diária já agregada (não relê as linhas); séries longas são
+    # reduzidas por LTTB dentro do figura_evolucao
+    serie = rel["ag"].serie_diaria(desde=date.today() - timedelta(days=rel["periodo"]))
+
+    # GRÁFICO DE LINHAS + TENDÊNCIA
+    st.markdown(f"### 📈 Evolução com Linha de Tendência — últimos {rel['periodo']} dias")
+    fig = figura_evolucao(serie)
+    st.plotly_chart(fig, use_container_width=True)
+
+def secao_perfil(rel):
+    df_7dias = rel["df_7dias"]
+
+    # RADAR
+    st.markdown("### 🎯 Perfil Geral da Semana")
+    fig_radar = figura_perfil(df_7dias)
+    st.plotly_chart(fig_radar, use_container_width=True)
+
+def secao_correlacoes(rel):
+    df_7dias = rel["df_7dias"]
+    corr_7dias = rel["corr_7dias"]
+    insights = rel["insights"]
+
+    # CORRELAÇÕES
+    st.markdown("### 🔗 Mapa de Correlações")
+    metricas_ex = [m for m in METRICAS if m in df_7dias.columns]
+    if len(df_7dias) >= 4:
+        corr_matrix = corr_7dias.loc[metricas_ex, metricas_ex].round(2)
+        fig_corr = figura_correlacoes(corr_matrix)
+        st.plotly_chart(fig_corr, use_container_width=True)
+        st.caption("💡 +1 = sobem juntos | -1 = um sobe quando o outro cai | 0 = sem relação")
+
+    st.markdown("### 💡 Insights Detectados")
     if insights:
-        elementos.append(Paragraph("Correlações Identificadas", estilo_subtitulo))
-        elementos.append(HRFlowable(width="100%", thickness=0.5,
-                                    color=colors.HexColor("#cccccc")))
-        elementos.append(Spacer(1, 0.2*cm))
         for ins in insights:
-            elementos.append(Paragraph(f"• {ins}", estilo_corpo))
-        elementos.append(Spacer(1, 0.3*cm))
+            st.markdown(f"- {ins}")
+    else:
+        st.info("Necessário pelo menos 5 registros para detectar correlações.")
 
-    # Padrões
+def secao_semanas(rel):
+    ag = rel["ag"]
+
+    # COMPARAÇÃO ENTRE SEMANAS (com 7 dias não há o que comparar: histórico inteiro)
+    st.markdown("### 📆 Comparação entre Semanas")
+    desde = date.today() - timedelta(days=rel["periodo"]) if rel["periodo"] > 7 else None
+    resumo_semanas = ag.resumo_semanas(desde=desde)
+    if resumo_semanas is not None and len(resumo_semanas) > 1:
+        fig_semanas = figura_semanas(resumo_semanas)
+        st.plotly_chart(fig_semanas, use_container_width=True)
+        st.dataframe(resumo_semanas.drop(columns="inicio").set_index("semana"),
+                     use_container_width=True)
+    else:
+        st.info("📆 Com mais semanas de dados aparecerá aqui a comparação entre semanas.")
+
+def secao_padroes(rel):
+    padroes = rel["padroes"]
+
+    # PADRÕES E INSIGHTS
+    st.markdown("### 📅 Padrões por Dia da Semana")
     if padroes:
-        elementos.append(Paragraph("Padrões por Dia da Semana", estilo_subtitulo))
-        elementos.append(HRFlowable(width="100%", thickness=0.5,
-                                    color=colors.HexColor("#cccccc")))
-        elementos.append(Spacer(1, 0.2*cm))
         for p in padroes:
-            elementos.append(Paragraph(f"• {p}", estilo_corpo))
-        elementos.append(Spacer(1, 0.3*cm))
-
-    # Rodapé
-    elementos.append(HRFlowable(width="100%", thickness=1,
-                                color=colors.HexColor("#3949ab")))
-    elementos.append(Spacer(1, 0.2*cm))
-    elementos.append(Paragraph(
-        "Este relatório foi gerado automaticamente pelo Monitor de Saúde Mental. "
-        "As informações são de caráter auxiliar e devem ser interpretadas "
-        "pelo profissional de saúde responsável.",
-        ParagraphStyle("rodape", fontSize=8, fontName="Helvetica",
-                       textColor=colors.HexColor("#888888"),
-                       alignment=TA_CENTER)))
-
-    doc.build(elementos)
-    buffer.seek(0)
-    return buffer
+            st.markdown(f"- {p}")
+    else:
+        st.info("Nenhum dia da semana se destaca e nada fugiu do habitual nos últimos "
+                "dias. Os padrões aparecem com pelo menos 4 semanas de registros.")
+
+def secao_pdf(rel):
+    st.markdown("### 📄 Relatório em PDF para a Psicóloga")
+    st.info("Clique abaixo para gerar e baixar o relatório completo em PDF.")
+
+    # O PDF só é montado quando o botão é clicado (data como função)
+    gerar = partial(gerar_pdf,
+        nome_usuario=rel["nome_usuario"],
+        df_7dias=rel["df_7dias"],
+        risco=rel["risco"],
+        nivel_risco=rel["nivel_risco"],
+        insights=rel["insights"],
+        padroes=rel["padroes"],
+        remedios_salvos=rel["remedios_salvos"]
+    )
+
+    nome_arquivo = nome_arquivo_relatorio(rel["nome_usuario"], date.today())
+    st.download_button(
+        label="⬇️ Baixar Relatório PDF",
+        data=lambda: gerar().getvalue(),
+        file_name=nome_arquivo,
+        mime="application/pdf"
+    )
+
+# Ordem das abas do relatório; cada seção só roda com a aba aberta
+SECOES_RELATORIO = [
+    ("🔥 Resumo",      secao_resumo),
+    ("📈 Evolução",    secao_evolucao),
+    ("🎯 Perfil",      secao_perfil),
+    ("🔗 Correlações", secao_correlacoes),
+    ("📆 Semanas",     secao_semanas),
+    ("📅 Padrões",     secao_padroes),
+    ("📄 PDF",         secao_pdf),
+]
 
 # ─── LOGIN ────────────────────────────────────────────────────
 st.title("🧠 Monitor de Saúde Mental")
@@ -344,6 +293,10 @@ st.title("🧠 Monitor de Saúde Mental")
 if "usuario_logado" not in st.session_state:
     st.session_state.usuario_logado = None
     st.session_state.codigo_usuario = None
+if "relatorio_aberto" not in st.session_state:
+    st.session_state.relatorio_aberto = False
+if "tempos_ms" not in st.session_state:
+    st.session_state.tempos_ms = {}
 
 if st.session_state.usuario_logado is None:
     st.subheader("Entrar no sistema")
@@ -369,276 +322,155 @@ st.sidebar.success(f"👤 Logado como: {nome_usuario}")
 if st.sidebar.button("Sair"):
     st.session_state.usuario_logado = None
     st.session_state.codigo_usuario = None
+    st.session_state.relatorio_aberto = False
     st.rerun()
 
+# Painel de diagnóstico (abrir o app com ?debug=1): preenchido no fim do
+# script, com as etapas desta execução
+DEBUG = st.query_params.get("debug") == "1"
+if DEBUG:
+    # A medição de memória das cargas fica ligada no processo daqui em diante
+    servico().carga_dados.medir_memoria = True
+    servico().carga_usuarios.medir_memoria = True
+    with st.sidebar.expander("Cache de dados"):
+        st.json({"base": servico().cache_dados.estatisticas(),
+                 "usuarios": servico().cache_usuarios.estatisticas()})
+    with st.sidebar.expander("Memória das cargas (bytes)"):
+        st.json({"base": servico().carga_dados.estatisticas(),
+                 "usuarios": servico().carga_usuarios.estatisticas()})
+    painel_etapas = st.sidebar.expander("Etapas desta execução (ms)").empty()
+
 # ─── MEDICAMENTOS ─────────────────────────────────────────────
-st.subheader("💊 Gestão de Medicamentos")
-df_todos = ler_dados()
-remedios_salvos = ""
-if not df_todos.empty and "codigo_usuario" in df_todos.columns:
-    df_user_rem = df_todos[df_todos["codigo_usuario"] == codigo_usuario]
-    if not df_user_rem.empty:
-        ultimos = df_user_rem["remedios"].dropna()
-        if not ultimos.empty:
-            remedios_salvos = ultimos.iloc[-1]
-
-remedios_input = st.text_area(
-    "Remédios que você toma (Nome, Dosagem, Horário):",
-    value=remedios_salvos,
-    placeholder="Ex: Sertralina 50mg - manhã\nClonazepam 0,5mg - noite"
-)
+# Fragmentos: editar a caixa de remédios ou mexer no questionário só reexecuta
+# o próprio trecho, sem reler dados nem redesenhar o relatório
+derivados = derivados_usuario(codigo_usuario, nome_usuario)
+remedios_salvos = derivados["remedios_salvos"]
+if st.session_state.get("remedios_de") != (codigo_usuario, remedios_salvos):
+    st.session_state.remedios_de = (codigo_usuario, remedios_salvos)
+    st.session_state.remedios_input = remedios_salvos
+
+@st.fragment
+@cronometrado("medicamentos")
+def secao_medicamentos():
+    st.subheader("💊 Gestão de Medicamentos")
+    st.text_area(
+        "Remédios que você toma (Nome, Dosagem, Horário):",
+        key="remedios_input",
+        placeholder="Ex: Sertralina 50mg - manhã\nClonazepam 0,5mg - noite"
+    )
+
+secao_medicamentos()
 
 # ─── QUESTIONÁRIO DIÁRIO ──────────────────────────────────────
 st.markdown("---")
-st.subheader("📝 Como você está hoje?")
-
-with st.form("diario_form"):
-    c1, c2 = st.columns(2)
-    with c1:
-        humor          = st.select_slider("😊 Humor (Triste → Feliz)",             options=[1,2,3,4,5], value=3)
-        irritabilidade = st.select_slider("😤 Irritabilidade (Calmo → Irritado)",  options=[1,2,3,4,5], value=1)
-        bateria        = st.select_slider("🔋 Bateria Social (Esgotado → Sociável)",options=[1,2,3,4,5], value=3)
-    with c2:
-        sono    = st.select_slider("😴 Qualidade do Sono (Péssimo → Ótimo)",   options=[1,2,3,4,5], value=3)
-        nevoa   = st.select_slider("🧩 Foco Mental (Confuso → Claro)",          options=[1,2,3,4,5], value=3)
-        pressao = st.select_slider("🌡️ Pressão Interna (Tranquilo → Exausto)",  options=[1,2,3,4,5], value=1)
-    atualizar_rem = st.checkbox("Quero atualizar meus remédios junto com este registro")
-    submit = st.form_submit_button("💾 Salvar Registro de Hoje")
-
-if submit:
-    dados = {
-        "data":           str(date.today()),
-        "nome":           nome_usuario,
-        "codigo_usuario": codigo_usuario,
-        "Humor":          humor,
-        "Irritabilidade": irritabilidade,
-        "Bateria":        bateria,
-        "Sono":           sono,
-        "Nevoa":          nevoa,
-        "Pressao":        pressao,
-        "remedios":       remedios_input if atualizar_rem else remedios_salvos
-    }
-    try:
-        salvar_registro(dados)
+
+@st.fragment
+@cronometrado("questionario")
+def secao_questionario(nome_usuario, codigo_usuario):
+    st.subheader("📝 Como você está hoje?")
+    if st.session_state.pop("registro_salvo", False):
         st.balloons()
         st.success("✅ Registro salvo com sucesso!")
-    except Exception as e:
-        st.error(f"Erro ao salvar: {e}")
 
-# ─── RELATÓRIO ────────────────────────────────────────────────
-st.markdown("---")
-st.subheader("📊 Relatório e Análise de Padrões")
+    with st.form("diario_form"):
+        c1, c2 = st.columns(2)
+        with c1:
+            humor          = st.select_slider("😊 Humor (Triste → Feliz)",             options=[1,2,3,4,5], value=3)
+            irritabilidade = st.select_slider("😤 Irritabilidade (Calmo → Irritado)",  options=[1,2,3,4,5], value=1)
+            bateria        = st.select_slider("🔋 Bateria Social (Esgotado → Sociável)",options=[1,2,3,4,5], value=3)
+        with c2:
+            sono    = st.select_slider("😴 Qualidade do Sono (Péssimo → Ótimo)",   options=[1,2,3,4,5], value=3)
+            nevoa   = st.select_slider("🧩 Foco Mental (Confuso → Claro)",          options=[1,2,3,4,5], value=3)
+            pressao = st.select_slider("🌡️ Pressão Interna (Tranquilo → Exausto)",  options=[1,2,3,4,5], value=1)
+        atualizar_rem = st.checkbox("Quero atualizar meus remédios junto com este registro")
+        submit = st.form_submit_button("💾 Salvar Registro de Hoje")
+
+    if submit:
+        dados = {
+            "data":           str(date.today()),
+            "nome":           nome_usuario,
+            "codigo_usuario": codigo_usuario,
+            "Humor":          humor,
+            "Irritabilidade": irritabilidade,
+            "Bateria":        bateria,
+            "Sono":           sono,
+            "Nevoa":          nevoa,
+            "Pressao":        pressao,
+            "remedios":       ""
+        }
+        try:
+            # Remédios têm versão própria: só grava se a lista mudou
+            if atualizar_rem:
+                servico().atualizar_remedios(codigo_usuario, st.session_state.remedios_input)
+            servico().gravador.gravar(dados)
+        except Exception as e:
+            st.error(f"Erro ao salvar: {e}")
+        else:
+            # Rerun da página inteira: relatório e remédios passam a ver o registro
+            st.session_state.registro_salvo = True
+            st.rerun()
 
-if st.button("📈 Gerar Relatório dos Últimos 7 Dias"):
-    df_todos = ler_dados()
+secao_questionario(nome_usuario, codigo_usuario)
 
-    if df_todos.empty or "codigo_usuario" not in df_todos.columns:
-        st.warning("Ainda não há dados na planilha.")
-        st.stop()
+# ─── RELATÓRIO ────────────────────────────────────────────────
+st.markdown("---")
 
-    df_user = df_todos[df_todos["codigo_usuario"] == codigo_usuario].copy()
-    if df_user.empty:
+@st.fragment
+@cronometrado("relatorio")
+def secao_relatorio(codigo_usuario, nome_usuario):
+    st.subheader("📊 Relatório e Análise de Padrões")
+
+    if st.button("📈 Gerar Relatório dos Últimos 7 Dias"):
+        st.session_state.relatorio_aberto = True
+    if not st.session_state.relatorio_aberto:
+        return
+
+    derivados = derivados_usuario(codigo_usuario, nome_usuario)
+    rel = derivados.get("relatorio")
+    if rel is None:
+        st.error(f"Não foi possível ler seus registros agora: {derivados.pop('erro_relatorio', '')}")
+        return
+    if rel == "sem_registros":
+        st.session_state.relatorio_aberto = False
         st.markdown("""<div style="background:#fff0f0;border:2px solid #ff4444;
         border-radius:12px;padding:20px"><h3 style="color:#cc0000">⚠️ Sem registros</h3>
         <p>Você ainda não fez nenhum registro.</p></div>""", unsafe_allow_html=True)
-        st.stop()
-
-    df_user["data"] = pd.to_datetime(df_user["data"])
-    df_user = df_user.sort_values("data")
-    limite   = pd.to_datetime(date.today() - timedelta(days=7))
-    df_7dias = df_user[df_user["data"] >= limite].copy()
-
-    if df_7dias.empty:
+        return
+    if rel == "sem_semana":
+        st.session_state.relatorio_aberto = False
         st.markdown("""<div style="background:#fff0f0;border:2px solid #ff4444;
         border-radius:12px;padding:20px"><h3 style="color:#cc0000">⚠️ Sem participação esta semana</h3>
         <p>Nenhum registro nos últimos 7 dias.</p></div>""", unsafe_allow_html=True)
-        st.stop()
-
-    risco, nivel_risco = calcular_risco_burnout(df_7dias)
-    insights = calcular_correlacoes(df_7dias)
-    padroes  = detectar_padroes_semanais(df_user)
-
-    # 1. RISCO DE BURNOUT
-    st.markdown("### 🔥 Risco de Burnout")
-    cor_barra = "#4CAF50" if risco < 40 else ("#FF9800" if risco < 70 else "#F44336")
-    fig_gauge = go.Figure(go.Indicator(
-        mode="gauge+number",
-        value=risco,
-        title={"text": f"Nível de Risco — {nivel_risco}", "font": {"size": 18, "color": "#333"}},
-        number={"suffix": "%", "font": {"size": 36, "color": "#333"}},
-        gauge={"axis": {"range": [0,100]}, "bar": {"color": cor_barra},
-               "steps": [{"range": [0,40],  "color": "#e8f5e9"},
-                          {"range": [40,70], "color": "#fff8e1"},
-                          {"range": [70,100],"color": "#ffebee"}]}
-    ))
-    fig_gauge.update_layout(paper_bgcolor="#f8f9fa", font=dict(color="#333"),
-                            height=280, margin=dict(l=30,r=30,t=60,b=20))
-    st.plotly_chart(fig_gauge, use_container_width=True)
-
-    # 2. CARDS
-    st.markdown("### 📋 Resumo da Semana")
-    cols = st.columns(len(METRICAS))
-    for i, m in enumerate(METRICAS):
-        if m in df_7dias.columns:
-            media = df_7dias[m].mean()
-            delta = (df_7dias[m].iloc[-1] - df_7dias[m].iloc[0]
-                     if len(df_7dias) > 1 else 0)
-            cols[i].metric(label=f"{EMOJIS[m]} {m}",
-                           value=f"{media:.1f} / 5",
-                           delta=f"{delta:+.0f} vs início")
-
-    # 3. GRÁFICO DE LINHAS + TENDÊNCIA
-    st.markdown("### 📈 Evolução com Linha de Tendência")
-    fig = go.Figure()
-    for metrica in METRICAS:
-        if metrica not in df_7dias.columns:
-            continue
-        fig.add_trace(go.Scatter(
-            x=df_7dias["data"], y=df_7dias[metrica],
-            mode="lines+markers", name=metrica,
-            line=dict(color=CORES_METRICAS[metrica], width=2),
-            marker=dict(size=7)
-        ))
-        if len(df_7dias) >= 3:
-            x_num = np.arange(len(df_7dias))
-            y_val = df_7dias[metrica].values.astype(float)
-            try:
-                z = np.polyfit(x_num, y_val, 1)
-                p = np.poly1d(z)
-                sinal = "↑ subindo" if z[0] > 0.1 else ("↓ caindo" if z[0] < -0.1 else "→ estável")
-                fig.add_trace(go.Scatter(
-                    x=df_7dias["data"], y=p(x_num), mode="lines",
-                    name=f"Tendência {metrica} ({sinal})",
-                    line=dict(color=CORES_METRICAS[metrica], width=1, dash="dot"),
-                    opacity=0.45
-                ))
-            except:
-                pass
-    fig.update_layout(
-        plot_bgcolor="#ffffff", paper_bgcolor="#f8f9fa", font=dict(color="#333"),
-        legend=dict(bgcolor="#ffffff", bordercolor="#e0e0e0"),
-        xaxis=dict(gridcolor="#e0e0e0", title="Data"),
-        yaxis=dict(gridcolor="#e0e0e0", range=[0,6], tickmode="linear",
-                   dtick=1, title="Nível (1-5)"),
-        hovermode="x unified", margin=dict(l=20,r=20,t=40,b=20)
-    )
-    st.plotly_chart(fig, use_container_width=True)
-
-    # 4. RADAR
-    st.markdown("### 🎯 Perfil Geral da Semana")
-    labels = [m for m in METRICAS if m in df_7dias.columns]
-    medias = [df_7dias[m].mean() for m in labels]
-    fig_radar = go.Figure(go.Scatterpolar(
-        r=medias + [medias[0]], theta=labels + [labels[0]],
-        fill="toself", fillcolor="rgba(33,150,243,0.15)",
-        line=dict(color="#2196F3", width=2), marker=dict(size=6)
-    ))
-    fig_radar.update_layout(
-        polar=dict(bgcolor="#ffffff",
-            radialaxis=dict(visible=True, range=[0,5], gridcolor="#e0e0e0", color="#555"),
-            angularaxis=dict(gridcolor="#e0e0e0", color="#333")),
-        paper_bgcolor="#f8f9fa", font=dict(color="#333"),
-        margin=dict(l=40,r=40,t=40,b=40)
-    )
-    st.plotly_chart(fig_radar, use_container_width=True)
-
-    # 5. CORRELAÇÕES
-    st.markdown("### 🔗 Mapa de Correlações")
-    metricas_ex = [m for m in METRICAS if m in df_7dias.columns]
-    if len(df_7dias) >= 4:
-        corr_matrix = df_7dias[metricas_ex].corr().round(2)
-        fig_corr = px.imshow(corr_matrix, text_auto=True,
-                             color_continuous_scale="RdBu", zmin=-1, zmax=1,
-                             title="Quanto cada indicador influencia o outro")
-        fig_corr.update_layout(paper_bgcolor="#f8f9fa", font=dict(color="#333"),
-                               margin=dict(l=20,r=20,t=60,b=20))
-        st.plotly_chart(fig_corr, use_container_width=True)
-        st.caption("💡 +1 = sobem juntos | -1 = um sobe quando o outro cai | 0 = sem relação")
-
-    # 6. COMPARAÇÃO ENTRE SEMANAS
-    st.markdown("### 📆 Comparação entre Semanas")
-    resumo_semanas = comparar_semanas(df_user)
-    if resumo_semanas is not None and len(resumo_semanas) > 1:
-        fig_semanas = go.Figure()
-        for metrica in METRICAS:
-            if metrica in resumo_semanas.columns:
-                fig_semanas.add_trace(go.Scatter(
-                    x=resumo_semanas["semana"], y=resumo_semanas[metrica],
-                    mode="lines+markers", name=metrica,
-                    line=dict(color=CORES_METRICAS[metrica], width=2),
-                    marker=dict(size=8)
-                ))
-        fig_semanas.update_layout(
-            title="Evolução semanal ao longo do tempo",
-            plot_bgcolor="#ffffff", paper_bgcolor="#f8f9fa", font=dict(color="#333"),
-            xaxis=dict(title="Semana", gridcolor="#e0e0e0"),
-            yaxis=dict(title="Média (1-5)", range=[0,6], tickmode="linear",
-                       dtick=1, gridcolor="#e0e0e0"),
-            hovermode="x unified", margin=dict(l=20,r=20,t=60,b=20)
-        )
-        st.plotly_chart(fig_semanas, use_container_width=True)
-        st.dataframe(resumo_semanas.set_index("semana"), use_container_width=True)
-    else:
-        st.info("📆 Com mais semanas de dados aparecerá aqui a comparação entre semanas.")
-
-    # 7. PADRÕES E INSIGHTS
-    st.markdown("### 📅 Padrões por Dia da Semana")
-    if padroes:
-        for p in padroes:
-            st.markdown(f"- {p}")
-    else:
-        st.info("Necessário pelo menos 7 registros para detectar padrões.")
-
-    st.markdown("### 💡 Insights Detectados")
-    if insights:
-        for ins in insights:
-            st.markdown(f"- {ins}")
-    else:
-        st.info("Necessário pelo menos 5 registros para detectar correlações.")
-
-    # 8. PARTICIPAÇÃO
-    registros = len(df_7dias)
-    if registros < 7:
-        st.warning(f"📅 Você registrou {registros} de 7 dias esta semana.")
-    else:
-        st.success("🎉 Semana completa! Todos os 7 dias registrados.")
-
-    # 9. ALERTA FINAL
-    if risco >= 70:
-        st.markdown(f"""<div style="background:#fff0f0;border:2px solid #F44336;
-        border-radius:12px;padding:20px;margin-top:15px">
-        <h3 style="color:#cc0000;margin-top:0">🔴 ALTO RISCO — Ação Recomendada</h3>
-        <p style="color:#444">O paciente <b>{nome_usuario}</b> apresenta risco de burnout
-        de <b>{risco}%</b>. Recomenda-se revisão urgente.</p></div>""",
-        unsafe_allow_html=True)
-    elif risco >= 40:
-        st.markdown(f"""<div style="background:#fffbe6;border:2px solid #FF9800;
-        border-radius:12px;padding:20px;margin-top:15px">
-        <h3 style="color:#e65100;margin-top:0">🟡 ATENÇÃO — Monitorar de Perto</h3>
-        <p style="color:#444">O paciente <b>{nome_usuario}</b> apresenta risco moderado
-        de <b>{risco}%</b>.</p></div>""", unsafe_allow_html=True)
-    else:
-        st.success(f"🟢 Risco baixo ({risco}%) — Nenhum sinal crítico esta semana!")
-
-    # 10. BOTÃO DE DOWNLOAD DO PDF
-    st.markdown("---")
-    st.markdown("### 📄 Relatório em PDF para a Psicóloga")
-    st.info("Clique abaixo para gerar e baixar o relatório completo em PDF.")
-
-    pdf_buffer = gerar_pdf(
-        nome_usuario=nome_usuario,
-        df_7dias=df_7dias,
-        risco=risco,
-        nivel_risco=nivel_risco,
-        insights=insights,
-        padroes=padroes,
-        remedios_salvos=remedios_salvos
-    )
-
-    nome_arquivo = f"relatorio_{nome_usuario.replace(' ','_')}_{date.today()}.pdf"
-    st.download_button(
-        label="⬇️ Baixar Relatório PDF",
-        data=pdf_buffer,
-        file_name=nome_arquivo,
-        mime="application/pdf"
-    )
+        return
+
+    periodo = st.radio("Período dos gráficos", PERIODOS_RELATORIO, horizontal=True,
+                       format_func=lambda dias: f"{dias} dias", key="periodo_relatorio")
+    rel = dict(rel, periodo=periodo)
+
+    # Trocar de aba reexecuta só este fragmento, e só a aba aberta é montada
+    abas = st.tabs([titulo for titulo, _ in SECOES_RELATORIO],
+                   key="abas_relatorio", on_change="rerun")
+    for aba, (_, secao) in zip(abas, SECOES_RELATORIO):
+        if aba.open:
+            with aba:
+                secao(rel)
+
+secao_relatorio(codigo_usuario, nome_usuario)
+
+# ─── MÉTRICAS DA EXECUÇÃO ─────────────────────────────────────
+segundos_pagina = time.perf_counter() - _inicio_execucao
+st.session_state.tempos_ms["pagina"] = round(segundos_pagina * 1000, 2)
+INSTRUMENTACAO.registrar_tempo("ui.pagina", segundos_pagina)
+INSTRUMENTACAO.log_execucao(codigo_usuario=codigo_usuario, ms=round(segundos_pagina * 1000, 2))
+exportar_metricas()
+if DEBUG:
+    with painel_etapas.container():
+        st.dataframe([{"etapa": "· " * e["nivel"] + e["etapa"], "ms": e["ms"]}
+                      for e in INSTRUMENTACAO.etapas_execucao()],
+                     hide_index=True)
+        st.download_button("Exportar métricas (Prometheus)",
+                           data=INSTRUMENTACAO.prometheus(),
+                           file_name="diario_metricas.prom", mime="text/plain")
+
+# Daqui em diante só rodam reruns de fragmento
+_execucao_completa = False